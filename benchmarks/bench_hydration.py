@@ -0,0 +1,53 @@
+import pytest
+
+from matchbox.database import db
+from matchbox.queries.queries_result import QueryResultWrapper
+from synthetic import DEPTHS, SIZES, WIDTHS, make_models, make_values
+
+
+def snapshots(model):
+    return list(db.conn.collection(model.full_collection_name()).stream())
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('width', WIDTHS)
+def test_model_from_dict(run, width, size):
+    model, = make_models(width)
+    model.objects.create(**make_values(model, size))
+    snapshot, = snapshots(model)
+
+    instance = run(QueryResultWrapper.model_from_dict, model, snapshot)
+
+    assert instance.f0 == 'x' * size
+
+
+@pytest.mark.parametrize('depth', DEPTHS)
+def test_select_related(run, depth):
+    chain = make_models(5, depth)
+    parent = None
+    for model in chain:
+        values = make_values(model, 10)
+        if parent is not None:
+            values['parent'] = parent
+        parent = model.objects.create(**values)
+    leaf = chain[-1]
+    leaf.objects.bulk_create([leaf(**values) for _ in range(99)])
+    rows = snapshots(leaf)
+
+    instances = run(QueryResultWrapper.models_from_dicts, leaf, rows, depth)
+
+    assert len(instances) == 100
+
+
+@pytest.mark.parametrize('slots', [False, True])
+def test_hydrate_page(run, slots):
+    # Retained memory per call is what a page of 1000 instances costs
+    model, = make_models(5, slots=slots)
+    model.objects.bulk_create([
+        model(**make_values(model, 10)) for _ in range(1000)
+    ])
+    rows = snapshots(model)
+
+    instances = run(QueryResultWrapper.models_from_dicts, model, rows)
+
+    assert len(instances) == 1000
@@ -0,0 +1,76 @@
+import itertools
+
+import pytest
+
+from synthetic import make_models, make_values
+
+DOCUMENTS = 1000
+
+
+@pytest.fixture
+def model():
+    model, = make_models(20)
+    return model
+
+
+@pytest.fixture
+def values(model):
+    return make_values(model, 10)
+
+
+@pytest.fixture
+def documents(model, values):
+    model.objects.bulk_create([
+        model(**dict(values, f1=i % 10)) for i in range(DOCUMENTS)
+    ])
+
+
+def test_create(run, model, values):
+    run(lambda: model.objects.create(**values))
+
+
+def test_get_by_id(run, model, values):
+    instance = model.objects.create(**values)
+
+    assert run(lambda: model.objects.get(id=instance.id)).id == instance.id
+
+
+def test_get_by_filter(run, model, values, documents):
+    model.objects.create(**dict(values, f1=DOCUMENTS))
+
+    run(lambda: model.objects.get(f1=DOCUMENTS))
+
+
+def test_filter(run, model, documents):
+    assert len(run(lambda: list(model.objects.filter(f1=3)))) == 100
+
+
+def test_save_changed(run, model, values):
+    instance = model.objects.create(**values)
+    counter = itertools.count()
+
+    def save():
+        instance.f0 = str(next(counter))
+        instance.save()
+
+    run(save)
+
+
+def test_bulk_create(run, model, values):
+    run(lambda: model.objects.bulk_create([
+        model(**values) for _ in range(500)
+    ]))
+
+
+def test_bulk_update(run, model, values):
+    instances = [model(**values) for _ in range(500)]
+    model.objects.bulk_create(instances)
+
+    run(lambda: model.objects.bulk_update(instances, ['f0']))
+
+
+def test_delete(run, model, values):
+    def setup():
+        model.objects.bulk_create([model(**values) for _ in range(100)])
+
+    run(lambda _: model.objects.all().delete(), setup=setup)
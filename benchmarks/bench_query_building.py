@@ -0,0 +1,37 @@
+import pytest
+
+from matchbox.queries import queries
+from synthetic import make_models
+
+LOOKUPS = {
+    'equal': {'f0': 'x'},
+    'range': {'f1__gte': 1, 'f1__lt': 10},
+    'in': {'f1__in': list(range(10))},
+    'map_key': {'f5__key': 'value'},
+    'reference': {'parent': 'p1'},
+}
+
+
+@pytest.fixture
+def model():
+    return make_models(20, depth=1)[-1]
+
+
+@pytest.mark.parametrize('lookup', sorted(LOOKUPS))
+def test_parse_where(run, model, lookup):
+    query = queries.FilterQuery(model, **LOOKUPS[lookup])
+
+    assert run(query.parse_where)
+
+
+def test_make_query(run, model):
+    query = queries.FilterQuery(model, f0='x', f1__gte=1)
+    query.order_by('f1').limit(10).only('f0', 'f1')
+
+    run(query.make_query)
+
+
+def test_make_queries_fan_out(run, model):
+    query = queries.FilterQuery(model, f1__in=list(range(100)))
+
+    assert len(run(query.make_queries)) == 4
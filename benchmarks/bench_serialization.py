@@ -0,0 +1,38 @@
+import pytest
+
+from matchbox import models
+from matchbox.queries import queries
+from synthetic import SIZES, WIDTHS, make_models, make_values
+
+FIELDS = {
+    'text_max_length': (models.TextField(max_length=10), 'x' * 100),
+    'integer_default': (models.IntegerField(default=0), None),
+    'list_blank': (models.ListField(blank=True), [1, 2, 3]),
+}
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('width', WIDTHS)
+def test_parse_insert(run, width, size):
+    model, = make_models(width)
+    query = queries.InsertQuery(model, **make_values(model, size))
+
+    data = run(query.parse_insert)
+
+    assert data['f0'] == 'x' * size
+
+
+@pytest.mark.parametrize('name', sorted(FIELDS))
+def test_field_validate(run, name):
+    field, value = FIELDS[name]
+
+    run(field.field_validator.validate, name, value)
+
+
+@pytest.mark.parametrize('width', WIDTHS)
+def test_changed_fields(run, width):
+    model, = make_models(width)
+    instance = model.objects.create(**make_values(model, 10))
+    instance.f0 = 'changed'
+
+    assert run(instance.changed_fields) == ['f0']
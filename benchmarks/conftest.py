@@ -0,0 +1,68 @@
+import gc
+import os
+import tracemalloc
+
+import pytest
+
+from matchbox.database import FirestoreBackend, MemoryBackend, db
+
+ALLOCATIONS = {}
+
+
+def measure(func, *args):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_kib': peak / 1024, 'retained_kib': retained / 1024}
+
+
+@pytest.fixture(autouse=True)
+def database():
+    # FIRESTORE (a cert path) runs against a real project, or the
+    # emulator when FIRESTORE_EMULATOR_HOST is set as well.
+    previous = db.backend, db._conn, db._async_conn
+    if 'FIRESTORE' in os.environ:
+        db.initialization(backend=FirestoreBackend(os.environ['FIRESTORE']))
+    else:
+        db.initialization(backend=MemoryBackend())
+    yield db
+    db.backend, db._conn, db._async_conn = previous
+
+
+@pytest.fixture
+def run(benchmark, request):
+    """
+    Benchmark func, then record the memory one more call allocates in
+    extra_info and in the allocation summary. With setup, func gets a
+    fresh setup() result every round.
+    """
+    def run(func, *args, setup=None, rounds=20):
+        if setup is None:
+            result = benchmark(func, *args)
+            allocations = measure(func, *args)
+        else:
+            result = benchmark.pedantic(
+                func, setup=lambda: ((setup(),), {}), rounds=rounds
+            )
+            allocations = measure(func, setup())
+        benchmark.extra_info.update(allocations)
+        ALLOCATIONS[request.node.nodeid] = allocations
+        return result
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not ALLOCATIONS:
+        return
+    terminalreporter.section('allocations per call')
+    for name, info in sorted(ALLOCATIONS.items()):
+        terminalreporter.write_line(
+            '{:<70} peak {:>10.1f} KiB  retained {:>10.1f} KiB'.format(
+                name.split('::', 1)[-1], info['peak_kib'],
+                info['retained_kib']
+            )
+        )
@@ -0,0 +1,58 @@
+import datetime
+
+from matchbox import models
+
+WIDTHS = [5, 20, 50]
+SIZES = [1, 100]
+DEPTHS = [0, 1, 3]
+FIELD_TYPES = [
+    models.TextField,
+    models.IntegerField,
+    models.BooleanField,
+    models.TimeStampField,
+    models.ListField,
+    models.MapField,
+]
+TIMESTAMP = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def make_models(width, depth=0, slots=False):
+    """
+    Chain of depth + 1 synthetic models with `width` fields of mixed
+    types, each referencing the previous one through `parent`.
+    """
+    chain = []
+    for level in range(depth + 1):
+        attrs = {
+            'f%s' % i: FIELD_TYPES[i % len(FIELD_TYPES)](blank=True)
+            for i in range(width)
+        }
+        if chain:
+            attrs['parent'] = models.ReferenceField(chain[-1])
+        if slots:
+            attrs['Meta'] = type('Meta', (), {'slots': True})
+        attrs['__module__'] = __name__
+        name = 'Bench{}x{}l{}{}'.format(
+            width, depth, level, 's' if slots else ''
+        )
+        chain.append(type(name, (models.Model,), attrs))
+    return chain
+
+
+def make_values(model, size):
+    """Field values of one document, `size` items per text/list/map."""
+    values = {}
+    for name, field in model._meta.fields.items():
+        if isinstance(field, models.TextField):
+            values[name] = 'x' * size
+        elif isinstance(field, models.IntegerField):
+            values[name] = size
+        elif isinstance(field, models.BooleanField):
+            values[name] = True
+        elif isinstance(field, models.TimeStampField):
+            values[name] = TIMESTAMP
+        elif isinstance(field, models.ListField):
+            values[name] = list(range(size))
+        elif isinstance(field, models.MapField):
+            values[name] = {'k%s' % i: i for i in range(size)}
+    return values
@@ -0,0 +1,2 @@
+from matchbox.instrumentation import query_budget, QueryBudget
+from matchbox.sessions import session, Session
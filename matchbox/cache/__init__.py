@@ -0,0 +1 @@
+from matchbox.cache.backends import BaseCache, LocalCache
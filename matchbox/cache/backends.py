@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class BaseCache:
+    """
+    Backend interface of the model cache. Keys are document paths and
+    values are document dicts as returned by DocumentSnapshot.to_dict(),
+    which still hold Firestore types (DocumentReference, GeoPoint,
+    datetime), so an out of process backend has to serialize them.
+    get() returns None for a missing key.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key):
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def lookup(self, key):
+        value = self.get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class LocalCache(BaseCache):
+    """
+    In-process cache, evicting the least recently used entry above
+    max_size and entries older than ttl seconds.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        super().__init__(ttl)
+        if max_size < 1:
+            raise ValueError('max_size must be greater than 0')
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
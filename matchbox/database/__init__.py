@@ -1,21 +1,21 @@
-import firebase_admin
-from firebase_admin import firestore
-
 from matchbox.database import error
+from matchbox.database.backends import (
+    BaseBackend, FirestoreBackend, MemoryBackend
+)
 
 
 class Database:
     def __init__(self):
+        self.backend = None
         self._conn = None
+        self._async_conn = None
 
-    def initialization(self, cert_path):
-        try:
-            firebase_admin.get_app()
-        except ValueError:
-            cred = firebase_admin.credentials.Certificate(cert_path)
-            firebase_admin.initialize_app(cred)
-
-        self._conn = firestore.client()
+    def initialization(self, cert_path=None, backend=None):
+        if backend is None:
+            backend = FirestoreBackend(cert_path)
+        self.backend = backend
+        self._conn = backend.client()
+        self._async_conn = None
 
     @property
     def conn(self):
@@ -25,11 +25,21 @@ class Database:
             )
         return self._conn
 
+    @property
+    def async_conn(self):
+        if self._conn is None:
+            raise error.DBDoesNotinitialized(
+                'Connection to db must be initialized'
+            )
+        if self._async_conn is None:
+            self._async_conn = self.backend.async_client()
+        return self._async_conn
+
 
 db = Database()
 
 
-def db_initialization(cert_path):
+def db_initialization(cert_path=None, backend=None):
     global db
 
-    db.initialization(cert_path)
+    db.initialization(cert_path, backend)
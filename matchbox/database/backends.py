@@ -0,0 +1,57 @@
+import firebase_admin
+from firebase_admin import firestore
+from firebase_admin import firestore_async
+
+from matchbox.database import memory
+
+
+class BaseBackend:
+    """
+    Connection factory behind matchbox.database.db. client() and
+    async_client() return objects with the interface of the
+    google-cloud-firestore Client and AsyncClient.
+    """
+
+    def client(self):
+        raise NotImplementedError()
+
+    def async_client(self):
+        raise NotImplementedError()
+
+
+class FirestoreBackend(BaseBackend):
+    """Cloud Firestore project of the given service account cert."""
+
+    def __init__(self, cert_path):
+        self.cert_path = cert_path
+
+    def client(self):
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            cred = firebase_admin.credentials.Certificate(self.cert_path)
+            firebase_admin.initialize_app(cred)
+        return firestore.client()
+
+    def async_client(self):
+        return firestore_async.client()
+
+
+class MemoryBackend(BaseBackend):
+    """
+    In-process database for tests and benchmarks, no network or project
+    needed. Data lives as long as the backend and is shared by its sync
+    and async clients.
+    """
+
+    def __init__(self):
+        self.store = memory.Store()
+
+    def client(self):
+        return memory.Client(self.store)
+
+    def async_client(self):
+        return memory.AsyncClient(self.store)
+
+    def clear(self):
+        self.store.clear()
@@ -0,0 +1,1255 @@
+import datetime
+import functools
+import itertools
+import random
+import string
+import threading
+
+from firebase_admin import firestore
+from google.api_core import exceptions as api_exceptions
+from google.cloud.firestore_v1 import base_aggregation
+from google.cloud.firestore_v1 import base_document
+from google.cloud.firestore_v1 import field_path
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1 import watch
+
+ASCENDING = firestore.Query.ASCENDING
+DESCENDING = firestore.Query.DESCENDING
+NAME = ('__name__',)
+INEQUALITIES = {'<', '<=', '>', '>=', '!=', 'not-in'}
+MAX_WRITES = 500
+# Values allowed in one filter, and disjunctions in one query
+MAX_VALUES = {'in': 30, 'array_contains_any': 30, 'not-in': 10}
+MAX_DISJUNCTIONS = 30
+TRANSFORMS = (
+    transforms.Sentinel,
+    transforms.ArrayUnion,
+    transforms.ArrayRemove,
+    transforms.Increment,
+    transforms.Maximum,
+    transforms.Minimum,
+)
+SCALARS = (
+    type(None), bool, int, float, str, bytes, firestore.GeoPoint,
+) + TRANSFORMS
+ID_CHARS = string.ascii_letters + string.digits
+NAN = (2, 0)
+
+
+def auto_id():
+    return ''.join(random.choices(ID_CHARS, k=20))
+
+
+def join_path(parts, collection):
+    path = '/'.join(parts)
+    segments = path.split('/')
+    if not all(segments) or (len(segments) % 2 == 1) != collection:
+        raise ValueError('Invalid {} path {!r}'.format(
+            'collection' if collection else 'document', path
+        ))
+    return path
+
+
+def parent_path(path):
+    return path.rsplit('/', 1)[0]
+
+
+def in_group(collection, group):
+    # A collection group holds the collections with the group's id
+    # under its parent document, or anywhere for a top level id.
+    if collection.rsplit('/', 1)[-1] != group.rsplit('/', 1)[-1]:
+        return False
+    return '/' not in group or collection.startswith(parent_path(group) + '/')
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_string(path):
+    return field_path.FieldPath.from_string(path).parts
+
+
+def parse(path):
+    if isinstance(path, field_path.FieldPath):
+        return tuple(path.parts)
+    return parse_string(path)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def order_key(value):
+    """
+    Sort key following Firestore's ordering of values: null, booleans,
+    numbers, timestamps, strings, bytes, references, geo points, arrays
+    and maps, each type before the next one.
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if is_number(value):
+        if value != value:
+            return NAN
+        return (2, 1, value)
+    if isinstance(value, datetime.datetime):
+        return (3, utc(value))
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, firestore.GeoPoint):
+        return (7, value.latitude, value.longitude)
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(order_key(v) for v in value))
+    if isinstance(value, dict):
+        return (9, tuple((k, order_key(value[k])) for k in sorted(value)))
+    if hasattr(value, 'path'):
+        return (6, tuple(value.path.split('/')))
+    raise TypeError('Unsupported Firestore value {!r}'.format(value))
+
+
+def utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def get_path(data, parts):
+    value = data
+    for part in parts:
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def set_path(data, parts, value):
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    data[parts[-1]] = value
+
+
+def delete_path(data, parts):
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def copy_data(value):
+    if isinstance(value, dict):
+        return {k: copy_data(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_data(v) for v in value]
+    return value
+
+
+def extract(data, prefix=()):
+    # Split a document into plain values and (path, sentinel) pairs
+    clean, ops = {}, []
+    for key, value in data.items():
+        path = prefix + (key,)
+        if isinstance(value, TRANSFORMS):
+            ops.append((path, value))
+        elif isinstance(value, dict) and value:
+            clean[key], nested = extract(value, path)
+            ops.extend(nested)
+        else:
+            clean[key] = value
+    return clean, ops
+
+
+def merge_data(data, values):
+    for key, value in values.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            merge_data(data[key], value)
+        else:
+            data[key] = value
+
+
+def project(data, paths):
+    if paths is None:
+        return data
+    projected = {}
+    for parts in paths:
+        if parts == NAME:
+            continue
+        found, value = get_path(data, parts)
+        if found:
+            set_path(projected, parts, value)
+    return projected
+
+
+class Record:
+    __slots__ = ('data', 'create_time', 'update_time')
+
+    def __init__(self, data, create_time, update_time):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class Write:
+    __slots__ = ('kind', 'path', 'data', 'merge')
+
+    def __init__(self, kind, path, data=None, merge=False):
+        self.kind = kind
+        self.path = path
+        self.data = data
+        self.merge = merge
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class Store:
+    """
+    Documents of one in-memory database, grouped by collection path.
+    Every commit is applied atomically under a lock, stored data is
+    never mutated afterwards so snapshots can share it.
+    """
+
+    def __init__(self):
+        self._collections = {}
+        self._watches = []
+        self._lock = threading.RLock()
+        self._notify_lock = threading.RLock()
+        self._last = None
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = Client(self)
+        return self._client
+
+    def reference(self, path):
+        return DocumentReference(self.client, path)
+
+    def clear(self):
+        with self._lock:
+            self._collections = {}
+
+    def now(self):
+        # Update times double as document versions, keep them unique
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self._last is not None and now <= self._last:
+            now = self._last + datetime.timedelta(microseconds=1)
+        self._last = now
+        return now
+
+    def record(self, path):
+        collection, doc_id = path.rsplit('/', 1)
+        return self._collections.get(collection, {}).get(doc_id)
+
+    def records(self, parent, all_descendants=False):
+        with self._lock:
+            if not all_descendants:
+                docs = self._collections.get(parent, {})
+                return [
+                    (parent + '/' + doc_id, record)
+                    for doc_id, record in docs.items()
+                ]
+            return [
+                (collection + '/' + doc_id, record)
+                for collection, docs in self._collections.items()
+                if in_group(collection, parent)
+                for doc_id, record in docs.items()
+            ]
+
+    def collections(self, parent=None):
+        with self._lock:
+            paths = set()
+            for path in self._collections:
+                if parent is None and '/' not in path:
+                    paths.add(path)
+                elif parent is not None and path.startswith(parent + '/'):
+                    rest = path[len(parent) + 1:]
+                    if '/' not in rest:
+                        paths.add(path)
+            return sorted(paths)
+
+    def snapshot(self, client, path, field_paths=None, read_time=None):
+        record = self.record(path)
+        reference = client.document(path)
+        if record is None:
+            return firestore.DocumentSnapshot(
+                reference, None, False, read_time, None, None
+            )
+        return firestore.DocumentSnapshot(
+            reference, project(record.data, field_paths), True, read_time,
+            record.create_time, record.update_time
+        )
+
+    def prepare(self, value):
+        if isinstance(value, dict):
+            return {k: self.prepare(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.prepare(v) for v in value]
+        if isinstance(value, datetime.datetime):
+            return utc(value)
+        if isinstance(value, (DocumentReference,
+                              base_document.BaseDocumentReference)):
+            return self.reference(value.path)
+        if not isinstance(value, SCALARS):
+            raise TypeError(
+                'Cannot convert to a Firestore Value', value, type(value)
+            )
+        return value
+
+    def commit(self, writes, reads=None):
+        if len(writes) > MAX_WRITES:
+            raise api_exceptions.InvalidArgument(
+                'maximum {} writes allowed per request'.format(MAX_WRITES)
+            )
+        with self._lock:
+            for path, update_time in (reads or {}).items():
+                record = self.record(path)
+                current = record.update_time if record is not None else None
+                if current != update_time:
+                    raise api_exceptions.Aborted(
+                        'Transaction aborted, {} was modified'.format(path)
+                    )
+            now = self.now()
+            staged = {}
+            for write in writes:
+                current = staged[write.path] if write.path in staged \
+                    else self.record(write.path)
+                staged[write.path] = self.apply(current, write, now)
+            for path, record in staged.items():
+                collection, doc_id = path.rsplit('/', 1)
+                if record is not None:
+                    self._collections.setdefault(collection, {})[doc_id] = \
+                        record
+                    continue
+                docs = self._collections.get(collection, {})
+                docs.pop(doc_id, None)
+                if not docs:
+                    self._collections.pop(collection, None)
+        if staged:
+            self.notify(staged)
+        return [WriteResult(now) for _ in writes]
+
+    def apply(self, current, write, now):
+        if write.kind == 'delete':
+            return None
+        if write.kind == 'create' and current is not None:
+            raise api_exceptions.AlreadyExists(
+                'Document already exists: {}'.format(write.path)
+            )
+        if write.kind == 'update' and current is None:
+            raise api_exceptions.NotFound(
+                'No document to update: {}'.format(write.path)
+            )
+
+        merge = write.kind == 'update' or write.merge
+        data = copy_data(current.data) if merge and current else {}
+        if write.kind == 'update':
+            ops = []
+            for key, value in write.data.items():
+                parts = parse(key)
+                if isinstance(value, TRANSFORMS):
+                    ops.append((parts, value))
+                    continue
+                if isinstance(value, dict) and value:
+                    value, nested = extract(value, parts)
+                    ops.extend(nested)
+                set_path(data, parts, value)
+        elif write.merge is True:
+            values, ops = extract(write.data)
+            merge_data(data, values)
+        elif write.merge:
+            values, ops = extract(write.data)
+            fields = [parse(f) for f in write.merge]
+            for parts in fields:
+                found, value = get_path(values, parts)
+                if found:
+                    set_path(data, parts, value)
+            ops = [
+                (path, op) for path, op in ops
+                if any(path[:len(f)] == f for f in fields)
+            ]
+        else:
+            data, ops = extract(write.data)
+
+        for parts, op in ops:
+            if op is transforms.DELETE_FIELD:
+                if not merge:
+                    raise ValueError(
+                        'Cannot apply DELETE_FIELD in a set request '
+                        'without merge'
+                    )
+                delete_path(data, parts)
+                continue
+            found, value = get_path(data, parts)
+            set_path(data, parts, self.transform(found, value, op, now))
+
+        create_time = current.create_time if current is not None else now
+        return Record(data, create_time, now)
+
+    def transform(self, found, value, op, now):
+        if op is transforms.SERVER_TIMESTAMP:
+            return now
+        if isinstance(op, (transforms.ArrayUnion, transforms.ArrayRemove)):
+            base = list(value) if found and isinstance(value, list) else []
+            values = self.prepare(op.values)
+            if isinstance(op, transforms.ArrayRemove):
+                removed = {order_key(v) for v in values}
+                return [v for v in base if order_key(v) not in removed]
+            present = {order_key(v) for v in base}
+            for v in values:
+                if order_key(v) not in present:
+                    present.add(order_key(v))
+                    base.append(v)
+            return base
+        if not (found and is_number(value)):
+            return op.value
+        if isinstance(op, transforms.Increment):
+            return value + op.value
+        if isinstance(op, transforms.Maximum):
+            return max(value, op.value)
+        return min(value, op.value)
+
+    def watch(self, listener):
+        with self._notify_lock:
+            with self._lock:
+                self._watches.append(listener)
+            listener.refresh()
+
+    def unwatch(self, listener):
+        with self._lock:
+            if listener in self._watches:
+                self._watches.remove(listener)
+
+    def notify(self, paths):
+        # Listeners run in the writing thread, one commit at a time
+        with self._notify_lock:
+            with self._lock:
+                listeners = list(self._watches)
+            for listener in listeners:
+                if any(listener.query._covers(path) for path in paths):
+                    listener.refresh()
+
+
+class Watch:
+    """
+    on_snapshot() listener. The query is run again after every commit
+    touching its collection and the callback gets the full result with
+    the document changes since the previous call.
+    """
+
+    def __init__(self, query, callback):
+        self.query = query
+        self.callback = callback
+        self._docs = None
+        self._store = query._client._store
+        self._store.watch(self)
+
+    def unsubscribe(self):
+        self._store.unwatch(self)
+
+    def refresh(self):
+        read_time = datetime.datetime.now(datetime.timezone.utc)
+        docs = self.query._snapshots(read_time)
+        previous = self._docs or {}
+        old_index = {path: i for i, path in enumerate(previous)}
+        new_index = {d.reference.path: i for i, d in enumerate(docs)}
+
+        changes = [
+            watch.DocumentChange(
+                watch.ChangeType.REMOVED, old, old_index[path], -1
+            )
+            for path, old in previous.items() if path not in new_index
+        ]
+        for i, d in enumerate(docs):
+            old = previous.get(d.reference.path)
+            if old is None:
+                changes.append(watch.DocumentChange(
+                    watch.ChangeType.ADDED, d, -1, i
+                ))
+            elif old.update_time != d.update_time:
+                changes.append(watch.DocumentChange(
+                    watch.ChangeType.MODIFIED, d,
+                    old_index[d.reference.path], i
+                ))
+
+        initial = self._docs is None
+        self._docs = {d.reference.path: d for d in docs}
+        if changes or initial:
+            self.callback(docs, changes, read_time)
+
+
+class Query:
+    """
+    Immutable query over a collection, or over every collection with
+    the same id when all_descendants is set. Each method returns a new
+    query like google.cloud.firestore.Query does.
+    """
+
+    def __init__(self, client, parent, all_descendants=False):
+        self._client = client
+        self._parent = parent
+        self._all_descendants = all_descendants
+        self._filters = ()
+        self._orders = ()
+        self._projection = None
+        self._limit = None
+        self._limit_to_last = False
+        self._offset = None
+        self._start = None
+        self._end = None
+
+    def _copy(self, **changes):
+        query = self._client.query_class(
+            self._client, self._parent, self._all_descendants
+        )
+        query.__dict__.update(
+            (k, v) for k, v in self.__dict__.items() if k in query.__dict__
+        )
+        for key, value in changes.items():
+            setattr(query, '_' + key, value)
+        return query
+
+    def where(self, field_path=None, op_string=None, value=None, *,
+              filter=None):
+        if filter is not None:
+            field_path = filter.field_path
+            op_string = filter.op_string
+            value = filter.value
+        parts = parse(field_path)
+        prepare = self._client._store.prepare
+        if parts == NAME:
+            prepare = self._name_value
+        if op_string in ('in', 'not-in', 'array_contains_any'):
+            value = [prepare(v) for v in value]
+            expected = {order_key(v) for v in value}
+        elif op_string in ('==', '!=', '<', '<=', '>', '>=',
+                           'array_contains'):
+            value = prepare(value)
+            expected = order_key(value)
+        else:
+            raise ValueError('Operator string {!r} is invalid'.format(
+                op_string
+            ))
+        return self._copy(
+            filters=self._filters + ((parts, op_string, value, expected),)
+        )
+
+    def _name_value(self, value):
+        if isinstance(value, str):
+            if '/' not in value:
+                value = self._parent + '/' + value
+            return self._client._store.reference(value)
+        return self._client._store.prepare(value)
+
+    def order_by(self, field_path, direction=ASCENDING):
+        if direction not in (ASCENDING, DESCENDING):
+            raise ValueError('Invalid direction {!r}'.format(direction))
+        return self._copy(
+            orders=self._orders + ((field_path, parse(field_path),
+                                    direction),)
+        )
+
+    def limit(self, count):
+        return self._copy(limit=count, limit_to_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(limit=count, limit_to_last=True)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(projection=[parse(f) for f in field_paths])
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def count(self, alias=None):
+        return self._client.aggregation_class(self).count(alias)
+
+    def sum(self, field_ref, alias=None):
+        return self._client.aggregation_class(self).sum(field_ref, alias)
+
+    def avg(self, field_ref, alias=None):
+        return self._client.aggregation_class(self).avg(field_ref, alias)
+
+    def get(self, transaction=None):
+        if self._limit_to_last and not self._orders:
+            raise ValueError(
+                'limit_to_last() requires specifying at least one '
+                'order_by() clause'
+            )
+        return self._read(transaction)
+
+    def stream(self, transaction=None):
+        if self._limit_to_last:
+            raise ValueError(
+                'Query results for queries that include limit_to_last() '
+                'constraints cannot be streamed. Use Query.get() instead.'
+            )
+        return iter(self._read(transaction))
+
+    def on_snapshot(self, callback):
+        return Watch(self, callback)
+
+    def _read(self, transaction):
+        if transaction is not None:
+            transaction._check_read()
+        docs = self._snapshots(datetime.datetime.now(datetime.timezone.utc))
+        if transaction is not None:
+            transaction._record(docs)
+        return docs
+
+    def _covers(self, path):
+        parent = parent_path(path)
+        if self._all_descendants:
+            return in_group(parent, self._parent)
+        return parent == self._parent
+
+    def _normalized_orders(self):
+        orders = [(parts, direction) for _f, parts, direction in self._orders]
+        ordered = {parts for parts, _d in orders}
+        inequalities = sorted({
+            parts for parts, op, _v, _e in self._filters
+            if op in INEQUALITIES and parts not in ordered
+        })
+        orders.extend((parts, ASCENDING) for parts in inequalities)
+        if NAME not in ordered:
+            last = orders[-1][1] if orders else ASCENDING
+            orders.append((NAME, last))
+        return orders
+
+    def _matches(self, path, data):
+        for parts, op, value, expected in self._filters:
+            if parts == NAME:
+                found, current = True, self._client._store.reference(path)
+            else:
+                found, current = get_path(data, parts)
+            if not found:
+                return False
+            if op == 'array_contains':
+                if not isinstance(current, list) or expected not in {
+                        order_key(v) for v in current}:
+                    return False
+                continue
+            if op == 'array_contains_any':
+                if not isinstance(current, list) or not any(
+                        order_key(v) in expected for v in current):
+                    return False
+                continue
+            key = order_key(current)
+            if op == '==':
+                matched = key == expected
+            elif op == 'in':
+                matched = key in expected
+            elif op == '!=':
+                matched = current is not None and key != expected
+            elif op == 'not-in':
+                matched = current is not None and key not in expected
+            else:
+                matched = self._compare(op, key, expected)
+            if not matched:
+                return False
+        return True
+
+    @staticmethod
+    def _compare(op, key, expected):
+        # Range filters only match values of the same type
+        if key[0] != expected[0] or NAN in (key, expected):
+            return False
+        if op == '<':
+            return key < expected
+        if op == '<=':
+            return key <= expected
+        if op == '>':
+            return key > expected
+        return key >= expected
+
+    def _sort_key(self, path, data, orders):
+        keys = []
+        for parts, _direction in orders:
+            if parts == NAME:
+                keys.append((6, tuple(path.split('/'))))
+                continue
+            found, value = get_path(data, parts)
+            if not found:
+                return None
+            keys.append(order_key(value))
+        return keys
+
+    def _cursor_key(self, cursor, orders):
+        if hasattr(cursor, 'reference') and hasattr(cursor, 'to_dict'):
+            data = cursor.to_dict() or {}
+            values = [
+                cursor.reference if parts == NAME
+                else get_path(data, parts)[1]
+                for parts, _direction in orders
+            ]
+        elif isinstance(cursor, dict):
+            values = []
+            for field, parts, _direction in self._orders:
+                if field in cursor:
+                    values.append(cursor[field])
+                else:
+                    values.append(get_path(cursor, parts)[1])
+        else:
+            values = list(cursor)
+        prepare = self._client._store.prepare
+        return [
+            order_key(self._name_value(v) if parts == NAME else prepare(v))
+            for v, (parts, _direction) in zip(values, orders)
+        ]
+
+    @staticmethod
+    def _cursor_compare(keys, cursor, orders):
+        for key, bound, (_parts, direction) in zip(keys, cursor, orders):
+            if key != bound:
+                result = -1 if key < bound else 1
+                return -result if direction == DESCENDING else result
+        return 0
+
+    def _check_filters(self):
+        # Checked when the query runs, like the server does
+        disjunctions = 1
+        for _parts, op_string, value, _expected in self._filters:
+            if op_string not in MAX_VALUES:
+                continue
+            if len(value) > MAX_VALUES[op_string]:
+                raise api_exceptions.InvalidArgument(
+                    "'{}' filters support a maximum of {} elements in the "
+                    "value array".format(op_string, MAX_VALUES[op_string])
+                )
+            if op_string != 'not-in':
+                disjunctions *= len(value)
+        if disjunctions > MAX_DISJUNCTIONS:
+            raise api_exceptions.InvalidArgument(
+                'Query has {} disjunctions, a maximum of {} is '
+                'allowed'.format(disjunctions, MAX_DISJUNCTIONS)
+            )
+
+    def _rows(self):
+        self._check_filters()
+        orders = self._normalized_orders()
+        rows = []
+        for path, record in self._client._store.records(
+                self._parent, self._all_descendants):
+            if not self._matches(path, record.data):
+                continue
+            keys = self._sort_key(path, record.data, orders)
+            if keys is not None:
+                rows.append((keys, path, record))
+        # Stable sorts from the last ordering to the first
+        for i in reversed(range(len(orders))):
+            rows.sort(
+                key=lambda row: row[0][i], reverse=orders[i][1] == DESCENDING
+            )
+
+        if self._start is not None:
+            rows = self._bounded(rows, self._start, orders, 1)
+        if self._end is not None:
+            rows = self._bounded(rows, self._end, orders, -1)
+        if self._offset:
+            rows = rows[self._offset:]
+        if self._limit is not None:
+            if self._limit_to_last:
+                rows = rows[-self._limit:] if self._limit else []
+            else:
+                rows = rows[:self._limit]
+        return rows
+
+    def _bounded(self, rows, cursor, orders, side):
+        # side 1 keeps the rows after the cursor, -1 the rows before it
+        cursor, inclusive = cursor
+        bound = self._cursor_key(cursor, orders)
+        kept = []
+        for row in rows:
+            result = self._cursor_compare(row[0], bound, orders) * side
+            if result > 0 or (inclusive and result == 0):
+                kept.append(row)
+        return kept
+
+    def _snapshots(self, read_time=None):
+        client = self._client
+        return [
+            firestore.DocumentSnapshot(
+                client.document(path),
+                project(record.data, self._projection), True, read_time,
+                record.create_time, record.update_time
+            )
+            for _keys, path, record in self._rows()
+        ]
+
+
+class QueryPartition:
+    def __init__(self, query):
+        self._query = query
+        self.start_at = None
+        self.end_at = None
+
+    def query(self):
+        return self._query
+
+
+class CollectionGroup(Query):
+    # Built from a collection reference, like google.cloud.firestore's
+    def __init__(self, parent, all_descendants=True):
+        super().__init__(parent._client, parent.path, True)
+
+    def get_partitions(self, partition_count, **kwargs):
+        # Everything lives in one process, a single partition covers it
+        yield QueryPartition(self.order_by('__name__'))
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self):
+        if '/' not in self.path:
+            return None
+        return self._client.document(parent_path(self.path))
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = auto_id()
+        return self._client.document(self.path, document_id)
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        return reference.create(document_data), reference
+
+    def list_documents(self, page_size=None):
+        return iter([
+            self._client.document(path)
+            for path, _record in self._client._store.records(self.path)
+        ])
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.path)
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def __eq__(self, other):
+        if isinstance(other, (DocumentReference,
+                              base_document.BaseDocumentReference)):
+            return self.path == other.path
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.path)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @property
+    def parent(self):
+        return self._client.collection(parent_path(self.path))
+
+    def collection(self, collection_id):
+        return self._client.collection(self.path, collection_id)
+
+    def collections(self, page_size=None):
+        return iter([
+            self._client.collection(path)
+            for path in self._client._store.collections(self.path)
+        ])
+
+    def get(self, field_paths=None, transaction=None):
+        return next(self._client.get_all(
+            [self], field_paths, transaction=transaction
+        ))
+
+    def set(self, document_data, merge=False):
+        return self._write(Write('set', self.path, document_data, merge))
+
+    def create(self, document_data):
+        return self._write(Write('create', self.path, document_data))
+
+    def update(self, field_updates, option=None):
+        return self._write(Write('update', self.path, field_updates))
+
+    def delete(self, option=None):
+        return self._write(Write('delete', self.path)).update_time
+
+    def on_snapshot(self, callback):
+        return Watch(
+            self.parent.where('__name__', '==', self.path), callback
+        )
+
+    def _write(self, write):
+        store = self._client._store
+        if write.data is not None:
+            write.data = store.prepare(write.data)
+        return store.commit([write])[0]
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+        self.write_results = None
+        self.commit_time = None
+
+    def __len__(self):
+        return len(self._writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def _add(self, kind, reference, data=None, merge=False):
+        if data is not None:
+            data = self._client._store.prepare(data)
+        self._writes.append(Write(kind, reference.path, data, merge))
+
+    def set(self, reference, document_data, merge=False):
+        self._add('set', reference, document_data, merge)
+
+    def create(self, reference, document_data):
+        self._add('create', reference, document_data)
+
+    def update(self, reference, field_updates, option=None):
+        self._add('update', reference, field_updates)
+
+    def delete(self, reference, option=None):
+        self._add('delete', reference)
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self.write_results = self._client._store.commit(writes)
+        if self.write_results:
+            self.commit_time = self.write_results[0].update_time
+        return self.write_results
+
+
+class Transaction(WriteBatch):
+    """
+    Optimistic transaction: the update times of every document read are
+    checked again on commit, which raises Aborted when one changed so
+    that firestore.transactional retries the function.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        if self.in_progress:
+            raise ValueError('Transaction already in progress')
+        self._id = str(next(self._ids)).encode()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        if not self.in_progress:
+            raise ValueError('Transaction not in progress')
+        writes, reads = self._writes, self._reads
+        self._clean_up()
+        self.write_results = self._client._store.commit(writes, reads)
+        return self.write_results
+
+    def commit(self):
+        return self._commit()
+
+    def _add(self, kind, reference, data=None, merge=False):
+        if self._read_only:
+            raise ValueError(
+                'Cannot perform write operation in read-only transaction.'
+            )
+        super()._add(kind, reference, data, merge)
+
+    def _check_read(self):
+        if self._writes:
+            raise ValueError(
+                'Firestore transactions require all reads to be executed '
+                'before all writes.'
+            )
+
+    def _record(self, snapshots):
+        for snapshot in snapshots:
+            self._reads.setdefault(
+                snapshot.reference.path, snapshot.update_time
+            )
+
+    def get_all(self, references):
+        return self._client.get_all(references, transaction=self)
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            return self._client.get_all([ref_or_query], transaction=self)
+        if isinstance(ref_or_query, Query):
+            return ref_or_query.stream(transaction=self)
+        raise ValueError(
+            'Value for argument "ref_or_query" must be a DocumentReference '
+            'or a Query.'
+        )
+
+
+class AggregationQuery:
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def count(self, alias=None):
+        self._aggregations.append(('count', None, alias))
+        return self
+
+    def sum(self, field_ref, alias=None):
+        self._aggregations.append(('sum', parse(field_ref), alias))
+        return self
+
+    def avg(self, field_ref, alias=None):
+        self._aggregations.append(('avg', parse(field_ref), alias))
+        return self
+
+    def get(self, transaction=None):
+        read_time = datetime.datetime.now(datetime.timezone.utc)
+        rows = self._query._rows()
+        results = []
+        for i, (kind, parts, alias) in enumerate(self._aggregations):
+            if kind == 'count':
+                value = len(rows)
+            else:
+                values = [get_path(row[2].data, parts)[1] for row in rows]
+                values = [v for v in values if is_number(v)]
+                if kind == 'sum':
+                    value = sum(values)
+                else:
+                    value = sum(values) / len(values) if values else None
+            results.append(base_aggregation.AggregationResult(
+                alias or 'field_{}'.format(i + 1), value, read_time
+            ))
+        return [results]
+
+    def stream(self, transaction=None):
+        return iter(self.get(transaction))
+
+
+class Client:
+    """
+    In-memory stand-in for google.cloud.firestore.Client. Clients built
+    on the same Store see the same documents.
+    """
+
+    project = 'memory'
+    query_class = Query
+    collection_class = CollectionReference
+    collection_group_class = CollectionGroup
+    document_class = DocumentReference
+    batch_class = WriteBatch
+    transaction_class = Transaction
+    aggregation_class = AggregationQuery
+
+    def __init__(self, store=None):
+        self._store = store if store is not None else Store()
+
+    def collection(self, *collection_path):
+        return self.collection_class(self, join_path(collection_path, True))
+
+    def document(self, *document_path):
+        return self.document_class(self, join_path(document_path, False))
+
+    def collection_group(self, collection_id):
+        if '/' in collection_id:
+            raise ValueError(
+                'Invalid collection_id {!r}'.format(collection_id)
+            )
+        return self.collection_group_class(self.collection(collection_id))
+
+    def collections(self):
+        return iter([
+            self.collection(path) for path in self._store.collections()
+        ])
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        if transaction is not None:
+            transaction._check_read()
+        if field_paths is not None:
+            field_paths = [parse(f) for f in field_paths]
+        read_time = datetime.datetime.now(datetime.timezone.utc)
+        paths = list(dict.fromkeys(r.path for r in references))
+        with self._store._lock:
+            snapshots = [
+                self._store.snapshot(self, path, field_paths, read_time)
+                for path in paths
+            ]
+        if transaction is not None:
+            transaction._record(snapshots)
+        return iter(snapshots)
+
+    def batch(self):
+        return self.batch_class(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return self.transaction_class(self, max_attempts, read_only)
+
+    def close(self):
+        pass
+
+
+class AsyncQuery(Query):
+    async def get(self, transaction=None):
+        return Query.get(self, transaction)
+
+    async def stream(self, transaction=None):
+        for snapshot in Query.stream(self, transaction):
+            yield snapshot
+
+
+class AsyncCollectionGroup(AsyncQuery, CollectionGroup):
+    async def get_partitions(self, partition_count, **kwargs):
+        for partition in CollectionGroup.get_partitions(
+                self, partition_count):
+            yield partition
+
+
+class AsyncCollectionReference(AsyncQuery, CollectionReference):
+    async def add(self, document_data, document_id=None):
+        return CollectionReference.add(self, document_data, document_id)
+
+    async def list_documents(self, page_size=None):
+        for reference in CollectionReference.list_documents(self):
+            yield reference
+
+
+class AsyncDocumentReference(DocumentReference):
+    async def get(self, field_paths=None, transaction=None):
+        async for snapshot in self._client.get_all(
+                [self], field_paths, transaction=transaction):
+            return snapshot
+
+    async def set(self, document_data, merge=False):
+        return DocumentReference.set(self, document_data, merge)
+
+    async def create(self, document_data):
+        return DocumentReference.create(self, document_data)
+
+    async def update(self, field_updates, option=None):
+        return DocumentReference.update(self, field_updates)
+
+    async def delete(self, option=None):
+        return DocumentReference.delete(self)
+
+    async def collections(self, page_size=None):
+        for collection in DocumentReference.collections(self):
+            yield collection
+
+
+class AsyncWriteBatch(WriteBatch):
+    async def commit(self):
+        return WriteBatch.commit(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.commit()
+
+
+class AsyncTransaction(Transaction):
+    async def _begin(self, retry_id=None):
+        Transaction._begin(self, retry_id)
+
+    async def _rollback(self):
+        Transaction._rollback(self)
+
+    async def _commit(self):
+        return Transaction._commit(self)
+
+    async def commit(self):
+        return await self._commit()
+
+    async def get_all(self, references):
+        return self._client.get_all(references, transaction=self)
+
+    async def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            return self._client.get_all([ref_or_query], transaction=self)
+        if isinstance(ref_or_query, Query):
+            return ref_or_query.stream(transaction=self)
+        raise ValueError(
+            'Value for argument "ref_or_query" must be a DocumentReference '
+            'or a Query.'
+        )
+
+
+class AsyncAggregationQuery(AggregationQuery):
+    async def get(self, transaction=None):
+        return AggregationQuery.get(self, transaction)
+
+    async def stream(self, transaction=None):
+        for result in AggregationQuery.get(self, transaction):
+            yield result
+
+
+class AsyncClient(Client):
+    """In-memory stand-in for google.cloud.firestore.AsyncClient."""
+
+    query_class = AsyncQuery
+    collection_class = AsyncCollectionReference
+    collection_group_class = AsyncCollectionGroup
+    document_class = AsyncDocumentReference
+    batch_class = AsyncWriteBatch
+    transaction_class = AsyncTransaction
+    aggregation_class = AsyncAggregationQuery
+
+    async def collections(self):
+        for collection in Client.collections(self):
+            yield collection
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        for snapshot in Client.get_all(
+                self, references, field_paths, transaction):
+            yield snapshot
@@ -0,0 +1,42 @@
+from matchbox.instrumentation.adapters import (
+    LoggingListener,
+    OpenTelemetryListener,
+    PrometheusListener,
+)
+from matchbox.instrumentation.budget import QueryBudget, query_budget
+from matchbox.instrumentation.error import (
+    QueryBudgetExceeded,
+    QueryBudgetWarning,
+    RepeatedPointReads,
+)
+from matchbox.instrumentation.events import (
+    NULL_EVENT,
+    QueryEvent,
+    astream,
+    enabled,
+    listening,
+    start,
+    stream,
+    subscribe,
+    unsubscribe,
+)
+
+__all__ = [
+    LoggingListener,
+    NULL_EVENT,
+    OpenTelemetryListener,
+    PrometheusListener,
+    QueryBudget,
+    QueryBudgetExceeded,
+    QueryBudgetWarning,
+    QueryEvent,
+    RepeatedPointReads,
+    astream,
+    enabled,
+    listening,
+    query_budget,
+    start,
+    stream,
+    subscribe,
+    unsubscribe,
+]
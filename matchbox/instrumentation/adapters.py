@@ -0,0 +1,141 @@
+import logging
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace as opentelemetry_trace
+except ImportError:
+    opentelemetry_trace = None
+
+
+def requires(module, name, adapter):
+    if module is None:
+        raise ImportError('{} requires {} to be installed'.format(
+            adapter, name
+        ))
+    return module
+
+
+def model_name(event):
+    return event.model.__name__ if event.model is not None else ''
+
+
+class LoggingListener:
+    """
+    Log one line per operation, at `level`, or at WARNING when it took
+    at least `slow` seconds or raised.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG, slow=None):
+        if logger is None:
+            logger = logging.getLogger('matchbox.queries')
+        self.logger = logger
+        self.level = level
+        self.slow = slow
+
+    def __call__(self, event):
+        level = self.level
+        if event.error is not None or (
+                self.slow is not None and event.elapsed >= self.slow):
+            level = logging.WARNING
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(
+            level,
+            '%s %s %.1fms rpcs=%d reads=%d writes=%d bytes=%d filters=%r%s',
+            event.operation, event.collection, event.elapsed * 1000,
+            event.rpcs, event.reads, event.writes,
+            event.bytes_read + event.bytes_written, event.filters,
+            '' if event.error is None else ' error=%r' % event.error,
+        )
+
+
+class PrometheusListener:
+    """
+    Counters of operations, errors, RPCs, documents and bytes, and a
+    histogram of durations, labelled by model and operation.
+    """
+
+    def __init__(self, registry=None, namespace='matchbox'):
+        client = requires(
+            prometheus_client, 'prometheus_client', 'PrometheusListener'
+        )
+        options = {
+            'namespace': namespace, 'labelnames': ('model', 'operation'),
+        }
+        if registry is not None:
+            options['registry'] = registry
+
+        def counter(name, documentation):
+            return client.Counter(name, documentation, **options)
+
+        self.operations = counter('operations', 'Database operations')
+        self.errors = counter('errors', 'Failed database operations')
+        self.rpcs = counter('rpcs', 'Firestore RPCs')
+        self.reads = counter('documents_read', 'Documents read')
+        self.writes = counter('documents_written', 'Documents written')
+        self.bytes_read = counter('read_bytes', 'Bytes read')
+        self.bytes_written = counter('written_bytes', 'Bytes written')
+        self.duration = client.Histogram(
+            'operation_duration_seconds', 'Database operation duration',
+            **options
+        )
+
+    def __call__(self, event):
+        labels = (model_name(event), event.operation)
+        self.operations.labels(*labels).inc()
+        if event.error is not None:
+            self.errors.labels(*labels).inc()
+        for metric, value in [(self.rpcs, event.rpcs),
+                              (self.reads, event.reads),
+                              (self.writes, event.writes),
+                              (self.bytes_read, event.bytes_read),
+                              (self.bytes_written, event.bytes_written)]:
+            if value:
+                metric.labels(*labels).inc(value)
+        self.duration.labels(*labels).observe(event.elapsed)
+
+
+class OpenTelemetryListener:
+    """
+    Record every operation as a client span, named after the operation
+    and collection, under the span active when the operation finished.
+    """
+
+    def __init__(self, tracer=None):
+        trace = requires(
+            opentelemetry_trace, 'opentelemetry-api', 'OpenTelemetryListener'
+        )
+        if tracer is None:
+            tracer = trace.get_tracer('matchbox')
+        self.tracer = tracer
+        self.trace = trace
+
+    def __call__(self, event):
+        start = int(event.started * 1e9)
+        span = self.tracer.start_span(
+            '{} {}'.format(event.operation, event.collection or ''),
+            kind=self.trace.SpanKind.CLIENT,
+            start_time=start,
+            attributes={
+                'db.system': 'firestore',
+                'db.operation': event.operation,
+                'db.collection.name': event.collection or '',
+                'matchbox.model': model_name(event),
+                'matchbox.filters': repr(event.filters),
+                'matchbox.rpcs': event.rpcs,
+                'matchbox.documents_read': event.reads,
+                'matchbox.documents_written': event.writes,
+                'matchbox.bytes_read': event.bytes_read,
+                'matchbox.bytes_written': event.bytes_written,
+            },
+        )
+        if event.error is not None:
+            span.record_exception(event.error)
+            span.set_status(self.trace.Status(
+                self.trace.StatusCode.ERROR, str(event.error)
+            ))
+        span.end(end_time=start + int(event.elapsed * 1e9))
@@ -0,0 +1,147 @@
+import collections
+import contextvars
+import sys
+import threading
+import warnings
+
+from matchbox.instrumentation import error, events
+
+_active = contextvars.ContextVar('matchbox_query_budgets', default=())
+
+POINT_READS = {'get', 'refresh'}
+
+
+def caller():
+    # First frame outside the library: where the application (or a
+    # test) issued the operation.
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if not module.startswith('matchbox.') or module.startswith(
+                'matchbox.tests'):
+            return frame.f_code.co_filename, frame.f_lineno
+        frame = frame.f_back
+    return '<unknown>', 0
+
+
+class QueryBudget:
+    """
+    Count the operations issued inside the block, in the current thread
+    or task only, and raise QueryBudgetExceeded (or warn with
+    action='warn') once more than max_reads documents were read or more
+    than max_rpcs RPCs were made. With debug=True RPCs are also counted
+    per code location, and more than max_point_reads point reads of one
+    collection (an N+1 pattern, e.g. references loaded one by one) are
+    flagged with RepeatedPointReads.
+    """
+
+    actions = ('raise', 'warn')
+
+    def __init__(self, max_reads=None, max_rpcs=None, debug=False,
+                 max_point_reads=2, action='raise'):
+        if action not in self.actions:
+            raise AttributeError(
+                "action must be one of {}".format(', '.join(self.actions))
+            )
+        self.max_reads = max_reads
+        self.max_rpcs = max_rpcs
+        self.debug = debug
+        self.max_point_reads = max_point_reads
+        self.action = action
+        self.events = []
+        self.reads = 0
+        self.rpcs = 0
+        self.writes = 0
+        self.locations = collections.Counter()
+        self.point_reads = collections.Counter()
+        self.flagged = set()
+        self._token = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<QueryBudget: {} rpcs {} reads {} writes>'.format(
+            self.rpcs, self.reads, self.writes
+        )
+
+    def __enter__(self):
+        self._token = _active.set(_active.get() + (self, ))
+        events.subscribe(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        events.unsubscribe(self)
+        _active.reset(self._token)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.__exit__(exc_type, exc_val, exc_tb)
+
+    def __call__(self, event):
+        if self not in _active.get():
+            return
+        with self._lock:
+            self.record(event)
+
+    def record(self, event):
+        self.events.append(event)
+        self.reads += event.reads
+        self.rpcs += event.rpcs
+        self.writes += event.writes
+
+        location = None
+        if self.debug:
+            location = caller()
+            self.locations['{}:{}'.format(*location)] += event.rpcs
+            if event.operation in POINT_READS and event.reads:
+                self.point_reads[event.collection] += 1
+                if self.point_reads[event.collection] > self.max_point_reads:
+                    self.violation(
+                        ('point_reads', event.collection),
+                        error.RepeatedPointReads,
+                        '{} point reads of {} in one query_budget, use '
+                        'select_related() or in_bulk()'.format(
+                            self.point_reads[event.collection],
+                            event.collection
+                        ), event, location
+                    )
+
+        for name, used, limit in [('max_reads', self.reads, self.max_reads),
+                                  ('max_rpcs', self.rpcs, self.max_rpcs)]:
+            if limit is not None and used > limit:
+                self.violation(
+                    name, error.QueryBudgetExceeded,
+                    'Query budget exceeded: {} {} used, {} is {}'.format(
+                        used, name[4:], name, limit
+                    ), event, location
+                )
+
+    def violation(self, key, exception, message, event, location):
+        # Flag every problem once, and never hide the operation's own
+        # error behind it.
+        if key in self.flagged or event.error is not None:
+            return
+        self.flagged.add(key)
+        if location is None:
+            location = caller()
+        message = '{} (last: {} {} at {}:{})'.format(
+            message, event.operation, event.collection, *location
+        )
+        if self.action == 'raise':
+            raise exception(message)
+        warnings.warn_explicit(
+            message, error.QueryBudgetWarning, location[0], location[1]
+        )
+
+    def report(self):
+        """RPCs per code location, most expensive first."""
+        return '\n'.join(
+            '{:6d}  {}'.format(rpcs, location)
+            for location, rpcs in self.locations.most_common()
+        )
+
+
+def query_budget(max_reads=None, max_rpcs=None, debug=False,
+                 max_point_reads=2, action='raise'):
+    return QueryBudget(max_reads, max_rpcs, debug, max_point_reads, action)
@@ -0,0 +1,10 @@
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RepeatedPointReads(QueryBudgetExceeded):
+    pass
+
+
+class QueryBudgetWarning(UserWarning):
+    pass
@@ -0,0 +1,234 @@
+import contextlib
+import datetime
+import threading
+import time
+
+from firebase_admin import firestore
+
+_listeners = ()
+_subscribe_lock = threading.Lock()
+
+
+def subscribe(listener):
+    """
+    Call listener(event) with a QueryEvent after every database
+    operation. Returns the listener, so it can be used as a decorator.
+    """
+    global _listeners
+    with _subscribe_lock:
+        _listeners = _listeners + (listener, )
+    return listener
+
+
+def unsubscribe(listener):
+    global _listeners
+    with _subscribe_lock:
+        _listeners = tuple(li for li in _listeners if li != listener)
+
+
+@contextlib.contextmanager
+def listening(listener):
+    subscribe(listener)
+    try:
+        yield listener
+    finally:
+        unsubscribe(listener)
+
+
+def enabled():
+    return bool(_listeners)
+
+
+def value_size(value):
+    # Storage sizes as documented for Firestore
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime.datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, firestore.GeoPoint):
+        return 16
+    if isinstance(value, dict):
+        return sum(value_size(k) + value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(v) for v in value)
+    if hasattr(value, 'path'):
+        return name_size(value.path)
+    return 0
+
+
+def name_size(path):
+    return sum(len(s.encode('utf-8')) + 1 for s in path.split('/')) + 16
+
+
+def document_size(snapshot):
+    return name_size(snapshot.reference.path) + value_size(
+        snapshot.to_dict() or {}
+    ) + 32
+
+
+class QueryEvent:
+    """
+    One database operation issued by the ORM: the model and operation
+    name, the compiled Firestore filters, the number of RPCs, documents
+    and bytes read and written, and the elapsed time in seconds. For
+    streamed results elapsed only counts the time spent waiting for the
+    stream, not the caller's work between documents. Events are sent to
+    the listeners once the operation is done, with `error` set if it
+    raised.
+    """
+
+    def __init__(self, model, operation, filters=None):
+        self.model = model
+        self.operation = operation
+        self.filters = filters or []
+        self.collection = None
+        if model is not None:
+            self.collection = model.full_collection_name()
+        self.started = time.time()
+        self.elapsed = None
+        self.rpcs = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.error = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<QueryEvent: {} {} {:.1f}ms>'.format(
+            self.operation, self.collection, (self.elapsed or 0) * 1000
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.finish(exc_val)
+
+    def rpc(self, count=1):
+        with self._lock:
+            self.rpcs += count
+
+    def read(self, snapshots):
+        size = count = 0
+        for snapshot in snapshots:
+            if snapshot.exists:
+                count += 1
+                size += document_size(snapshot)
+        with self._lock:
+            self.reads += count
+            self.bytes_read += size
+
+    def write(self, count=1, data=()):
+        size = sum(value_size(d) for d in data)
+        with self._lock:
+            self.writes += count
+            self.bytes_written += size
+
+    def finish(self, error=None):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._start
+        self.error = error
+        # Every listener sees the event even if one of them raises
+        raised = None
+        for listener in _listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                raised = raised or e
+        if raised is not None:
+            raise raised
+
+
+class NullEvent:
+    """Stand-in for QueryEvent while nobody listens."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def rpc(self, count=1):
+        pass
+
+    def read(self, snapshots):
+        pass
+
+    def write(self, count=1, data=()):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+
+NULL_EVENT = NullEvent()
+
+
+def start(model, operation, filters=None):
+    if not _listeners:
+        return NULL_EVENT
+    return QueryEvent(model, operation, filters)
+
+
+def stream(event, snapshots):
+    """
+    Yield from a lazy stream of snapshots, counting them into event,
+    which finishes when the stream is exhausted, fails or is closed.
+    """
+    if event is NULL_EVENT:
+        return snapshots
+    return _stream(event, iter(snapshots))
+
+
+def _stream(event, snapshots):
+    error, waited = None, 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                snapshot = next(snapshots)
+            except StopIteration:
+                return
+            finally:
+                waited += time.perf_counter() - started
+            event.read([snapshot])
+            yield snapshot
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        event.elapsed = waited
+        event.finish(error)
+
+
+def astream(event, snapshots):
+    if event is NULL_EVENT:
+        return snapshots
+    return _astream(event, snapshots.__aiter__())
+
+
+async def _astream(event, snapshots):
+    error, waited = None, 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                snapshot = await snapshots.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                waited += time.perf_counter() - started
+            event.read([snapshot])
+            yield snapshot
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        event.elapsed = waited
+        event.finish(error)
@@ -5,3 +5,7 @@ class DBTypeError(Exception):
 
 class ReferenceCollectionObjectDoesNotExist(Exception):
     pass
+
+
+class BlockingReferenceLoad(Exception):
+    pass
@@ -10,11 +10,20 @@ class FieldValidator:
         self.field = field
         self.attributes = attributes or {}
 
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, attributes):
+        self._attributes = attributes
+        self.checked = False
+
     @property
     def default(self):
         return self.attributes.get('default')
 
-    def validate(self, f_name, value):
+    def check_attributes(self):
         for attr in self.attributes:
             if attr not in self.ATTRIBUTES:
                 raise AttributeError('Attribute {} not recognize'.format(attr))
@@ -24,6 +33,11 @@ class FieldValidator:
                         self.field.__class__.__name__, attr
                     )
                 )
+        self.checked = True
+
+    def validate(self, f_name, value):
+        if not self.checked:
+            self.check_attributes()
 
         if self.default is not None and value is None:
             # check for factory
@@ -1,4 +1,5 @@
 import datetime
+import types
 from firebase_admin import firestore
 
 from matchbox.database import db
@@ -7,9 +8,67 @@ from matchbox.models import field_validator
 from matchbox.models import error
 
 
+NOT_SET = object()
+
+
+class DeferredAttribute:
+    """
+    Class attribute standing in for a field value. Loaded values live in
+    the instance __dict__ and shadow it; a field left out by only() or
+    defer() is fetched from Firestore on first access.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return None
+        value = self.raw(instance)
+        if value is NOT_SET:
+            value = self.load(instance)
+        return None if value is NOT_SET else value
+
+    def raw(self, instance):
+        return instance.__dict__.get(self.name, NOT_SET)
+
+    def load(self, instance):
+        deferred = getattr(instance, '_deferred', None)
+        if not deferred or self.name not in deferred:
+            return NOT_SET
+        attributes = instance._meta.attributes
+        instance.refresh_from_db(fields=[
+            f_name for f_name in deferred
+            if attributes[f_name].raw(instance) is NOT_SET
+        ])
+        return self.raw(instance)
+
+
+class SlotAttribute(DeferredAttribute):
+    """
+    Field access for models with Meta slots = True. The slot member
+    descriptor stays on the class so reads and writes run at C speed;
+    this object is only kept in _meta.attributes and used by the model
+    __getattr__ for unset and deferred fields.
+    """
+
+    def __init__(self, name, member):
+        super().__init__(name)
+        self.member = member
+
+    def raw(self, instance):
+        try:
+            return self.member.__get__(instance)
+        except AttributeError:
+            return NOT_SET
+
+
 class Field:
 
     allowed_attributes = []
+    # Values that can change in place, which dirty tracking snapshots
+    # when they are loaded
+    mutable = False
 
     def __init__(self, *args, **kwargs):
         self.raw_attributes = kwargs
@@ -24,13 +83,21 @@ class Field:
         self.model = None
 
     def contribute_to_class(self, model, name):
+        self.field_validator.check_attributes()
         self.name = name
-        setattr(model, name, None)
+        member = model.__dict__.get(name)
+        if isinstance(member, types.MemberDescriptorType):
+            attribute = SlotAttribute(name, member)
+        else:
+            attribute = DeferredAttribute(name)
+            setattr(model, name, attribute)
+        model._meta.attributes[name] = attribute
         model._meta.add_field(self)
 
     def lookup_value(self, lookup_type, value):
         val = self.field_validator.validate(self.name, value)
-        if val is None:
+        # SERVER_TIMESTAMP, Increment etc. are resolved by Firestore
+        if val is None or models_utils.is_sentinel(val):
             return val
         return self.db_value(val)
 
@@ -136,6 +203,7 @@ class BooleanField(Field):
 
 class ListField(Field):
     allowed_attributes = ['blank', 'default']
+    mutable = True
 
     def db_value(self, value):
         if not isinstance(value, list):
@@ -153,6 +221,7 @@ class ListField(Field):
 
 class MapField(Field):
     allowed_attributes = ['blank', 'default']
+    mutable = True
 
     def db_value(self, value):
         if not isinstance(value, dict):
@@ -170,6 +239,7 @@ class MapField(Field):
 
 class GeoPointField(Field):
     allowed_attributes = ['blank', 'default']
+    mutable = True
 
     def db_value(self, value):
         if not isinstance(value, models_utils.GeoPointValue):
@@ -215,3 +285,63 @@ class ReferenceField(Field):
 
     def python_value(self, value):
         return value
+
+
+def compile_serializer(model_fields):
+    """
+    Build to_db(data, partial=False) for a model: one loop applying
+    defaults, blank checks, max_length and db_value for every field, with
+    all attribute lookups done once here instead of on every value.
+    Fields overriding lookup_value keep going through it.
+    """
+    plan = []
+    for field in model_fields:
+        field.field_validator.check_attributes()
+        attributes = field.field_validator.attributes
+        custom = None
+        if type(field).lookup_value is not Field.lookup_value:
+            custom = field.lookup_value
+        plan.append((
+            field.name,
+            field.db_column_name,
+            custom,
+            attributes.get('default'),
+            attributes.get('blank'),
+            attributes.get('max_length'),
+            field.db_value,
+        ))
+    names = {p[0] for p in plan}
+    is_sentinel = models_utils.is_sentinel
+
+    def to_db(data, partial=False):
+        if partial:
+            for name in data:
+                if name not in names:
+                    raise AttributeError('Field name %s not found' % name)
+
+        out = {}
+        for (name, column, custom, default, blank, max_length,
+             db_value) in plan:
+            if partial and name not in data:
+                continue
+            value = data.get(name)
+            if custom is not None:
+                out[column] = custom(None, value)
+                continue
+
+            if value is None and default is not None:
+                value = default() if callable(default) else default
+            if value is None:
+                if not blank:
+                    raise AttributeError(
+                        'Field {} required value'.format(name)
+                    )
+                out[column] = None
+                continue
+
+            if max_length:
+                value = value[:max_length]
+            out[column] = value if is_sentinel(value) else db_value(value)
+        return out
+
+    return to_db
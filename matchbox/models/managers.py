@@ -37,6 +37,9 @@ class BaseManager:
     def filter(self, **kwargs):
         return self.get_queryset().filter(**kwargs)
 
+    def select_related(self, *lookups, depth=1):
+        return self.get_queryset().select_related(*lookups, depth=depth)
+
     def create(self, **kwargs):
         return self.get_queryset().create(**kwargs)
 
@@ -47,7 +50,42 @@ class BaseManager:
         return self.get_queryset().get(**kwargs)
 
     def delete(self, **kwargs):
-        self.get_queryset().delete(**kwargs)
+        return self.get_queryset().delete(**kwargs)
+
+    def bulk_create(self, instances, batch_size=500, workers=4):
+        return self.get_queryset().bulk_create(
+            instances, batch_size=batch_size, workers=workers
+        )
+
+    def bulk_update(self, instances, fields, batch_size=500, workers=4):
+        return self.get_queryset().bulk_update(
+            instances, fields, batch_size=batch_size, workers=workers
+        )
+
+    def bulk_delete(self, ids, batch_size=500, workers=4):
+        return self.get_queryset().bulk_delete(
+            ids, batch_size=batch_size, workers=workers
+        )
+
+    def in_bulk(self, ids):
+        return self.get_queryset().in_bulk(ids)
+
+    def mirror(self):
+        return self.get_queryset().mirror()
+
+    async def aget(self, **kwargs):
+        return await self.get_queryset().aget(**kwargs)
+
+    async def acreate(self, **kwargs):
+        return await self.get_queryset().acreate(**kwargs)
+
+    async def aupdate(self, **kwargs):
+        await self.get_queryset().aupdate(**kwargs)
+
+    async def abulk_create(self, instances, batch_size=500, workers=4):
+        return await self.get_queryset().abulk_create(
+            instances, batch_size=batch_size, workers=workers
+        )
 
 
 class Manager(BaseManager):
@@ -1,10 +1,39 @@
+from types import MappingProxyType
+
+from matchbox import cache as model_cache
+from matchbox import instrumentation, sessions
+from matchbox.database import db
 from matchbox.models import utils
 from matchbox.models import fields
 from matchbox.models import managers
+from matchbox.queries import error as queries_error
+from matchbox.queries import queries_result
+
+# Dirty tracking: the id an instance was loaded with, and the loaded
+# state of its fields. That state is a tuple of the mutable_fields
+# snapshots until the first change, then a dict that also holds the
+# fields changed since the load.
+TRACKING_STATE = ('_loaded', '_original')
+
+
+def slot_getattr(instance, name):
+    # Only reached when a slot is unset: load it if deferred, else None
+    if name in TRACKING_STATE:
+        return None
+    attribute = instance._meta.attributes.get(name)
+    if not isinstance(attribute, fields.SlotAttribute):
+        raise AttributeError(
+            "'%s' object has no attribute '%s'" % (
+                instance.__class__.__name__, name
+            )
+        )
+    value = attribute.load(instance)
+    return None if value is fields.NOT_SET else value
 
 
 class BaseModel(type):
     def __new__(mcs, name, base, attrs):
+        attrs, slot_fields = mcs.slots_layout(base, attrs)
         cls = super().__new__(mcs, name, base, attrs)
 
         if 'Meta' not in attrs:
@@ -20,6 +49,20 @@ class BaseModel(type):
                     cls.__name__
                 )
                 self.abstract = False
+                self.slots = False
+                self.attributes = {}
+                self.mutable_fields = ()
+                self.cache = None
+                self.mirror = None
+                self._columns = {}
+                self._hydration_plan = {}
+                self._serializer = None
+                # Read-only views, kept up to date by add_field
+                self.fields_by_name = MappingProxyType(self.fields)
+                self.fields_by_column = MappingProxyType(self._columns)
+                self.hydration_plan = MappingProxyType(
+                    self._hydration_plan
+                )
 
             def get_id_field_name(self):
                 for _name, field in self.fields.items():
@@ -36,11 +79,31 @@ class BaseModel(type):
 
             def add_field(self, field):
                 self.fields[field.name] = field
+                self._serializer = None
+                if field.mutable and field.name not in self.mutable_fields:
+                    self.mutable_fields += (field.name, )
+                self._columns.setdefault(field.name, field)
+                self._columns[field.db_column_name] = field
+
+                # column -> (field, python_value), python_value is None
+                # for references, which are resolved by the query layer
+                python_value = None
+                if not isinstance(field, fields.ReferenceField):
+                    python_value = field.python_value
+                for column, c_field in self._columns.items():
+                    if c_field is field:
+                        self._hydration_plan[column] = (field, python_value)
+
+            def to_db(self, data, partial=False):
+                if self._serializer is None:
+                    self._serializer = fields.compile_serializer(
+                        self.fields.values()
+                    )
+                return self._serializer(data, partial)
 
             def get_field_by_column_name(self, f_name):
-                for field in self.fields.values():
-                    if f_name in [field.name, field.db_column_name]:
-                        return field
+                if f_name in self._columns:
+                    return self._columns[f_name]
                 raise AttributeError('Field name %s not found' % f_name)
 
             def set_from_model_meta(self, model_meta):
@@ -49,6 +112,21 @@ class BaseModel(type):
                         self.collection_name = m_val
                     if m_name == 'abstract':
                         self.abstract = m_val
+                    if m_name == 'cache':
+                        self.set_cache(m_val)
+                    if m_name == 'slots':
+                        self.slots = m_val
+
+            def set_cache(self, cache):
+                if cache is True:
+                    cache = model_cache.LocalCache()
+                elif cache is False:
+                    cache = None
+                if not isinstance(cache, (model_cache.BaseCache, type(None))):
+                    raise AttributeError(
+                        'Meta cache must be True or a BaseCache instance'
+                    )
+                self.cache = cache
 
         _meta = Meta(cls)
         setattr(cls, '_meta', _meta)
@@ -66,7 +144,7 @@ class BaseModel(type):
                     continue
                 attr.contribute_to_class(cls, name)
 
-        for name, attr in cls.__dict__.items():
+        for name, attr in list(cls.__dict__.items()) + slot_fields:
             if (
                 isinstance(attr, type) and name == 'Meta'
             ):
@@ -99,8 +177,45 @@ class BaseModel(type):
 
         return cls
 
+    @staticmethod
+    def slots_layout(base, attrs):
+        """
+        With Meta slots = True, give every field, the id and the tracking
+        state a slot instead of the instance __dict__. Field attributes
+        would clash with their slots, so they are taken out of the class
+        body and returned to be contributed after the class is created.
+        """
+        meta = attrs.get('Meta')
+        if getattr(meta, 'abstract', False):
+            # Keeps __dict__ out of slotted subclasses
+            return dict(attrs, __slots__=attrs.get('__slots__', ())), []
+        if not getattr(meta, 'slots', False):
+            return attrs, []
+
+        slot_fields = [
+            (name, attr) for name, attr in attrs.items()
+            if isinstance(attr, fields.Field)
+        ]
+        inherited = [
+            name for bc in base if bc._meta.abstract
+            for name in bc._meta.fields
+        ]
+        attrs = {
+            name: attr for name, attr in attrs.items()
+            if not isinstance(attr, fields.Field)
+        }
+        names = [name for name, _attr in slot_fields] + inherited
+        attrs['__slots__'] = tuple(dict.fromkeys(
+            names + ['id', '_deferred'] + list(TRACKING_STATE)
+        ))
+        attrs['__getattr__'] = slot_getattr
+        return attrs, slot_fields
+
 
 class Model(metaclass=BaseModel):
+    __slots__ = ()
+    _loaded = None
+    _original = None
 
     def __init__(self, *args, **kwargs):
         if self._meta.abstract:
@@ -111,6 +226,20 @@ class Model(metaclass=BaseModel):
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def __setattr__(self, name, value):
+        # Copy on write: keep the loaded state of a field when it is first
+        # changed, so loading costs nothing for the untouched ones.
+        if self._loaded is not None:
+            attribute = self._meta.attributes.get(name)
+            if attribute is not None:
+                original = self._original
+                if not isinstance(original, dict):
+                    original = self._originals()
+                    object.__setattr__(self, '_original', original)
+                if name not in original:
+                    original[name] = self._state_value(attribute.raw(self))
+        object.__setattr__(self, name, value)
+
     @classmethod
     def collection_name(cls):
         return cls._meta.collection_name
@@ -149,13 +278,153 @@ class Model(metaclass=BaseModel):
     def model_path(self):
         return self.path + (self.id, )
 
+    def refresh_from_db(self, fields=None):
+        if fields is None:
+            fields = list(self._meta.fields)
+        columns = [self._meta.get_field(f).db_column_name for f in fields]
+        ref = db.conn.collection(self.full_collection_name()).document(
+            self.id
+        )
+        with instrumentation.start(
+                self.__class__, 'refresh',
+                [('__name__', '==', ref.path)]) as event:
+            event.rpc()
+            db_val = ref.get(utils.field_paths(columns))
+            event.read([db_val])
+        if not db_val.exists:
+            raise queries_error.DocumentDoesNotExists(
+                '{} matching query does not exist'.format(
+                    self.__class__.__name__
+                )
+            )
+        tracked = self._loaded is not None
+        queries_result.QueryResultWrapper.fill(self, db_val)
+        if not tracked:
+            # The other fields set on the instance were never written
+            self._mark_changed(set(fields) | {'id'})
+        deferred = getattr(self, '_deferred', None)
+        if deferred:
+            deferred.difference_update(fields)
+
     def save(self, update_fields=None):
-        if update_fields is not None:
+        if update_fields is None and self._is_tracked():
+            update_fields = self.changed_fields()
+            if not update_fields:
+                return
+
+        session = sessions.current()
+        if session is not None:
+            session.save(self, update_fields)
+        elif update_fields is not None:
             self._update(update_fields)
         else:
             self._save()
 
+    async def asave(self, update_fields=None):
+        if update_fields is None and self._is_tracked():
+            update_fields = self.changed_fields()
+            if not update_fields:
+                return
+
+        session = sessions.current()
+        if session is not None:
+            session.save(self, update_fields)
+        elif update_fields is not None:
+            await self.__class__.objects.aupdate(
+                **self._get_update_fields(update_fields)
+            )
+            self._mark_loaded(update_fields)
+        else:
+            self.id = (await self.__class__.objects.acreate(
+                **self.get_fields()
+            )).id
+            self._mark_loaded()
+
+    def changed_fields(self):
+        """
+        Names of the fields set on the instance that differ from the
+        state last loaded from or written to Firestore.
+        """
+        attributes = self._meta.attributes
+        if self._loaded is None:
+            return [
+                name for name, attribute in attributes.items()
+                if attribute.raw(self) is not fields.NOT_SET
+            ]
+        original = self._originals()
+        changed = []
+        for name, attribute in attributes.items():
+            if name not in original:
+                continue
+            value = attribute.raw(self)
+            if value is fields.NOT_SET:
+                continue
+            if original[name] != self._state_value(value):
+                changed.append(name)
+        return changed
+
+    def _is_tracked(self):
+        # A changed id means a new document, which needs a full set()
+        return self.id is not None and self._loaded == self.id
+
+    def _originals(self):
+        original = self._original
+        if isinstance(original, dict):
+            return original
+        return {
+            name: state for name, state in zip(
+                self._meta.mutable_fields, original or ()
+            ) if state is not fields.NOT_SET
+        }
+
+    def _mark_loaded(self, names=None):
+        attributes = self._meta.attributes
+        if names is None:
+            object.__setattr__(self, '_loaded', self.id)
+            object.__setattr__(self, '_original', tuple(
+                self._state_value(attributes[name].raw(self))
+                for name in self._meta.mutable_fields
+            ) or None)
+            return
+        if self._loaded is None:
+            return
+        original = self._originals()
+        for name in names:
+            original.pop(name, None)
+            value = attributes[name].raw(self)
+            if name in self._meta.mutable_fields and \
+                    value is not fields.NOT_SET:
+                original[name] = self._state_value(value)
+        object.__setattr__(self, '_original', original)
+
+    def _mark_changed(self, loaded):
+        # Fields set but not loaded compare as changed
+        original = self._originals()
+        for name, attribute in self._meta.attributes.items():
+            if name not in loaded and \
+                    attribute.raw(self) is not fields.NOT_SET:
+                original.setdefault(name, fields.NOT_SET)
+        object.__setattr__(self, '_original', original)
+
+    @classmethod
+    def _state_value(cls, value):
+        # Copy containers and geo points so in-place changes are
+        # detected, and keep references as (model, id) so proxies are
+        # never loaded.
+        if isinstance(value, Model):
+            return value.__class__, value.id
+        if isinstance(value, utils.GeoPointValue):
+            return value.__class__, value.latitude, value.longitude
+        if isinstance(value, list):
+            return tuple(cls._state_value(v) for v in value)
+        if isinstance(value, dict):
+            return {k: cls._state_value(v) for k, v in value.items()}
+        return value
+
     def delete(self):
+        session = sessions.current()
+        if session is not None:
+            session.discard(self)
         self.__class__.objects.delete(
             id=self.id
         )
@@ -166,17 +435,20 @@ class Model(metaclass=BaseModel):
             **self._get_update_fields(
                 update_fields
             ))
+        self._mark_loaded(update_fields)
 
     def _save(self):
         self.id = self.__class__.objects.create(
             **self.get_fields()
         ).id
+        self._mark_loaded()
 
     def _get_update_fields(self, update_fields):
         if type(update_fields) not in [list, tuple]:
             raise AttributeError('update_fields must be list or tuple')
+        # Read only the listed fields so deferred ones are not loaded
         return {
-            k: v
-            for k, v in self.get_fields().items()
-            if k in update_fields + ['id']
+            k: getattr(self, k)
+            for k in self._meta.fields
+            if k in list(update_fields) + ['id']
         }
@@ -4,6 +4,8 @@ import iso8601
 import google
 
 from firebase_admin import firestore
+from google.cloud.firestore_v1 import field_path
+from google.cloud.firestore_v1 import transforms
 
 from matchbox import database
 
@@ -17,6 +19,30 @@ class GeoPointValue:
         return firestore.GeoPoint(self.latitude, self.longitude)
 
 
+SENTINEL_TYPES = (
+    transforms.Sentinel,
+    transforms.ArrayUnion,
+    transforms.ArrayRemove,
+    transforms.Increment,
+    transforms.Maximum,
+    transforms.Minimum,
+)
+
+
+def is_sentinel(value):
+    return isinstance(value, SENTINEL_TYPES)
+
+
+def contains_sentinel(value):
+    if isinstance(value, dict):
+        return any(contains_sentinel(v) for v in value.values())
+    return is_sentinel(value)
+
+
+def field_paths(columns):
+    return [field_path.FieldPath(c).to_api_repr() for c in columns]
+
+
 def convert_name(name):
     return re.sub('(?!^)([A-Z]+)', r'_\1', name).lower()
 
@@ -0,0 +1,101 @@
+import datetime
+
+from matchbox.models import fields
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+
+def requires(module, name, method):
+    if module is None:
+        raise ImportError('{}() requires {} to be installed'.format(
+            method, name
+        ))
+    return module
+
+
+def column_converter(field):
+    """
+    Per-value conversion for column output. Cheaper than python_value
+    for the types that matter in bulk: timestamps stay the datetimes
+    Firestore returns and references become the referenced ids.
+    """
+    if isinstance(field, fields.TimeStampField):
+        return None
+    if isinstance(field, fields.ReferenceField):
+        return lambda value: value.id if value is not None else None
+    if isinstance(field, (fields.TextField, fields.BooleanField,
+                          fields.ListField, fields.MapField)):
+        return None
+    return field.python_value
+
+
+def utc(value):
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def numpy_array(field, values):
+    np = requires(numpy, 'numpy', 'to_columns')
+    has_null = any(v is None for v in values)
+    if isinstance(field, fields.IntegerField):
+        if not has_null:
+            return np.array(values, dtype='int64')
+        return np.array(
+            [np.nan if v is None else v for v in values], dtype='float64'
+        )
+    if isinstance(field, fields.BooleanField) and not has_null:
+        return np.array(values, dtype='bool')
+    if isinstance(field, fields.TimeStampField):
+        return np.array([utc(v) for v in values], dtype='datetime64[us]')
+    return np.array(values, dtype='object')
+
+
+def concat_arrays(field, arrays):
+    np = requires(numpy, 'numpy', 'to_columns')
+    if not arrays:
+        return numpy_array(field, [])
+    if len(arrays) == 1:
+        return arrays[0]
+    # A chunk with nulls widens the whole column, as for a single chunk
+    return np.concatenate(arrays)
+
+
+def arrow_array(field, values):
+    pa = requires(pyarrow, 'pyarrow', 'to_arrow')
+    if isinstance(field, fields.IntegerField):
+        return pa.array(values, type=pa.int64())
+    if isinstance(field, fields.BooleanField):
+        return pa.array(values, type=pa.bool_())
+    if isinstance(field, fields.TimeStampField):
+        return pa.array(
+            [utc(v) for v in values], type=pa.timestamp('us', tz='UTC')
+        )
+    if isinstance(field, (fields.TextField, fields.IDField,
+                          fields.ReferenceField)):
+        return pa.array(values, type=pa.string())
+    return pa.array(values)
+
+
+def pandas_series(field, values):
+    pd = requires(pandas, 'pandas', 'to_pandas')
+    if isinstance(field, fields.IntegerField):
+        return pd.Series(values, dtype='Int64')
+    if isinstance(field, fields.BooleanField):
+        return pd.Series(values, dtype='boolean')
+    if isinstance(field, fields.TimeStampField):
+        return pd.to_datetime(pd.Series(values, dtype='object'), utc=True)
+    return pd.Series(values, dtype='object')
@@ -5,3 +5,7 @@ class DocumentDoesNotExists(Exception):
 
 class MultipleObjectsReturned(Exception):
     pass
+
+
+class InvalidPageToken(Exception):
+    pass
@@ -0,0 +1,161 @@
+import threading
+
+from google.cloud.firestore_v1.watch import ChangeType
+
+from matchbox.database import db, memory
+
+# Value of a field the document doesn't have, which no filter matches
+MISSING = object()
+
+
+def filter_key(operator, expected):
+    # Values compare by their Firestore order key, so booleans never
+    # equal numbers and references compare by path
+    if operator == 'in':
+        return {memory.order_key(e) for e in expected}
+    return memory.order_key(expected)
+
+
+def matches(value, operator, key):
+    if value is MISSING:
+        return False
+    if operator == 'array_contains':
+        return isinstance(value, list) and key in {
+            memory.order_key(v) for v in value
+        }
+    value = memory.order_key(value)
+    if operator == '==':
+        return value == key
+    if operator == 'in':
+        return value in key
+    # Range filters only match values of the same type
+    if value[0] != key[0] or memory.NAN in (value, key):
+        return False
+    if operator == '<':
+        return value < key
+    if operator == '<=':
+        return value <= key
+    if operator == '>':
+        return value > key
+    if operator == '>=':
+        return value >= key
+    raise AttributeError('Operator %s is not supported by mirror' % operator)
+
+
+class Mirror:
+    """
+    In-memory copy of a collection kept up to date by an on_snapshot
+    listener. Snapshots are stored as received and hydrated on read, so
+    every query gets its own model instances. Equality filters are served
+    from per-column indexes built on first use.
+    """
+
+    operators = {'==', '<', '<=', '>', '>=', 'in', 'array_contains'}
+
+    def __init__(self, model):
+        self.model = model
+        self.path = model.full_collection_name()
+        self.ready = threading.Event()
+        self._docs = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._watch = None
+
+    def start(self, conn=None):
+        if conn is None:
+            conn = db.conn
+        self._watch = conn.collection(self.path).on_snapshot(
+            self.on_snapshot
+        )
+        self.model._meta.mirror = self
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        if self.model._meta.mirror is self:
+            self.model._meta.mirror = None
+        self.ready.clear()
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                snapshot = change.document
+                self.unindex(snapshot.id)
+                if change.type == ChangeType.REMOVED:
+                    self._docs.pop(snapshot.id, None)
+                    continue
+                self._docs[snapshot.id] = (snapshot, snapshot.to_dict())
+                self.index(snapshot.id)
+        self.ready.set()
+
+    def serves(self, wheres):
+        if not self.ready.is_set():
+            return False
+        if self.model.full_collection_name() != self.path:
+            return False
+        return all(w[1] in self.operators for w in wheres)
+
+    def match(self, wheres):
+        wheres = [(c, o, filter_key(o, v)) for c, o, v in wheres]
+        with self._lock:
+            docs = [
+                snapshot for snapshot, data in self.candidates(wheres)
+                if all(
+                    matches(self.value(data, c), o, k) for c, o, k in wheres
+                )
+            ]
+        # Firestore returns unordered queries sorted by document id
+        return sorted(docs, key=lambda d: d.id)
+
+    def candidates(self, wheres):
+        ids = None
+        for column, operator, key in wheres:
+            if operator != '==':
+                continue
+            found = self.get_index(column).get(key, set())
+            ids = found if ids is None else ids & found
+        if ids is None:
+            return list(self._docs.values())
+        return [self._docs[i] for i in ids]
+
+    def get_index(self, column):
+        if column not in self._indexes:
+            self._indexes[column] = {}
+            for doc_id in self._docs:
+                self.index(doc_id, [column])
+        return self._indexes[column]
+
+    def index(self, doc_id, columns=None):
+        _snapshot, data = self._docs[doc_id]
+        for column in columns or self._indexes:
+            value = self.value(data, column)
+            if value is not MISSING:
+                self._indexes[column].setdefault(
+                    memory.order_key(value), set()
+                ).add(doc_id)
+
+    def unindex(self, doc_id):
+        if doc_id not in self._docs:
+            return
+        _snapshot, data = self._docs[doc_id]
+        for column, index in self._indexes.items():
+            value = self.value(data, column)
+            if value is not MISSING:
+                index.get(memory.order_key(value), set()).discard(doc_id)
+
+    @staticmethod
+    def value(data, column):
+        value = data
+        for key in column.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return MISSING
+            value = value[key]
+        return value
@@ -1,44 +1,212 @@
+import base64
+import binascii
+import contextvars
+import datetime
+import itertools
+import json
+from concurrent import futures
+
+from firebase_admin import firestore
+
+from matchbox.database import db
+from .error import InvalidPageToken
+from . import queries_result
 from .queries_result import QueryResultWrapper
 
+NEXT = 'n'
+PREVIOUS = 'p'
+INEQUALITIES = {'<', '<=', '>', '>=', '!=', 'not-in'}
+
+
+def encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, firestore.GeoPoint):
+        return {'$geo': [value.latitude, value.longitude]}
+    if isinstance(value, dict):
+        return {'$map': {k: encode_value(v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return [encode_value(v) for v in value]
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    if hasattr(value, 'path') and hasattr(value, 'id'):
+        return {'$ref': value.path}
+    raise TypeError(type(value))
+
+
+def decode_value(value):
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if '$dt' in value:
+        return datetime.datetime.fromisoformat(value['$dt'])
+    if '$geo' in value:
+        return firestore.GeoPoint(*value['$geo'])
+    if '$ref' in value:
+        return db.conn.document(value['$ref'])
+    return {k: decode_value(v) for k, v in value['$map'].items()}
+
+
+class Page(list):
+    """
+    Model instances of one page, with the tokens of its neighbours.
+    A token is None when there is no page in that direction.
+    """
+
+    def __init__(self, items, next_token=None, previous_token=None):
+        super().__init__(items)
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_token is not None
+
 
 class Paginator:
-    def __init__(self, query, page_count):
+    """
+    Cursor based pages of a query. The query itself is never modified.
+    Page tokens are opaque url-safe strings holding the boundary document
+    path and the values it is ordered by, so a page can be requested
+    again from a token alone, e.g. in a stateless HTTP API. Iterating
+    prefetches the next page in the background while the caller works
+    on the current one.
+    """
+
+    def __init__(self, query, page_count, token=None):
         self.query = query
         self.page_count = page_count
-        self._res = None
+        self.token = token
 
     def __str__(self):
         return "Paginator {} {}".format(self.query.model, self.page_count)
 
     def __iter__(self):
-        self.query.limit(self.page_count)
-        return self
+        with futures.ThreadPoolExecutor(max_workers=1) as pool:
+            page = self.page(self.token)
+            while page:
+                following = None
+                if page.has_next:
+                    # Keep the caller's session and query budgets
+                    following = pool.submit(
+                        contextvars.copy_context().run,
+                        self.page, page.next_token
+                    )
+                yield page
+                if following is None:
+                    return
+                page = following.result()
 
-    def __next__(self):
-        self.make_query(self.last_doc)
-        return self.wrap_response()
+    def page(self, token=None):
+        direction, cursor = NEXT, None
+        if token is not None:
+            direction, cursor = self.decode(token)
 
-    @property
-    def last_doc(self):
-        if not self._res:
-            return
-        return self._res[-1]
-
-    def make_query(self, start_after=None):
-        if start_after is not None:
-            self.query.start_after(start_after)
-        self._res = list(self.query.raw_execute())
-        if not self._res:
-            raise StopIteration
-
-        if start_after is None:
-            return
-
-        if start_after.id == self.last_doc.id:
-            raise StopIteration
-
-    def wrap_response(self):
-        return [
-            QueryResultWrapper.model_from_dict(self.query.model, d)
-            for d in self._res if d
-        ]
+        query = self.base_query()
+        if direction == NEXT:
+            if cursor is not None:
+                query.start_after(cursor)
+            query.limit(self.page_count + 1)
+            docs = list(query.raw_execute())
+            more = len(docs) > self.page_count
+            docs = docs[:self.page_count]
+            next_token = self.encode(NEXT, docs[-1]) if more else None
+            previous_token = None
+            if cursor is not None and docs:
+                previous_token = self.encode(PREVIOUS, docs[0])
+        else:
+            query.end_before(cursor)
+            queries = query.make_queries()
+            with query.event('filter') as event:
+                event.rpc(len(queries))
+                results = [
+                    list(q.limit_to_last(self.page_count + 1).get())
+                    for q in queries
+                ]
+                event.read(itertools.chain.from_iterable(results))
+            docs = query.merge(results)[-(self.page_count + 1):]
+            more = len(docs) > self.page_count
+            docs = docs[-self.page_count:] if docs else docs
+            previous_token = self.encode(PREVIOUS, docs[0]) if more else None
+            next_token = self.encode(NEXT, docs[-1]) if docs else None
+
+        return Page(
+            QueryResultWrapper.models_from_dicts(
+                self.query.model, docs, self.query.n_related,
+                self.query.deferred_fields()
+            ),
+            next_token, previous_token
+        )
+
+    def base_query(self):
+        # Cursors need a total order: finish with the document name, in
+        # the direction of the last ordering like Firestore itself does.
+        query = self.query.clone()
+        query.n_limit = None
+        names = [fo.lstrip('-') for fo in query.n_order_by]
+        if '__name__' not in names:
+            last = query.n_order_by[-1] if query.n_order_by else ''
+            query.order_by('-__name__' if last.startswith('-') else '__name__')
+        # Tokens hold the cursor values, so only() and defer() must not
+        # project them away.
+        columns = self.cursor_columns()
+        kept = {
+            name for name, field in query.model._meta.fields.items()
+            if field.db_column_name in columns
+        }
+        if query.n_only is not None:
+            query.n_only |= kept
+        query.n_defer -= kept
+        return query
+
+    def cursor_columns(self):
+        columns = {fo.lstrip('-') for fo in self.query.n_order_by}
+        columns.update(
+            w[0] for w in self.query.parse_where() if w[1] in INEQUALITIES
+        )
+        columns.discard('__name__')
+        return {c.split('.')[0] for c in columns}
+
+    def encode(self, direction, snapshot):
+        token = {'d': direction, 'p': snapshot.reference.path}
+        data = snapshot.to_dict()
+        try:
+            token['v'] = {
+                c: encode_value(data.get(c)) for c in self.cursor_columns()
+            }
+        except TypeError:
+            # Resuming reads the document to get its values
+            pass
+        raw = json.dumps(token, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            token = json.loads(raw)
+            direction, path = token['d'], token['p']
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            raise InvalidPageToken('Invalid page token')
+        if direction not in (NEXT, PREVIOUS):
+            raise InvalidPageToken('Invalid page token')
+        if path.rsplit('/', 1)[0] != self.query.model.full_collection_name():
+            raise InvalidPageToken('Page token of another collection')
+
+        reference = db.conn.document(path)
+        if 'v' not in token:
+            with queries_result.get_event(self.query.model, path) as event:
+                event.rpc()
+                snapshot = reference.get()
+                event.read([snapshot])
+            if not snapshot.exists:
+                raise InvalidPageToken('Page token document was deleted')
+            return direction, snapshot
+        values = {k: decode_value(v) for k, v in token['v'].items()}
+        return direction, firestore.DocumentSnapshot(
+            reference, values, True, None, None, None
+        )
@@ -1,8 +1,22 @@
+import asyncio
+import contextvars
+import copy
+import itertools
+import math
+import queue
+import threading
+from concurrent import futures
+
 from firebase_admin import firestore
+from google.api_core import exceptions as api_exceptions
 
+from matchbox import instrumentation, sessions
 from matchbox.database import db
+from matchbox.queries import columns as queries_columns
 from matchbox.queries import error
+from matchbox.queries import mirror as queries_mirror
 from matchbox.queries import queries_result
+from matchbox.models import error as models_error
 from matchbox.models import fields, utils
 
 
@@ -17,6 +31,9 @@ class QuerySet:
     def filter(self, **kwargs):
         return FilterQuery(self.model, **kwargs)
 
+    def select_related(self, *lookups, depth=1):
+        return FilterQuery(self.model).select_related(*lookups, depth=depth)
+
     def get(self, **kwargs):
         return FilterQuery(self.model, **kwargs).get()
 
@@ -27,15 +44,61 @@ class QuerySet:
         UpdateQuery(self.model, **kwargs).execute()
 
     def delete(self, **kwargs):
-        FilterQuery(self.model, **kwargs).delete()
+        return FilterQuery(self.model, **kwargs).delete()
+
+    def bulk_create(self, instances, batch_size=500, workers=4):
+        return BulkInsertQuery(self.model, batch_size, workers).execute(
+            instances
+        )
+
+    def bulk_update(self, instances, fields, batch_size=500, workers=4):
+        return BulkUpdateQuery(
+            self.model, fields, batch_size, workers
+        ).execute(instances)
+
+    def bulk_delete(self, ids, batch_size=500, workers=4):
+        return BulkDeleteQuery(self.model, batch_size, workers).execute(ids)
+
+    def in_bulk(self, ids):
+        return FilterQuery(self.model).in_bulk(ids)
+
+    def mirror(self):
+        if self.model._meta.mirror is not None:
+            return self.model._meta.mirror
+        return queries_mirror.Mirror(self.model).start()
+
+    async def aget(self, **kwargs):
+        return await FilterQuery(self.model, **kwargs).aget()
+
+    async def acreate(self, **kwargs):
+        return await InsertQuery(self.model, **kwargs).aexecute()
+
+    async def aupdate(self, **kwargs):
+        await UpdateQuery(self.model, **kwargs).aexecute()
+
+    async def abulk_create(self, instances, batch_size=500, workers=4):
+        return await BulkInsertQuery(
+            self.model, batch_size, workers
+        ).aexecute(instances)
 
 
 class QueryBase:
     def __init__(self, model):
         self.model = model
 
-    def get_ref(self):
-        return db.conn.collection(self.model.full_collection_name())
+    def get_ref(self, conn=None):
+        if conn is None:
+            conn = db.conn
+        return conn.collection(self.model.full_collection_name())
+
+    def invalidate(self, *paths):
+        cache = self.model._meta.cache
+        if cache is not None:
+            for path in paths:
+                cache.delete(path)
+
+    def event(self, operation):
+        return instrumentation.start(self.model, operation)
 
 
 class FilterQuery(QueryBase):
@@ -45,9 +108,21 @@ class FilterQuery(QueryBase):
         'gt': '>',
         'gte': '>=',
         'eq': '==',
+        'ne': '!=',
         'contains': 'array_contains',
+        'in': 'in',
+        'not_in': 'not-in',
+        'contains_any': 'array_contains_any',
     }
+    # Operators Firestore evaluates as OR over at most
+    # `disjunction_limit` values; longer lists are split into chunks
+    # queried in parallel on up to `max_workers` threads.
+    disjunctions = {'in', 'array_contains_any'}
+    multi_value = ('in', 'not_in', 'contains_any')
+    disjunction_limit = 30
+    max_workers = 8
     query_separator = '__'
+    column_chunk_size = 10000
 
     def __init__(self, model, **kwargs):
         super().__init__(model)
@@ -55,6 +130,29 @@ class FilterQuery(QueryBase):
         self.n_limit = None
         self.n_order_by = []
         self.n_start_after = None
+        self.n_start_at = None
+        self.n_end_before = None
+        self.n_related = None
+        self.n_only = None
+        self.n_defer = set()
+
+    def clone(self):
+        query = copy.copy(self)
+        query.select_query = dict(self.select_query)
+        query.n_order_by = list(self.n_order_by)
+        query.n_related = copy.deepcopy(self.n_related)
+        query.n_defer = set(self.n_defer)
+        if self.n_only is not None:
+            query.n_only = set(self.n_only)
+        return query
+
+    def cursors(self):
+        return self.n_start_after or self.n_start_at or self.n_end_before
+
+    def event(self, operation):
+        # Compiled filters are only worth building when someone listens
+        filters = self.parse_where() if instrumentation.enabled() else None
+        return instrumentation.start(self.model, operation, filters)
 
     def parse_where(self):
         wheres = []
@@ -69,10 +167,12 @@ class FilterQuery(QueryBase):
             field = self.model.get_field(fs.pop(0))
 
             if isinstance(field, fields.ReferenceField):
-                vl = utils.get_reference_fields(
-                    field.ref_model.full_collection_name(),
-                    vl.id if hasattr(vl, 'id') else vl,
-                )
+                if o in self.multi_value:
+                    vl = [self.reference_value(field, v) for v in vl]
+                else:
+                    vl = self.reference_value(field, vl)
+            elif o in self.multi_value:
+                vl = list(vl)
 
             wheres.append(
                 ('.'.join([field.db_column_name] + fs),
@@ -80,9 +180,17 @@ class FilterQuery(QueryBase):
             )
         return wheres
 
-    def make_query(self):
-        bsq = self.get_ref()
-        for w in self.parse_where():
+    def reference_value(self, field, vl):
+        return utils.get_reference_fields(
+            field.ref_model.full_collection_name(),
+            vl.id if hasattr(vl, 'id') else vl,
+        )
+
+    def make_query(self, conn=None, wheres=None):
+        bsq = self.get_ref(conn)
+        if wheres is None:
+            wheres = self.parse_where()
+        for w in wheres:
             bsq = bsq.where(*w)
         if self.n_limit:
             bsq = bsq.limit(self.n_limit)
@@ -94,12 +202,213 @@ class FilterQuery(QueryBase):
                     )
                 else:
                     bsq = bsq.order_by(fo)
+        if self.n_start_at:
+            bsq = bsq.start_at(self.n_start_at)
         if self.n_start_after:
             bsq = bsq.start_after(self.n_start_after)
+        if self.n_end_before:
+            bsq = bsq.end_before(self.n_end_before)
+        projection = self.projection()
+        if projection is not None:
+            bsq = bsq.select(projection)
         return bsq
 
+    def chunk_sizes(self, wheres):
+        # The limit holds for all disjunctions of a query together, so
+        # several split filters share it.
+        sizes = {
+            i: min(len(w[2]), self.disjunction_limit)
+            for i, w in enumerate(wheres) if w[1] in self.disjunctions
+        }
+        while math.prod(sizes.values()) > self.disjunction_limit:
+            largest = max(sizes, key=sizes.get)
+            sizes[largest] -= 1
+        return sizes
+
+    def make_queries(self, conn=None):
+        wheres = self.parse_where()
+        fixed, splits = [], []
+        sizes = self.chunk_sizes(wheres)
+        for i, w in enumerate(wheres):
+            size = sizes.get(i)
+            if size is not None and len(w[2]) > size:
+                splits.append([
+                    (w[0], w[1], w[2][i:i + size])
+                    for i in range(0, len(w[2]), size)
+                ])
+            else:
+                fixed.append(w)
+
+        if not splits:
+            return [self.make_query(conn)]
+        return [
+            self.make_query(conn, fixed + list(chunk))
+            for chunk in itertools.product(*splits)
+        ]
+
+    def mirrored(self):
+        # Snapshots from the model mirror, or None if the mirror is not
+        # running or can't evaluate this query.
+        mirror = self.model._meta.mirror
+        if mirror is None or self.cursors():
+            return None
+        wheres = self.parse_where()
+        if not mirror.serves(wheres):
+            return None
+        return self.merge([mirror.match(wheres)])
+
     def raw_execute(self):
-        return self.make_query().stream()
+        docs = self.mirrored()
+        if docs is not None:
+            return iter(docs)
+        queries = self.make_queries()
+        event = self.event('filter')
+        if len(queries) == 1:
+            event.rpc()
+            return instrumentation.stream(event, queries[0].stream())
+        with event:
+            return iter(self.merge(self.stream_all(queries, event)))
+
+    def stream_all(self, queries, event=instrumentation.NULL_EVENT):
+        workers = min(self.max_workers, len(queries))
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda q: list(q.stream()), queries))
+        event.rpc(len(queries))
+        event.read(itertools.chain.from_iterable(results))
+        return results
+
+    async def astream_all(self, queries, event=instrumentation.NULL_EVENT):
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def stream(query):
+            async with semaphore:
+                return [d async for d in query.stream()]
+
+        results = await asyncio.gather(*[stream(q) for q in queries])
+        event.rpc(len(queries))
+        event.read(itertools.chain.from_iterable(results))
+        return results
+
+    def merge(self, results):
+        seen, docs = set(), []
+        for result in results:
+            for d in result:
+                if d.reference.path not in seen:
+                    seen.add(d.reference.path)
+                    docs.append(d)
+
+        # Stable sorts from the last ordering key to the first
+        for fo in reversed(self.n_order_by):
+            name = fo.lstrip('-')
+            docs.sort(
+                key=lambda d: self.sort_key(self.snapshot_value(d, name)),
+                reverse=fo.startswith('-')
+            )
+        if self.n_limit:
+            docs = docs[:self.n_limit]
+        return docs
+
+    @staticmethod
+    def snapshot_value(snapshot, path):
+        if path == '__name__':
+            return snapshot.reference.path
+        value = snapshot.to_dict()
+        for key in path.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+
+    @staticmethod
+    def sort_key(value):
+        return value is not None, value
+
+    def merged_values(self, queries, path, event):
+        docs = self.merge(self.stream_all(
+            [q.select([path]) for q in queries], event
+        ))
+        return [
+            v for v in (self.snapshot_value(d, path) for d in docs)
+            if isinstance(v, (int, float)) and not isinstance(v, bool)
+        ]
+
+    def field_path(self, lookup):
+        fs = lookup.split(self.query_separator)
+        field = self.model.get_field(fs.pop(0))
+        return '.'.join([field.db_column_name] + fs)
+
+    def aggregate(self, aggregation_query, event):
+        event.rpc()
+        return aggregation_query.get()[0][0].value
+
+    async def aaggregate(self, aggregation_query, event):
+        event.rpc()
+        return (await aggregation_query.get())[0][0].value
+
+    # Chunks of an array_contains_any split can match the same document,
+    # so aggregations over several queries count deduplicated names or
+    # values instead of adding up per-chunk results.
+
+    def count(self):
+        docs = self.mirrored()
+        if docs is not None:
+            return len(docs)
+        queries = self.make_queries()
+        with self.event('count') as event:
+            if len(queries) == 1:
+                return self.aggregate(queries[0].count(), event)
+            return len(self.merge(self.stream_all(
+                [q.select(['__name__']) for q in queries], event
+            )))
+
+    async def acount(self):
+        queries = self.make_queries(db.async_conn)
+        with self.event('count') as event:
+            if len(queries) == 1:
+                return await self.aaggregate(queries[0].count(), event)
+            return len(self.merge(await self.astream_all(
+                [q.select(['__name__']) for q in queries], event
+            )))
+
+    def sum(self, field):
+        path = self.field_path(field)
+        queries = self.make_queries()
+        with self.event('sum') as event:
+            if len(queries) == 1:
+                return self.aggregate(queries[0].sum(path), event)
+            return sum(self.merged_values(queries, path, event))
+
+    def avg(self, field):
+        path = self.field_path(field)
+        queries = self.make_queries()
+        with self.event('avg') as event:
+            if len(queries) == 1:
+                return self.aggregate(queries[0].avg(path), event)
+            values = self.merged_values(queries, path, event)
+        return sum(values) / len(values) if values else None
+
+    def exists(self):
+        docs = self.mirrored()
+        if docs is not None:
+            return bool(docs)
+        with self.event('exists') as event:
+            for query in self.make_queries():
+                event.rpc()
+                found = query.select(['__name__']).limit(1).get()
+                event.read(found)
+                if found:
+                    return True
+        return False
+
+    async def aexists(self):
+        with self.event('exists') as event:
+            for query in self.make_queries(db.async_conn):
+                event.rpc()
+                found = await query.select(['__name__']).limit(1).get()
+                event.read(found)
+                if found:
+                    return True
+        return False
 
     def limit(self, n):
         self.n_limit = n
@@ -109,22 +418,347 @@ class FilterQuery(QueryBase):
         self.n_start_after = start_after
         return self
 
+    def start_at(self, start_at):
+        self.n_start_at = start_at
+        return self
+
+    def end_before(self, end_before):
+        self.n_end_before = end_before
+        return self
+
     def order_by(self, field):
         self.n_order_by.append(field)
         return self
 
+    def only(self, *fields):
+        for f_name in fields:
+            self.model.get_field(f_name)
+        self.n_only = set(fields)
+        return self
+
+    def defer(self, *fields):
+        for f_name in fields:
+            self.model.get_field(f_name)
+        self.n_defer.update(fields)
+        return self
+
+    def loaded_fields(self):
+        loaded = set(self.model._meta.fields)
+        if self.n_only is not None:
+            loaded &= self.n_only
+        loaded -= self.n_defer
+        loaded.add(self.model._meta.get_id_field_name())
+        return loaded
+
+    def loaded_field_names(self):
+        loaded = self.loaded_fields()
+        return tuple(n for n in self.model._meta.fields if n in loaded)
+
+    def deferred_fields(self):
+        return set(self.model._meta.fields) - self.loaded_fields()
+
+    def projection(self, fields=None):
+        if fields is None:
+            if self.n_only is None and not self.n_defer:
+                return None
+            fields = self.loaded_fields()
+        return utils.field_paths(
+            f.db_column_name for name, f in self.model._meta.fields.items()
+            if name in fields
+        )
+
+    def values(self, *fields):
+        fields = fields or self.loaded_field_names()
+        plan = [
+            (name, self.model.get_field(name)) for name in fields
+        ]
+        id_name = self.model._meta.get_id_field_name()
+        for d in self.stream_projected(fields, self.event('values')):
+            data = d.to_dict()
+            yield {
+                name: d.id if name == id_name else field.python_value(
+                    data.get(field.db_column_name)
+                )
+                for name, field in plan
+            }
+
+    def stream_projected(self, fields, event):
+        projection = self.projection(fields)
+        queries = self.make_queries()
+        if len(queries) == 1:
+            event.rpc()
+            return instrumentation.stream(
+                event, queries[0].select(projection).stream()
+            )
+        # merge() sorts on the ordered fields, so read them as well
+        ordered = utils.field_paths(fo.lstrip('-') for fo in self.n_order_by)
+        projection += [p for p in ordered if p not in projection]
+        with event:
+            return iter(self.merge(self.stream_all(
+                [q.select(projection) for q in queries], event
+            )))
+
+    def values_list(self, *fields, flat=False):
+        if flat and len(fields) != 1:
+            raise AttributeError(
+                "'flat' is not valid when values_list is called with "
+                "more than one field"
+            )
+        fields = fields or self.loaded_field_names()
+        for row in self.values(*fields):
+            if flat:
+                yield row[fields[0]]
+            else:
+                yield tuple(row[f_name] for f_name in fields)
+
+    def partition_queries(self, partitions):
+        if self.n_order_by or self.n_limit or self.cursors():
+            raise AttributeError(
+                "parallel_scan() can't be used with order_by, limit or "
+                "cursors"
+            )
+        wheres = self.parse_where()
+        sizes = self.chunk_sizes(wheres)
+        if any(len(wheres[i][2]) > size for i, size in sizes.items()):
+            raise AttributeError(
+                "parallel_scan() can't be used with in or contains_any "
+                "filters over more than {} values in total".format(
+                    self.disjunction_limit
+                )
+            )
+        projection = self.projection()
+        # Partition the collection group under the collection's parent
+        # document, not every collection with that id in the database.
+        group_class = getattr(
+            db.conn, 'collection_group_class', firestore.CollectionGroup
+        )
+        group = group_class(
+            db.conn.collection(self.model.full_collection_name())
+        )
+        with self.event('partition') as event:
+            event.rpc()
+            partitions = list(group.get_partitions(partitions))
+        for partition in partitions:
+            bsq = partition.query()
+            for w in wheres:
+                bsq = bsq.where(*w)
+            if projection:
+                bsq = bsq.select(projection)
+            yield bsq
+
+    def parallel_scan(self, partitions=8, workers=4, ordered=True,
+                      chunk_size=500):
+        """
+        Read the query over partitions of its collection, each on its own
+        worker thread. Partition queries are collection group queries, so
+        filters need indexes with collection group scope.
+        """
+        return ParallelScan(
+            self, list(self.partition_queries(partitions)), workers,
+            ordered, chunk_size
+        ).execute()
+
+    def column_chunks(self, fields):
+        """
+        Read the query into one list per field, yielding the lists every
+        column_chunk_size rows so callers can convert them chunk by chunk.
+        """
+        id_name = self.model._meta.get_id_field_name()
+        plan = []
+        for name in fields:
+            field = self.model.get_field(name)
+            plan.append((
+                None if name == id_name else field.db_column_name,
+                queries_columns.column_converter(field)
+            ))
+
+        chunk = [[] for _ in plan]
+        rows = 0
+        for d in self.stream_projected(fields, self.event('to_columns')):
+            data = d.to_dict()
+            for values, (column, convert) in zip(chunk, plan):
+                if column is None:
+                    values.append(d.id)
+                    continue
+                value = data.get(column)
+                values.append(value if convert is None else convert(value))
+            rows += 1
+            if rows == self.column_chunk_size:
+                yield chunk
+                chunk = [[] for _ in plan]
+                rows = 0
+        if rows:
+            yield chunk
+
+    def to_columns(self, *fields, arrays=False):
+        """
+        Read the query into one list per field, or one NumPy array per
+        field with arrays=True, without building model instances.
+        """
+        fields = fields or self.loaded_field_names()
+        model_fields = [self.model.get_field(name) for name in fields]
+        if not arrays:
+            columns = [[] for _ in fields]
+            for chunk in self.column_chunks(fields):
+                for values, part in zip(columns, chunk):
+                    values.extend(part)
+            return dict(zip(fields, columns))
+
+        # Convert each chunk as it arrives so only one chunk of Python
+        # values is alive at a time.
+        parts = [[] for _ in fields]
+        for chunk in self.column_chunks(fields):
+            for arrays_, field, values in zip(parts, model_fields, chunk):
+                arrays_.append(queries_columns.numpy_array(field, values))
+        return {
+            name: queries_columns.concat_arrays(field, arrays_)
+            for name, field, arrays_ in zip(fields, model_fields, parts)
+        }
+
+    def to_arrow(self, *fields):
+        pa = queries_columns.requires(
+            queries_columns.pyarrow, 'pyarrow', 'to_arrow'
+        )
+        fields = fields or self.loaded_field_names()
+        model_fields = [self.model.get_field(name) for name in fields]
+        tables = [
+            pa.table({
+                name: queries_columns.arrow_array(field, values)
+                for name, field, values in zip(fields, model_fields, chunk)
+            })
+            for chunk in self.column_chunks(fields)
+        ]
+        if not tables:
+            return pa.table({
+                name: queries_columns.arrow_array(field, [])
+                for name, field in zip(fields, model_fields)
+            })
+        # Untyped columns may infer null in one chunk and a type in another
+        return pa.concat_tables(tables, promote_options='permissive')
+
+    def to_pandas(self, *fields):
+        pd = queries_columns.requires(
+            queries_columns.pandas, 'pandas', 'to_pandas'
+        )
+        return pd.DataFrame({
+            name: queries_columns.pandas_series(
+                self.model.get_field(name), values
+            )
+            for name, values in self.to_columns(*fields).items()
+        })
+
+    def select_related(self, *lookups, depth=1):
+        if not lookups:
+            self.n_related = depth
+            return self
+
+        if not isinstance(self.n_related, dict):
+            self.n_related = {}
+        for path in lookups:
+            model, tree = self.model, self.n_related
+            for f_name in path.split(self.query_separator):
+                field = model.get_field(f_name)
+                if not isinstance(field, fields.ReferenceField):
+                    raise AttributeError(
+                        'Field name %s is not a ReferenceField' % f_name
+                    )
+                model, tree = field.ref_model, tree.setdefault(f_name, {})
+        return self
+
+    def prefetch_related(self, *lookups, depth=1):
+        return self.select_related(*lookups, depth=depth)
+
     def __iter__(self):
         return self.execute()
 
+    def iterator(self, chunk_size=100):
+        # Without select_related there is nothing to batch, so hydrate
+        # each snapshot as soon as the stream yields it.
+        if not self.n_related:
+            chunk_size = 1
+        stream = iter(self.raw_execute())
+        while True:
+            chunk = list(itertools.islice(stream, chunk_size))
+            if not chunk:
+                return
+            yield from queries_result.QueryResultWrapper.models_from_dicts(
+                self.model, chunk, self.n_related, self.deferred_fields()
+            )
+
     def execute(self):
-        return iter([
-            queries_result.QueryResultWrapper.model_from_dict(self.model, d)
-            for d in self.raw_execute() if d
-        ])
+        return self.iterator()
+
+    def __aiter__(self):
+        return self.aiterator()
+
+    async def aiterator(self, chunk_size=100):
+        if not self.n_related:
+            chunk_size = 1
+        docs = self.mirrored()
+        queries = self.make_queries(db.async_conn)
+        if docs is None and len(queries) > 1:
+            with self.event('filter') as event:
+                docs = self.merge(await self.astream_all(queries, event))
+        if docs is not None:
+            for instance in await self.ahydrate(docs):
+                yield instance
+            return
+
+        event = self.event('filter')
+        event.rpc()
+        chunk = []
+        async for d in instrumentation.astream(event, queries[0].stream()):
+            chunk.append(d)
+            if len(chunk) < chunk_size:
+                continue
+            for instance in await self.ahydrate(chunk):
+                yield instance
+            chunk = []
+        for instance in await self.ahydrate(chunk):
+            yield instance
+
+    async def ahydrate(self, rows):
+        return await queries_result.QueryResultWrapper.amodels_from_dicts(
+            self.model, rows, self.n_related, self.deferred_fields()
+        )
+
+    def delete(self, batch_size=500, workers=4, on_progress=None):
+        deleted = 0
+        with self.event('delete') as event:
+            for bsq in self.make_queries():
+                limit = None
+                if self.n_limit:
+                    limit = self.n_limit - deleted
+                    if limit <= 0:
+                        break
+                deleted += DeleteQuery(
+                    bsq, batch_size=batch_size, workers=workers,
+                    limit=limit,
+                    order_by=[fo.lstrip('-') for fo in self.n_order_by],
+                    on_progress=on_progress, cache=self.model._meta.cache,
+                    event=event,
+                ).execute()
+        return deleted
 
-    def delete(self):
-        bsq = self.make_query()
-        return DeleteQuery(bsq).execute()
+    def in_bulk(self, ids):
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        if self.select_query:
+            return {obj.id: obj for obj in self.filter(id__in=ids)}
+
+        collection = self.get_ref()
+        with self.event('in_bulk') as event:
+            event.rpc()
+            snapshots = list(db.conn.get_all(
+                [collection.document(i) for i in ids], self.projection()
+            ))
+            event.read(snapshots)
+        return {
+            obj.id: obj
+            for obj in queries_result.QueryResultWrapper.models_from_dicts(
+                self.model, [s for s in snapshots if s.exists],
+                self.n_related, self.deferred_fields()
+            )
+        }
 
     def filter(self, **kwargs):
         self.select_query.update(kwargs)
@@ -132,7 +766,96 @@ class FilterQuery(QueryBase):
 
     def get(self, **kwargs):
         self.select_query.update(kwargs)
-        res = list(self.execute())
+        known = self.from_session()
+        if known is not None:
+            return known
+        path = self.point_read_path()
+        if path is not None:
+            return self.one(self.hydrate_document(self.read_document(path)))
+        return self.one(list(self.limit_for_get().execute()))
+
+    async def aget(self, **kwargs):
+        self.select_query.update(kwargs)
+        known = self.from_session()
+        if known is not None:
+            return known
+        path = self.point_read_path()
+        if path is not None:
+            return self.one(await self.ahydrate_document(
+                await self.aread_document(path)
+            ))
+        return self.one([
+            obj async for obj in self.limit_for_get().aiterator()
+        ])
+
+    def document_path(self):
+        # Path of the document a get(id=...) reads, None for any other
+        # query.
+        if list(self.select_query) != ['id'] or self.cursors():
+            return None
+        doc_id = self.select_query['id']
+        if not isinstance(doc_id, (str, int)) or isinstance(doc_id, bool):
+            return None
+        doc_id = str(doc_id)
+        if not doc_id or '/' in doc_id:
+            return None
+        return sessions.document_path(self.model, doc_id)
+
+    def from_session(self):
+        session = sessions.current()
+        if session is None or self.n_related or self.projection():
+            return None
+        path = self.document_path()
+        if path is None:
+            return None
+        return session.get(path)
+
+    def point_read_path(self):
+        # A running mirror answers without any read at all
+        mirror = self.model._meta.mirror
+        if mirror is not None and mirror.serves(self.parse_where()):
+            return None
+        return self.document_path()
+
+    def read_document(self, path):
+        projection = self.projection()
+        if projection is None:
+            return queries_result.get_document(self.model, path)
+        with self.event('get') as event:
+            event.rpc()
+            snapshot = db.conn.document(path).get(projection)
+            event.read([snapshot])
+        return snapshot
+
+    async def aread_document(self, path):
+        projection = self.projection()
+        if projection is None:
+            return await queries_result.aget_document(self.model, path)
+        with self.event('get') as event:
+            event.rpc()
+            snapshot = await db.async_conn.document(path).get(projection)
+            event.read([snapshot])
+        return snapshot
+
+    def hydrate_document(self, snapshot):
+        if not snapshot.exists:
+            return []
+        return queries_result.QueryResultWrapper.models_from_dicts(
+            self.model, [snapshot], self.n_related, self.deferred_fields()
+        )
+
+    async def ahydrate_document(self, snapshot):
+        if not snapshot.exists:
+            return []
+        return await self.ahydrate([snapshot])
+
+    def limit_for_get(self):
+        # Two documents are enough to tell one from many
+        if not self.n_limit or self.n_limit > 2:
+            self.n_limit = 2
+        return self
+
+    def one(self, res):
         if not res:
             raise error.DocumentDoesNotExists(
                 '{} matching query does not exist'.format(
@@ -154,66 +877,452 @@ class InsertQuery(QueryBase):
         super().__init__(model)
         self.insert_query = kwargs
 
-    def get_ref(self, id=None):
-        return super().get_ref().document(id)
+    def get_ref(self, id=None, conn=None):
+        return super().get_ref(conn).document(id)
 
     def parse_insert(self):
-        out = {}
-        for k, f in self.model._meta.fields.items():
-            val = self.insert_query.get(k)
-            out[f.db_column_name] = f.lookup_value(None, val)
-        return out
+        return self.model._meta.to_db(self.insert_query)
 
     def raw_execute(self):
         kwargs = self.parse_insert()
         ref = self.get_ref(kwargs.get('id'))
         kwargs['id'] = ref.id
-        ref.set(kwargs)
-        return ref.get()
+        with self.event('create') as event:
+            event.rpc()
+            write_result = ref.set(kwargs)
+            event.write(1, [kwargs])
+            self.invalidate(ref.path)
+            return self.written_snapshot(
+                ref, kwargs, write_result.update_time, event
+            )
 
-    def execute(self):
-        return queries_result.QueryResultWrapper.model_from_dict(
-            self.model, self.raw_execute()
+    async def araw_execute(self):
+        kwargs = self.parse_insert()
+        ref = self.get_ref(kwargs.get('id'), db.async_conn)
+        kwargs['id'] = ref.id
+        with self.event('create') as event:
+            event.rpc()
+            write_result = await ref.set(kwargs)
+            event.write(1, [kwargs])
+            self.invalidate(ref.path)
+            pending = self.sentinel_columns(kwargs)
+            if pending:
+                event.rpc()
+                db_val = await ref.get(utils.field_paths(pending))
+                event.read([db_val])
+                kwargs.update(db_val.to_dict())
+        return firestore.DocumentSnapshot(
+            ref, kwargs, True, None, None, write_result.update_time
+        )
+
+    def sentinel_columns(self, data):
+        return [k for k, v in data.items() if utils.contains_sentinel(v)]
+
+    def written_snapshot(self, ref, data, update_time,
+                         event=instrumentation.NULL_EVENT):
+        # The written payload already is the document, only values
+        # computed by the server (sentinels) have to be read back.
+        pending = self.sentinel_columns(data)
+        if pending:
+            event.rpc()
+            db_val = ref.get(utils.field_paths(pending))
+            event.read([db_val])
+            data.update(db_val.to_dict())
+        return firestore.DocumentSnapshot(
+            ref, data, True, None, None, update_time
         )
 
+    def execute(self):
+        return queries_result.QueryResultWrapper.models_from_dicts(
+            self.model, [self.raw_execute()]
+        )[0]
+
+    async def aexecute(self):
+        return (await queries_result.QueryResultWrapper.amodels_from_dicts(
+            self.model, [await self.araw_execute()]
+        ))[0]
+
 
 class UpdateQuery(InsertQuery):
 
     def parse_insert(self):
-        out = {}
-        for k, v in self.insert_query.items():
-            field = self.model._meta.get_field(k)
-            out[field.db_column_name] = field.lookup_value(None, v)
-        return out
+        return self.model._meta.to_db(self.insert_query, partial=True)
 
     def raw_execute(self):
         kwargs = self.parse_insert()
         ref = self.get_ref(kwargs['id'])
-        ref.update(kwargs)
+        with self.event('update') as event:
+            event.rpc()
+            ref.update(kwargs)
+            event.write(1, [kwargs])
+        self.invalidate(ref.path)
 
     def execute(self):
         return self.raw_execute()
 
+    async def aexecute(self):
+        kwargs = self.parse_insert()
+        ref = self.get_ref(kwargs['id'], db.async_conn)
+        with self.event('update') as event:
+            event.rpc()
+            await ref.update(kwargs)
+            event.write(1, [kwargs])
+        self.invalidate(ref.path)
 
-class DeleteQuery:
-    def __init__(self, query):
-        self.query = query
 
-    def delete_collection(self, batch_size=100):
+class BulkQuery(QueryBase):
+    """
+    Serialize every item up front, then commit the writes in WriteBatches
+    of batch_size operations, running up to `workers` commits at once.
+    A failing item or batch is reported in its BulkResult instead of
+    aborting the whole run.
+    """
+
+    max_batch_size = 500
+    operation = None
+
+    def __init__(self, model, batch_size=500, workers=4):
+        super().__init__(model)
+        if not 0 < batch_size <= self.max_batch_size:
+            raise ValueError(
+                'batch_size must be between 1 and {}'.format(
+                    self.max_batch_size
+                )
+            )
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def prepare(self, result, conn):
+        # (batch method, reference, data or None)
+        raise NotImplementedError()
+
+    def prepare_batches(self, items, conn):
+        results, writes = [], []
+        for item in items:
+            result = queries_result.BulkResult(item)
+            results.append(result)
+            try:
+                writes.append((result, self.prepare(result, conn)))
+            except (AttributeError, TypeError, ValueError,
+                    models_error.DBTypeError) as e:
+                # A value the fields can't serialize fails its item only
+                result.error = e
+
+        batches = [
+            writes[i:i + self.batch_size]
+            for i in range(0, len(writes), self.batch_size)
+        ]
+        return results, batches
+
+    def execute(self, items):
+        results, batches = self.prepare_batches(items, db.conn)
+        with self.event(self.operation) as event:
+            with futures.ThreadPoolExecutor(
+                    max_workers=self.workers) as pool:
+                list(pool.map(lambda w: self.commit(w, event), batches))
+        return results
+
+    async def aexecute(self, items):
+        results, batches = self.prepare_batches(items, db.async_conn)
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def commit(writes):
+            async with semaphore:
+                await self.acommit(writes, event)
+
+        with self.event(self.operation) as event:
+            await asyncio.gather(*[commit(writes) for writes in batches])
+        return results
+
+    def commit(self, writes, event=instrumentation.NULL_EVENT):
+        batch = db.conn.batch()
+        for _result, write in writes:
+            self.add(batch, write)
+        event.rpc()
         try:
-            docs = self.query.limit(batch_size).get()
-        except AttributeError:
-            self.query.delete()
+            batch.commit()
+        except api_exceptions.GoogleAPIError as e:
+            self.failed(writes, e)
             return
+        self.succeeded(writes, event)
 
-        deleted = 0
+    async def acommit(self, writes, event=instrumentation.NULL_EVENT):
+        batch = db.async_conn.batch()
+        for _result, write in writes:
+            self.add(batch, write)
+        event.rpc()
+        try:
+            await batch.commit()
+        except api_exceptions.GoogleAPIError as e:
+            self.failed(writes, e)
+            return
+        self.succeeded(writes, event)
+
+    @staticmethod
+    def add(batch, write):
+        method, ref, data = write
+        if data is None:
+            getattr(batch, method)(ref)
+        else:
+            getattr(batch, method)(ref, data)
+
+    def failed(self, writes, e):
+        for result, _write in writes:
+            result.error = e
+
+    def succeeded(self, writes, event=instrumentation.NULL_EVENT):
+        event.write(len(writes), [
+            write[2] for _result, write in writes if write[2] is not None
+        ])
+        path = self.model.full_collection_name()
+        for result, _write in writes:
+            self.invalidate('{}/{}'.format(path, result.id))
+            self.committed(result)
 
-        for doc in docs:
-            doc.reference.delete()
-            deleted = deleted + 1
+    def committed(self, result):
+        pass
+
+
+class BulkInsertQuery(BulkQuery):
+    operation = 'bulk_create'
+
+    def prepare(self, result, conn):
+        query = InsertQuery(self.model, **result.item.get_fields())
+        data = query.parse_insert()
+        ref = query.get_ref(data.get('id'), conn)
+        data['id'] = result.id = ref.id
+        return 'set', ref, data
+
+    def committed(self, result):
+        result.item.id = result.id
+        result.item._mark_loaded()
+
+
+class BulkUpdateQuery(BulkQuery):
+    operation = 'bulk_update'
+
+    def __init__(self, model, fields, batch_size=500, workers=4):
+        super().__init__(model, batch_size, workers)
+        self.fields = list(fields)
+
+    def prepare(self, result, conn):
+        if result.item.id is None:
+            raise AttributeError(
+                "You can't update instance that has not been saved"
+            )
+        query = UpdateQuery(
+            self.model, **result.item._get_update_fields(self.fields)
+        )
+        data = query.parse_insert()
+        ref = query.get_ref(data['id'], conn)
+        result.id = ref.id
+        return 'update', ref, data
+
+    def committed(self, result):
+        result.item._mark_loaded(self.fields)
+
+
+class BulkDeleteQuery(BulkQuery):
+    operation = 'bulk_delete'
+
+    def prepare(self, result, conn):
+        ref = self.get_ref(conn).document(str(result.item))
+        result.id = ref.id
+        return 'delete', ref, None
+
+
+class ParallelScan:
+    """
+    Split a full-collection query into Firestore partition queries and
+    stream and hydrate every partition on its own worker thread. Workers
+    hand over hydrated chunks through bounded queues. In ordered mode
+    partitions are yielded one after another (document name order), in
+    unordered mode chunks are yielded as soon as any worker has one.
+    """
+
+    done = object()
+
+    def __init__(self, query, partition_queries, workers=4, ordered=True,
+                 chunk_size=500, prefetch=4):
+        self.query = query
+        self.partition_queries = partition_queries
+        self.workers = workers
+        self.ordered = ordered
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.path = query.model.full_collection_name()
+        self.stop = threading.Event()
+
+    def put(self, out, item):
+        while not self.stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def hydrate(self, chunk):
+        return queries_result.QueryResultWrapper.models_from_dicts(
+            self.query.model, chunk, self.query.n_related,
+            self.query.deferred_fields()
+        )
+
+    def scan(self, partition_query, out):
+        chunk = []
+        event = self.query.event('parallel_scan')
+        event.rpc()
+        try:
+            for d in instrumentation.stream(event, partition_query.stream()):
+                # Collection group queries also return subcollections
+                # with the same id elsewhere in the database.
+                if d.reference.path.rsplit('/', 1)[0] != self.path:
+                    continue
+                chunk.append(d)
+                if len(chunk) < self.chunk_size:
+                    continue
+                if not self.put(out, self.hydrate(chunk)):
+                    return
+                chunk = []
+            if chunk:
+                self.put(out, self.hydrate(chunk))
+        except Exception as e:
+            self.put(out, e)
+        finally:
+            self.put(out, self.done)
+
+    def submit(self, pool, partition_query, out):
+        # Workers run in a copy of the caller's context, so sessions and
+        # query budgets still apply to them.
+        pool.submit(
+            contextvars.copy_context().run, self.scan, partition_query, out
+        )
+
+    def read(self, out, pending):
+        while pending:
+            item = out.get()
+            if item is self.done:
+                pending -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+
+    def execute(self):
+        partition_queries = self.partition_queries
+        pool = futures.ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            if self.ordered:
+                outs = [queue.Queue(self.prefetch) for _ in partition_queries]
+                for bsq, out in zip(partition_queries, outs):
+                    self.submit(pool, bsq, out)
+                for out in outs:
+                    yield from self.read(out, 1)
+            else:
+                out = queue.Queue(self.prefetch * self.workers)
+                for bsq in partition_queries:
+                    self.submit(pool, bsq, out)
+                yield from self.read(out, len(partition_queries))
+        finally:
+            self.stop.set()
+            pool.shutdown(wait=True)
+
+
+class DeleteQuery:
+    """
+    Page through the query by cursor, reading document names only, and
+    delete every page in a WriteBatch. Up to `workers` batches are
+    committed concurrently while the next pages are being read.
+    """
+
+    max_batch_size = 500
+
+    def __init__(self, query, batch_size=500, workers=4, limit=None,
+                 order_by=None, on_progress=None, cache=None,
+                 event=instrumentation.NULL_EVENT):
+        if not 0 < batch_size <= self.max_batch_size:
+            raise ValueError(
+                'batch_size must be between 1 and {}'.format(
+                    self.max_batch_size
+                )
+            )
+        self.query = query
+        self.batch_size = batch_size
+        self.workers = workers
+        self.limit = limit
+        self.order_by = order_by or []
+        self.on_progress = on_progress
+        self.cache = cache
+        self.event = event
+        self.deleted = 0
+
+    def pages(self):
+        # Cursors need the values of the ordered fields, so keep them in
+        # the projection next to the document name.
+        query = self.query.select(['__name__'] + self.order_by)
+        last, remaining = None, self.limit
+        while remaining is None or remaining > 0:
+            page_size = self.batch_size
+            if remaining is not None:
+                page_size = min(page_size, remaining)
+                remaining -= page_size
+
+            page = query.limit(page_size)
+            if last is not None:
+                page = page.start_after(last)
+            self.event.rpc()
+            docs = list(page.stream())
+            self.event.read(docs)
+            if not docs:
+                return
+            yield [doc.reference for doc in docs]
+            if len(docs) < page_size:
+                return
+            last = docs[-1]
+
+    def commit(self, refs):
+        batch = db.conn.batch()
+        for ref in refs:
+            batch.delete(ref)
+        self.event.rpc()
+        batch.commit()
+        self.event.write(len(refs))
+        self.invalidate(refs)
+        return len(refs)
+
+    def invalidate(self, refs):
+        if self.cache is not None:
+            for ref in refs:
+                self.cache.delete(ref.path)
+
+    def done(self, future):
+        self.deleted += future.result()
+        if self.on_progress is not None:
+            self.on_progress(self.deleted)
+
+    def delete_collection(self):
+        if not hasattr(self.query, 'select'):
+            self.event.rpc()
+            self.query.delete()
+            self.event.write(1)
+            self.invalidate([self.query])
+            return 1
+
+        with futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            for refs in self.pages():
+                pending.add(pool.submit(self.commit, refs))
+                if len(pending) < self.workers:
+                    continue
+                finished, pending = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    self.done(future)
 
-        if deleted >= batch_size:
-            return self.delete_collection(batch_size)
+            for future in futures.as_completed(pending):
+                self.done(future)
+        return self.deleted
 
     def execute(self):
-        self.delete_collection()
+        return self.delete_collection()
@@ -1,29 +1,178 @@
-from matchbox.models import fields
+import asyncio
+
+from firebase_admin import firestore
+
+from matchbox import instrumentation, sessions
+from matchbox.database import db
+from matchbox.models import fields, utils
 from matchbox.models import error
 
 
+def related_fields(model_class, related):
+    """
+    Map reference field name -> nested related spec for one level of a
+    select_related() spec. A spec is either a dict tree built from
+    'field__nested' paths or an int depth that follows every reference.
+    """
+    if not related:
+        return {}
+    if isinstance(related, int):
+        return {
+            name: related - 1
+            for name, field in model_class._meta.fields.items()
+            if isinstance(field, fields.ReferenceField)
+        }
+    return related
+
+
+def cached_document(model_class, path, conn):
+    cache = model_class._meta.cache
+    if cache is None:
+        return None
+    data = cache.lookup(path)
+    if data is None:
+        return None
+    return firestore.DocumentSnapshot(
+        conn.document(path), data, True, None, None, None
+    )
+
+
+def cache_document(model_class, snapshot):
+    cache = model_class._meta.cache
+    if cache is not None and snapshot.exists:
+        cache.set(snapshot.reference.path, snapshot.to_dict())
+
+
+def get_event(model_class, path):
+    return instrumentation.start(
+        model_class, 'get', [('__name__', '==', path)]
+    )
+
+
+def get_document(model_class, path):
+    snapshot = cached_document(model_class, path, db.conn)
+    if snapshot is None:
+        with get_event(model_class, path) as event:
+            event.rpc()
+            snapshot = db.conn.document(path).get()
+            event.read([snapshot])
+        cache_document(model_class, snapshot)
+    return snapshot
+
+
+async def aget_document(model_class, path):
+    snapshot = cached_document(model_class, path, db.async_conn)
+    if snapshot is None:
+        with get_event(model_class, path) as event:
+            event.rpc()
+            snapshot = await db.async_conn.document(path).get()
+            event.read([snapshot])
+        cache_document(model_class, snapshot)
+    return snapshot
+
+
 class QueryResultWrapper(object):
     @classmethod
-    def model_from_dict(cls, model_class, row_dict):
-        instance = model_class()
+    def model_from_dict(cls, model_class, row_dict, references=None,
+                        related=None, deferred=None):
+        session = sessions.current()
+        if session is not None:
+            known = session.get(row_dict.reference.path)
+            if known is not None:
+                return known
+
+        # Hydration sets every attribute itself, skip __init__
+        instance = model_class.__new__(model_class)
+        object.__setattr__(instance, '_loaded', None)
+        cls.fill(instance, row_dict, references, related)
+        if deferred:
+            instance._deferred = set(deferred)
+        if session is not None:
+            session.add(row_dict.reference.path, instance)
+        return instance
+
+    @classmethod
+    def fill(cls, instance, row_dict, references=None, related=None):
+        model_class = instance.__class__
+        related = related_fields(model_class, related)
+        plan = model_class._meta.hydration_plan
+        # Tracking state: the loaded id and snapshots of the values that
+        # can change in place. Model.__setattr__ keeps the loaded state of
+        # other fields on their first change, so nothing is copied here.
+        mutable = model_class._meta.mutable_fields
+        original = None
+        if instance._loaded is not None:
+            original = instance._original
+        states = None
+        if mutable and not isinstance(original, dict):
+            states = list(original or (fields.NOT_SET, ) * len(mutable))
+        set_value = object.__setattr__
         for attr, value in row_dict.to_dict().items():
-            field = instance._meta.get_field_by_column_name(attr)
-            if isinstance(field, fields.ReferenceField):
-                val = ReferenceFieldWrapper.model_from_dict(field, value)
+            try:
+                field, python_value = plan[attr]
+            except KeyError:
+                raise AttributeError('Field name %s not found' % attr)
+            if python_value is None:
+                val = ReferenceFieldWrapper.model_from_dict(
+                    field, value, references, related
+                )
             else:
-                val = field.python_value(value)
-            setattr(instance, field.name, val)
-        instance.id = row_dict.id
-        return instance
+                val = python_value(value)
+            set_value(instance, field.name, val)
+            if field.mutable:
+                state = instance._state_value(val)
+                if states is not None:
+                    states[mutable.index(field.name)] = state
+                else:
+                    original[field.name] = state
+            elif isinstance(original, dict):
+                original.pop(field.name, None)
+        set_value(instance, 'id', row_dict.id)
+        if states is not None:
+            set_value(instance, '_original', tuple(states))
+        set_value(instance, '_loaded', row_dict.id)
+
+    @classmethod
+    def models_from_dicts(cls, model_class, rows, related=None,
+                          deferred=None):
+        rows = [r for r in rows if r]
+        references = ReferenceResolver().resolve(model_class, rows, related)
+        return [
+            cls.model_from_dict(model_class, r, references, related, deferred)
+            for r in rows
+        ]
+
+    @classmethod
+    async def amodels_from_dicts(cls, model_class, rows, related=None,
+                                 deferred=None):
+        rows = [r for r in rows if r]
+        references = await ReferenceResolver().aresolve(
+            model_class, rows, related
+        )
+        return [
+            cls.model_from_dict(model_class, r, references, related, deferred)
+            for r in rows
+        ]
 
 
 class ReferenceFieldWrapper(object):
     @classmethod
-    def model_from_dict(cls, field, value):
+    def model_from_dict(cls, field, value, references=None, related=None):
         if not value:
             return None
 
-        db_val = value.get()
+        session = sessions.current()
+        if session is not None and session.get(value.path) is not None:
+            return session.get(value.path)
+
+        if not related or field.name not in related:
+            return ReferenceProxy(field.ref_model, value)
+
+        if references is not None and value.path in references:
+            db_val = references[value.path]
+        else:
+            db_val = get_document(field.ref_model, value.path)
+
         if not db_val.exists:
             raise error.ReferenceCollectionObjectDoesNotExist(
                 '{}/{}'.format(
@@ -32,5 +181,221 @@ class ReferenceFieldWrapper(object):
                 )
             )
         return QueryResultWrapper.model_from_dict(
-            field.ref_model, db_val
+            field.ref_model, db_val, references, related[field.name]
+        )
+
+
+class ReferenceResolver(object):
+    """
+    Fetch every document selected by select_related() for a page of
+    results up front, one get_all() call per referenced model and nesting
+    level, instead of one get() per reference per row.
+    """
+
+    def __init__(self):
+        self.references = {}
+
+    def resolve(self, model_class, rows, related=None):
+        pending = [(model_class, rows, related)]
+        while pending:
+            to_fetch, follow = self.level(pending)
+            for ref_model, refs in to_fetch.items():
+                self.fetch(ref_model, refs)
+            pending = self.next_level(follow)
+        return self.references
+
+    async def aresolve(self, model_class, rows, related=None):
+        pending = [(model_class, rows, related)]
+        while pending:
+            to_fetch, follow = self.level(pending)
+            for ref_model, refs in to_fetch.items():
+                await self.afetch(ref_model, refs)
+            pending = self.next_level(follow)
+        return self.references
+
+    def level(self, pending):
+        to_fetch, follow = {}, []
+        for m_class, m_rows, m_related in pending:
+            for f_name, sub_related in related_fields(
+                    m_class, m_related).items():
+                field = m_class._meta.get_field(f_name)
+                paths = self.collect(field, m_rows, to_fetch)
+                if sub_related:
+                    follow.append((field.ref_model, paths, sub_related))
+        return to_fetch, follow
+
+    def next_level(self, follow):
+        return [
+            (ref_model, [
+                self.references[p] for p in paths
+                if p in self.references and self.references[p].exists
+            ], sub_related)
+            for ref_model, paths, sub_related in follow
+        ]
+
+    def collect(self, field, rows, to_fetch):
+        # Read only the reference, to_dict() would copy the whole document
+        column, = utils.field_paths([field.db_column_name])
+        paths = set()
+        for row in rows:
+            try:
+                value = row.get(column)
+            except KeyError:
+                continue
+            if not value:
+                continue
+            paths.add(value.path)
+            if value.path not in self.references:
+                to_fetch.setdefault(
+                    field.ref_model, {}
+                )[value.path] = value
+        return paths
+
+    def cached(self, ref_model, refs, conn):
+        session = sessions.current()
+        missing = {}
+        for path, ref in refs.items():
+            if session is not None and session.get(path) is not None:
+                continue
+            snapshot = cached_document(ref_model, path, conn)
+            if snapshot is None:
+                missing[path] = ref
+            else:
+                self.references[path] = snapshot
+        return missing
+
+    @staticmethod
+    def event(ref_model, refs):
+        return instrumentation.start(
+            ref_model, 'select_related', [('__name__', 'in', list(refs))]
+        )
+
+    def fetch(self, ref_model, refs):
+        refs = self.cached(ref_model, refs, db.conn)
+        if not refs:
+            return
+        event = self.event(ref_model, refs)
+        event.rpc()
+        for snapshot in instrumentation.stream(
+                event, db.conn.get_all(list(refs.values()))):
+            self.references[snapshot.reference.path] = snapshot
+            cache_document(ref_model, snapshot)
+
+    async def afetch(self, ref_model, refs):
+        conn = db.async_conn
+        refs = self.cached(ref_model, refs, conn)
+        if not refs:
+            return
+        event = self.event(ref_model, refs)
+        event.rpc()
+        async for snapshot in instrumentation.astream(event, conn.get_all([
+                conn.document(path) for path in refs])):
+            self.references[snapshot.reference.path] = snapshot
+            cache_document(ref_model, snapshot)
+
+
+class ReferenceProxy(object):
+    """
+    Stand-in for a ReferenceField value that was not selected with
+    select_related(). Holds only the DocumentReference and id, and loads
+    the referenced document on first access to any other attribute.
+    """
+
+    __slots__ = ('_ref_model', '_reference', '_instance', 'id')
+
+    def __init__(self, ref_model, reference):
+        object.__setattr__(self, '_ref_model', ref_model)
+        object.__setattr__(self, '_reference', reference)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, 'id', reference.id)
+
+    @property
+    def __class__(self):
+        return self._ref_model
+
+    def __repr__(self):
+        return '<ReferenceProxy: {}>'.format(self._reference.path)
+
+    def __getattr__(self, name):
+        # Also reached for unset slots of a proxy built without __init__
+        if name.startswith('__') or name in ReferenceProxy.__slots__:
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __reduce__(self):
+        return ReferenceProxy, (self._ref_model, self._reference)
+
+    def __deepcopy__(self, memo):
+        return ReferenceProxy(self._ref_model, self._reference)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def full_collection_name(self):
+        return self._reference.path.rsplit('/', 1)[0]
+
+    def _load(self):
+        if self._instance is None and not self._from_session():
+            path = self._reference.path
+            snapshot = cached_document(self._ref_model, path, db.conn)
+            if snapshot is None:
+                self._check_blocking()
+                snapshot = get_document(self._ref_model, path)
+            self._set_instance(snapshot)
+        return self._instance
+
+    def _check_blocking(self):
+        # A sync read here would stall every task on the running loop
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        raise error.BlockingReferenceLoad(
+            '{} is not loaded; use "await <proxy>.aload()" or '
+            'select_related() inside async code'.format(self._reference.path)
+        )
+
+    async def aload(self):
+        if self._instance is None and not self._from_session():
+            self._set_instance(
+                await aget_document(self._ref_model, self._reference.path)
+            )
+        return self._instance
+
+    def _from_session(self):
+        session = sessions.current()
+        if session is None or session.get(self._reference.path) is None:
+            return False
+        object.__setattr__(
+            self, '_instance', session.get(self._reference.path)
+        )
+        return True
+
+    def _set_instance(self, db_val):
+        if not db_val.exists:
+            raise error.ReferenceCollectionObjectDoesNotExist(
+                '{}/{}'.format(
+                    self._ref_model.collection_name(),
+                    self.id
+                )
+            )
+        object.__setattr__(
+            self, '_instance',
+            QueryResultWrapper.model_from_dict(self._ref_model, db_val)
         )
+
+
+class BulkResult(object):
+    def __init__(self, item):
+        self.item = item
+        self.id = None
+        self.error = None
+
+    def __repr__(self):
+        return '<BulkResult: {} {}>'.format(
+            self.id, 'ok' if self.ok else repr(self.error)
+        )
+
+    @property
+    def ok(self):
+        return self.error is None
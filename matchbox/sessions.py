@@ -0,0 +1,135 @@
+import contextvars
+
+from matchbox import instrumentation
+from matchbox.database import db
+
+_current = contextvars.ContextVar('matchbox_session', default=None)
+
+
+def current():
+    return _current.get()
+
+
+def document_path(model_class, id):
+    return '{}/{}'.format(model_class.full_collection_name(), id)
+
+
+class Session:
+    """
+    Identity map and unit of work. While the session is active every
+    document is hydrated into a single instance per path, and save()
+    only marks instances dirty; they are written in WriteBatches when
+    the block exits without an exception.
+    """
+
+    max_batch_size = 500
+
+    def __init__(self):
+        self.identity_map = {}
+        self.dirty = {}
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current.reset(self._token)
+        if exc_type is None:
+            self.flush()
+        else:
+            self.dirty.clear()
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        _current.reset(self._token)
+        if exc_type is None:
+            await self.aflush()
+        else:
+            self.dirty.clear()
+
+    def get(self, path):
+        return self.identity_map.get(path)
+
+    def add(self, path, instance):
+        return self.identity_map.setdefault(path, instance)
+
+    def discard(self, instance):
+        path = document_path(instance.__class__, instance.id)
+        self.identity_map.pop(path, None)
+        self.dirty.pop(path, None)
+
+    def save(self, instance, update_fields=None):
+        if update_fields is not None:
+            instance._get_update_fields(update_fields)
+        elif instance.id is None:
+            instance.id = db.conn.collection(
+                instance.full_collection_name()
+            ).document().id
+
+        path = document_path(instance.__class__, instance.id)
+        self.add(path, instance)
+        _instance, fields = self.dirty.get(path, (instance, set()))
+        if update_fields is None or fields is None:
+            fields = None
+        else:
+            fields = fields | set(update_fields)
+        self.dirty[path] = (instance, fields)
+
+    def writes(self):
+        for path, (instance, fields) in self.dirty.items():
+            meta = instance._meta
+            if fields is None:
+                data = meta.to_db(instance.get_fields())
+                yield path, instance, fields, 'set', data
+            else:
+                fields = list(fields)
+                data = meta.to_db(
+                    instance._get_update_fields(fields), partial=True
+                )
+                yield path, instance, fields, 'update', data
+
+    def batches(self, conn):
+        writes = list(self.writes())
+        for i in range(0, len(writes), self.max_batch_size):
+            batch = conn.batch()
+            paths = []
+            for path, instance, fields, method, data in writes[
+                    i:i + self.max_batch_size]:
+                getattr(batch, method)(conn.document(path), data)
+                paths.append((instance, path, fields))
+            yield batch, paths
+
+    def flush(self):
+        if not self.dirty:
+            return
+        with instrumentation.start(None, 'flush') as event:
+            for batch, paths in self.batches(db.conn):
+                event.rpc()
+                batch.commit()
+                event.write(len(paths))
+                self.committed(paths)
+
+    async def aflush(self):
+        if not self.dirty:
+            return
+        with instrumentation.start(None, 'flush') as event:
+            for batch, paths in self.batches(db.async_conn):
+                event.rpc()
+                await batch.commit()
+                event.write(len(paths))
+                self.committed(paths)
+
+    def committed(self, paths):
+        for instance, path, fields in paths:
+            self.dirty.pop(path, None)
+            instance._mark_loaded(fields)
+            cache = instance._meta.cache
+            if cache is not None:
+                cache.delete(path)
+
+
+def session():
+    return Session()
@@ -0,0 +1,19 @@
+from unittest.mock import Mock
+
+
+class Snapshot:
+    def __init__(self, path, data, exists=True):
+        self.reference = reference(path)
+        self.id = self.reference.id
+        self.exists = exists
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def get(self, field_path):
+        return self._data[field_path]
+
+
+def reference(path):
+    return Mock(path=path, id=path.split('/')[-1])
@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+
+from matchbox import models
+from matchbox.models import error
+from matchbox.queries.queries_result import ReferenceProxy
+from matchbox.tests.fakes import Snapshot, reference
+
+
+async def agen(items):
+    for item in items:
+        yield item
+
+
+class TestAsyncQueries(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class Book(models.Model):
+            title = models.TextField()
+            author = models.ReferenceField(Author)
+
+        self.Author = Author
+        self.Book = Book
+        self.conn = mock.Mock()
+        patcher = mock.patch(
+            'matchbox.database.Database.async_conn', new=self.conn
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_async_iteration_with_select_related(self):
+        rows = [
+            Snapshot('book/b%s' % i, {
+                'id': 'b%s' % i, 'title': 't', 'author': reference('author/a1')
+            }) for i in range(3)
+        ]
+        self.conn.collection.return_value.stream.return_value = agen(rows)
+        self.conn.get_all.side_effect = lambda refs: agen([
+            Snapshot('author/a1', {'id': 'a1', 'name': 'Neo'})
+        ])
+
+        books = [
+            b async for b in self.Book.objects.select_related('author')
+        ]
+
+        self.assertEqual([b.id for b in books], ['b0', 'b1', 'b2'])
+        self.assertEqual(books[0].author.name, 'Neo')
+        self.assertEqual(self.conn.get_all.call_count, 1)
+
+    async def test_aget(self):
+        where = self.conn.collection.return_value.where.return_value
+        where.limit.return_value.stream.return_value = agen(
+            [Snapshot('author/a1', {'name': 'Neo'})]
+        )
+
+        author = await self.Author.objects.aget(name='Neo')
+
+        where.limit.assert_called_once_with(2)
+
+        self.assertEqual((author.id, author.name), ('a1', 'Neo'))
+
+    async def test_lazy_reference_inside_event_loop(self):
+        proxy = ReferenceProxy(self.Author, reference('author/a1'))
+        sync_conn = mock.Mock()
+        self.conn.document.return_value.get = mock.AsyncMock(
+            return_value=Snapshot('author/a1', {'name': 'Neo'})
+        )
+
+        with mock.patch('matchbox.database.Database.conn', new=sync_conn):
+            with self.assertRaisesRegex(error.BlockingReferenceLoad, 'aload'):
+                proxy.name
+            sync_conn.document.assert_not_called()
+
+            author = await proxy.aload()
+
+        self.assertEqual((author.name, proxy.name), ('Neo', 'Neo'))
+
+    async def test_aget_by_id_with_select_related(self):
+        self.conn.document.return_value.get = mock.AsyncMock(
+            return_value=Snapshot('book/b1', {
+                'title': 't', 'author': reference('author/a1')
+            })
+        )
+        self.conn.get_all.side_effect = lambda refs: agen([
+            Snapshot('author/a1', {'name': 'Neo'})
+        ])
+        sync_conn = mock.Mock()
+
+        with mock.patch('matchbox.database.Database.conn', new=sync_conn):
+            book = await self.Book.objects.select_related('author').aget(
+                id='b1'
+            )
+
+        self.assertEqual(book.author.name, 'Neo')
+        self.conn.document.assert_any_call('book/b1')
+        self.assertEqual(sync_conn.mock_calls, [])
+
+    async def test_acreate(self):
+        ref = self.conn.collection.return_value.document.return_value
+        ref.id = 'a1'
+        ref.set = mock.AsyncMock()
+
+        author = await self.Author.objects.acreate(name='Neo')
+
+        ref.set.assert_awaited_once_with({'name': 'Neo', 'id': 'a1'})
+        self.assertEqual((author.id, author.name), ('a1', 'Neo'))
+
+    async def test_abulk_create(self):
+        self.conn.collection.return_value.document.side_effect = \
+            lambda id=None: mock.Mock(id=id)
+        self.conn.batch.return_value.commit = mock.AsyncMock()
+        authors = [self.Author(name='a%s' % i, id=i) for i in range(3)]
+
+        results = await self.Author.objects.abulk_create(
+            authors, batch_size=2
+        )
+
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(self.conn.batch.return_value.commit.await_count, 2)
@@ -0,0 +1,112 @@
+import unittest
+from unittest import mock
+
+from matchbox import models
+from matchbox.cache import LocalCache
+from matchbox.queries import error
+from matchbox.queries import queries_result
+from matchbox.tests.fakes import Snapshot, reference
+
+
+class TestLocalCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = LocalCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_ttl(self):
+        cache = LocalCache(ttl=10)
+        with mock.patch('time.monotonic', return_value=100):
+            cache.set('a', 1)
+            cache.set('b', 2, ttl=60)
+        with mock.patch('time.monotonic', return_value=120):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
+
+    def test_stats(self):
+        cache = LocalCache()
+        cache.set('a', 1)
+        cache.lookup('a')
+        cache.lookup('b')
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1})
+
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        class Country(models.Model):
+            name = models.TextField()
+
+            class Meta:
+                cache = True
+
+        class City(models.Model):
+            name = models.TextField()
+            country = models.ReferenceField(Country)
+
+        self.Country = Country
+        self.City = City
+        self.cache = Country._meta.cache
+        self.conn = mock.Mock()
+        self.doc_get = self.conn.document.return_value.get
+        self.doc_get.return_value = Snapshot(
+            'country/pl', {'id': 'pl', 'name': 'Poland'}
+        )
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_meta_cache(self):
+        self.assertIsInstance(self.cache, LocalCache)
+        self.assertIsNone(self.City._meta.cache)
+
+        with self.assertRaises(AttributeError):
+            class Other(models.Model):
+                class Meta:
+                    cache = 'yes'
+
+    def test_get_by_id_reads_through(self):
+        self.assertEqual(self.Country.objects.get(id='pl').name, 'Poland')
+        self.assertEqual(self.Country.objects.get(id='pl').name, 'Poland')
+
+        self.doc_get.assert_called_once_with()
+        self.conn.document.assert_any_call('country/pl')
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_get_missing(self):
+        self.doc_get.return_value = Snapshot('country/xx', {}, exists=False)
+        with self.assertRaises(error.DocumentDoesNotExists):
+            self.Country.objects.get(id='xx')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_references_use_cache(self):
+        self.cache.set('country/pl', {'id': 'pl', 'name': 'Poland'})
+        rows = [Snapshot('city/waw', {
+            'id': 'waw', 'name': 'Warsaw', 'country': reference('country/pl')
+        })]
+        city = queries_result.QueryResultWrapper.models_from_dicts(
+            self.City, rows, 1
+        )[0]
+
+        self.assertEqual(city.country.name, 'Poland')
+        self.conn.get_all.assert_not_called()
+
+    def test_writes_invalidate(self):
+        ref = self.conn.collection.return_value.document.return_value
+        ref.path = 'country/pl'
+        self.Country.objects.get(id='pl')
+        self.Country.objects.update(id='pl', name='Polska')
+        self.assertIsNone(self.cache.get('country/pl'))
+
+        self.Country.objects.get(id='pl')
+        doc = Snapshot('country/pl', {})
+        doc.reference.path = 'country/pl'
+        self.conn.collection.return_value.where.return_value.select \
+            .return_value.limit.return_value.stream.return_value = [doc]
+        self.Country.objects.delete(id='pl')
+        self.assertIsNone(self.cache.get('country/pl'))
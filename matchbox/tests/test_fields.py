@@ -356,8 +356,9 @@ class TestReferenceField(unittest.TestCase):
         r_model_instance = self.RefModel()
 
         expected = 'real_value'
-        with mock.patch('matchbox.database.Database.conn'):
-            firestore.DocumentReference = MagicMock(return_value=expected)
+        with mock.patch('matchbox.database.Database.conn'), \
+                mock.patch.object(firestore, 'DocumentReference',
+                                  MagicMock(return_value=expected)):
             actual = r_field.db_value(r_model_instance)
 
         self.assertEqual(expected, actual)
@@ -370,8 +371,9 @@ class TestReferenceField(unittest.TestCase):
         r_model_instance = self.RefModel()
 
         new_conn = Mock()
-        with mock.patch('matchbox.database.Database.conn', new=new_conn):
-            firestore.DocumentReference = MagicMock()
+        with mock.patch('matchbox.database.Database.conn', new=new_conn), \
+                mock.patch.object(firestore, 'DocumentReference',
+                                  MagicMock()):
             r_field.db_value(r_model_instance)
             firestore.DocumentReference.assert_called_with(expected_collection_name, self.REFMODEL_ID, client=new_conn)
 
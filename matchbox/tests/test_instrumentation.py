@@ -0,0 +1,299 @@
+import logging
+import threading
+import unittest
+from unittest import mock
+
+import matchbox
+from matchbox import instrumentation, models, sessions
+from matchbox.database import MemoryBackend
+from matchbox.instrumentation import adapters, events
+
+
+class InstrumentedTestCase(unittest.TestCase):
+    def setUp(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class Book(models.Model):
+            title = models.TextField()
+            year = models.IntegerField(blank=True)
+            author = models.ReferenceField(Author)
+
+        self.Author = Author
+        self.Book = Book
+        backend = MemoryBackend()
+        for name, client in [('conn', backend.client()),
+                             ('async_conn', backend.async_client())]:
+            patcher = mock.patch(
+                'matchbox.database.Database.%s' % name, new=client
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.events = []
+        listener = instrumentation.subscribe(self.events.append)
+        self.addCleanup(instrumentation.unsubscribe, listener)
+
+    def operations(self):
+        return [(e.operation, e.collection) for e in self.events]
+
+
+class TestEvents(InstrumentedTestCase):
+    def test_create_and_get(self):
+        author = self.Author.objects.create(name='Neo')
+        self.Author.objects.get(id=author.id)
+
+        create, get = self.events
+        self.assertEqual(self.operations(),
+                         [('create', 'author'), ('get', 'author')])
+        self.assertIs(create.model, self.Author)
+        self.assertEqual((create.rpcs, create.writes, create.reads),
+                         (1, 1, 0))
+        self.assertGreater(create.bytes_written, 0)
+        self.assertEqual(get.filters,
+                         [('__name__', '==', 'author/' + author.id)])
+        self.assertEqual((get.rpcs, get.reads), (1, 1))
+        self.assertGreater(get.bytes_read, 0)
+        self.assertGreaterEqual(get.elapsed, 0)
+        self.assertIsNone(get.error)
+
+    def test_filter_is_finished_when_exhausted(self):
+        author = self.Author.objects.create(name='Neo')
+        self.Book.objects.bulk_create([
+            self.Book(title=str(i), year=i, author=author) for i in range(3)
+        ])
+        del self.events[:]
+
+        books = iter(self.Book.objects.filter(year__gte=1))
+        next(books)
+        self.assertEqual(self.events, [])
+        list(books)
+
+        event, = self.events
+        self.assertEqual(event.operation, 'filter')
+        self.assertEqual(event.filters, [('year', '>=', 1)])
+        self.assertEqual((event.rpcs, event.reads), (1, 2))
+
+    def test_bulk_and_delete(self):
+        author = self.Author.objects.create(name='Neo')
+        self.Book.objects.bulk_create(
+            [self.Book(title=str(i), author=author) for i in range(3)],
+            batch_size=2
+        )
+        self.Book.objects.all().delete(batch_size=2)
+
+        bulk, delete = self.events[1:]
+        self.assertEqual((bulk.operation, bulk.rpcs, bulk.writes),
+                         ('bulk_create', 2, 3))
+        self.assertEqual((delete.operation, delete.writes, delete.reads),
+                         ('delete', 3, 3))
+        # A full and a short page read, and their two commits
+        self.assertEqual(delete.rpcs, 4)
+
+    def test_select_related_and_references(self):
+        author = self.Author.objects.create(name='Neo')
+        self.Book.objects.create(title='Matrix', author=author)
+        del self.events[:]
+
+        list(self.Book.objects.select_related('author'))
+        book = self.Book.objects.all().execute().__next__()
+        book.author.name
+
+        self.assertEqual(self.operations(), [
+            ('filter', 'book'), ('select_related', 'author'),
+            ('filter', 'book'), ('get', 'author'),
+        ])
+
+    def test_error(self):
+        with self.assertRaises(Exception):
+            self.Book.objects.update(id='missing', title='Zion')
+
+        event, = self.events
+        self.assertEqual(event.operation, 'update')
+        self.assertIsNotNone(event.error)
+        self.assertEqual(event.writes, 0)
+
+    def test_session_flush(self):
+        with sessions.session():
+            self.Author(name='Neo').save()
+            self.Author(name='Trinity').save()
+
+        event, = self.events
+        self.assertEqual((event.operation, event.model, event.writes),
+                         ('flush', None, 2))
+
+    def test_nobody_listening(self):
+        self.addCleanup(instrumentation.subscribe, self.events.append)
+        instrumentation.unsubscribe(self.events.append)
+
+        self.assertFalse(instrumentation.enabled())
+        self.assertIs(
+            instrumentation.start(self.Book, 'get'), instrumentation.NULL_EVENT
+        )
+        self.Author.objects.create(name='Neo')
+        self.assertEqual(self.events, [])
+
+
+class TestAsyncEvents(InstrumentedTestCase,
+                      unittest.IsolatedAsyncioTestCase):
+    async def test_async_operations(self):
+        author = await self.Author.objects.acreate(name='Neo')
+        await self.Author.objects.aget(id=author.id)
+        [a async for a in self.Author.objects.all()]
+        await self.Author.objects.all().acount()
+
+        self.assertEqual(
+            [e.operation for e in self.events],
+            ['create', 'get', 'filter', 'count']
+        )
+        self.assertEqual(self.events[2].reads, 1)
+
+
+class TestSizes(unittest.TestCase):
+    def test_value_size(self):
+        self.assertEqual(events.value_size({
+            'name': 'Neo', 'age': 30, 'tags': [True, None],
+        }), 5 + 4 + 4 + 8 + 5 + 2)
+        self.assertEqual(events.name_size('user/u1'), 5 + 3 + 16)
+
+
+class TestAdapters(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+
+        self.event = events.QueryEvent(
+            User, 'filter', [('name', '==', 'Neo')]
+        )
+        self.event.rpc()
+        self.event.write(2)
+        self.event.elapsed = 0.5
+
+    def test_logging(self):
+        listener = instrumentation.LoggingListener(slow=0.25)
+        with self.assertLogs('matchbox.queries', logging.WARNING) as logs:
+            listener(self.event)
+
+        self.assertEqual(logs.output, [
+            "WARNING:matchbox.queries:filter user 500.0ms rpcs=1 reads=0 "
+            "writes=2 bytes=0 filters=[('name', '==', 'Neo')]"
+        ])
+
+    def test_prometheus(self):
+        client = mock.Mock()
+        with mock.patch.object(adapters, 'prometheus_client', client):
+            listener = instrumentation.PrometheusListener()
+        listener(self.event)
+
+        listener.operations.labels.assert_called_with('User', 'filter')
+        listener.writes.labels.return_value.inc.assert_called_with(2)
+        listener.duration.labels.return_value.observe.assert_called_with(
+            0.5
+        )
+
+    def test_prometheus_missing(self):
+        with mock.patch.object(adapters, 'prometheus_client', None):
+            with self.assertRaises(ImportError) as context:
+                instrumentation.PrometheusListener()
+        self.assertEqual(
+            'PrometheusListener requires prometheus_client to be installed',
+            str(context.exception)
+        )
+
+    def test_opentelemetry(self):
+        tracer, trace = mock.Mock(), mock.Mock()
+        self.event.error = ValueError('boom')
+        with mock.patch.object(adapters, 'opentelemetry_trace', trace):
+            instrumentation.OpenTelemetryListener(tracer)(self.event)
+
+        start = int(self.event.started * 1e9)
+        tracer.start_span.assert_called_once_with(
+            'filter user', kind=trace.SpanKind.CLIENT, start_time=start,
+            attributes=mock.ANY
+        )
+        span = tracer.start_span.return_value
+        span.record_exception.assert_called_once_with(self.event.error)
+        span.set_status.assert_called_once_with(trace.Status.return_value)
+        trace.Status.assert_called_once_with(trace.StatusCode.ERROR, 'boom')
+        span.end.assert_called_once_with(end_time=start + 500000000)
+
+    def test_opentelemetry_missing(self):
+        with mock.patch.object(adapters, 'opentelemetry_trace', None):
+            with self.assertRaises(ImportError) as context:
+                instrumentation.OpenTelemetryListener()
+        self.assertEqual(
+            'OpenTelemetryListener requires opentelemetry-api to be '
+            'installed', str(context.exception)
+        )
+
+
+class TestQueryBudget(InstrumentedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authors = [
+            self.Author.objects.create(name=name)
+            for name in ['Neo', 'Trinity', 'Morpheus']
+        ]
+        for author in self.authors:
+            self.Book.objects.create(title=author.name, author=author)
+
+    def test_counts(self):
+        with matchbox.query_budget() as budget:
+            list(self.Book.objects.all())
+            self.Author.objects.get(id=self.authors[0].id)
+
+        self.assertEqual((budget.rpcs, budget.reads, budget.writes),
+                         (2, 4, 0))
+        self.assertEqual([e.operation for e in budget.events],
+                         ['filter', 'get'])
+        self.Author.objects.get(id=self.authors[0].id)
+        self.assertEqual(budget.rpcs, 2)
+
+    def test_exceeded(self):
+        with self.assertRaises(instrumentation.QueryBudgetExceeded) as ctx:
+            with matchbox.query_budget(max_reads=3):
+                list(self.Author.objects.all())
+                list(self.Book.objects.all())
+        self.assertIn('6 reads used, max_reads is 3', str(ctx.exception))
+
+    def test_warn(self):
+        with self.assertWarns(instrumentation.QueryBudgetWarning) as ctx:
+            with matchbox.query_budget(max_rpcs=1, action='warn'):
+                self.Author.objects.all().count()
+                self.Author.objects.all().count()
+        self.assertEqual(ctx.filename, __file__)
+
+    def test_invalid_action(self):
+        with self.assertRaises(AttributeError):
+            matchbox.query_budget(action='ignore')
+
+    def test_repeated_point_reads(self):
+        with matchbox.query_budget(debug=True) as budget:
+            list(self.Book.objects.select_related('author'))
+        self.assertEqual(budget.point_reads, {})
+
+        with self.assertRaises(instrumentation.RepeatedPointReads) as ctx:
+            with matchbox.query_budget(debug=True):
+                for book in self.Book.objects.all():
+                    book.author.name
+        self.assertIn('3 point reads of author', str(ctx.exception))
+
+    def test_locations(self):
+        with matchbox.query_budget(debug=True) as budget:
+            self.Author.objects.all().count()
+        location, = budget.locations
+        self.assertTrue(location.startswith(__file__))
+        self.assertIn(location, budget.report())
+
+    def test_other_threads_are_not_counted(self):
+        def read():
+            list(self.Author.objects.all())
+
+        with matchbox.query_budget() as budget:
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join()
+            list(self.Author.objects.all().parallel_scan())
+
+        self.assertEqual([e.operation for e in budget.events],
+                         ['partition', 'parallel_scan'])
@@ -0,0 +1,290 @@
+import datetime
+import itertools
+import unittest
+from unittest import mock
+
+from firebase_admin import firestore
+from google.api_core import exceptions as api_exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.watch import ChangeType
+
+from matchbox import models
+from matchbox.database import Database, MemoryBackend, memory
+from matchbox.queries.paginator import Paginator
+
+
+class TestMemoryClient(unittest.TestCase):
+    def setUp(self):
+        self.client = memory.Client()
+        self.users = self.client.collection('user')
+        for i, (name, age) in enumerate([
+                ('Neo', 30), ('Trinity', 29), ('Morpheus', None),
+                ('Smith', 40)]):
+            self.users.document('u%s' % i).set({'name': name, 'age': age})
+
+    def ids(self, query):
+        return [d.id for d in query.stream()]
+
+    def test_set_get_and_update(self):
+        ref = self.users.document('u0')
+        ref.update({
+            'age': transforms.Increment(1),
+            'address.city': 'Zion',
+            'tags': transforms.ArrayUnion(['one']),
+            'created': firestore.SERVER_TIMESTAMP,
+        })
+
+        data = ref.get().to_dict()
+        self.assertEqual(data['age'], 31)
+        self.assertEqual(data['address'], {'city': 'Zion'})
+        self.assertEqual(data['tags'], ['one'])
+        self.assertIsInstance(data['created'], datetime.datetime)
+        self.assertEqual(ref.get(['name']).to_dict(), {'name': 'Neo'})
+        self.assertFalse(self.users.document('missing').get().exists)
+
+    def test_write_errors(self):
+        with self.assertRaises(api_exceptions.NotFound):
+            self.users.document('missing').update({'age': 1})
+        with self.assertRaises(api_exceptions.AlreadyExists):
+            self.users.document('u0').create({'name': 'Neo'})
+
+    def test_batch_is_atomic(self):
+        batch = self.client.batch()
+        batch.set(self.users.document('u9'), {'name': 'Oracle'})
+        batch.update(self.users.document('missing'), {'age': 1})
+
+        with self.assertRaises(api_exceptions.NotFound):
+            batch.commit()
+        self.assertFalse(self.users.document('u9').get().exists)
+
+    def test_filters_and_ordering(self):
+        self.assertEqual(self.ids(self.users.where('age', '>=', 30)),
+                         ['u0', 'u3'])
+        self.assertEqual(self.ids(self.users.where('age', '!=', 30)),
+                         ['u1', 'u3'])
+        self.assertEqual(self.ids(self.users.where('age', '==', None)),
+                         ['u2'])
+        self.assertEqual(
+            self.ids(self.users.order_by('age', direction='DESCENDING')),
+            ['u3', 'u0', 'u1', 'u2']
+        )
+        self.assertEqual(
+            self.ids(self.users.where('age', 'in', [29, 40]).limit(1)),
+            ['u1']
+        )
+
+    def test_filter_value_limits(self):
+        self.assertEqual(
+            len(self.users.where('age', 'in', list(range(20, 50))).get()), 3
+        )
+        for query in [
+                self.users.where('age', 'in', list(range(31))),
+                self.users.where('tags', 'array_contains_any',
+                                 list(range(31))),
+                self.users.where('age', 'not-in', list(range(11))),
+                self.users.where('age', 'in', list(range(10))).where(
+                    'name', 'in', ['a', 'b', 'c', 'd']),
+        ]:
+            with self.assertRaises(api_exceptions.InvalidArgument):
+                query.get()
+
+    def test_cursors(self):
+        query = self.users.order_by('age')
+        first = query.limit(2).get()[-1]
+
+        self.assertEqual(self.ids(query.start_after(first)), ['u0', 'u3'])
+        self.assertEqual(self.ids(query.start_at({'age': 30})),
+                         ['u0', 'u3'])
+        self.assertEqual(self.ids(query.end_before(first)), ['u2'])
+        self.assertEqual(
+            [d.id for d in query.limit_to_last(2).get()], ['u0', 'u3']
+        )
+
+    def test_subcollections_and_groups(self):
+        self.users.document('u0').collection('post').document('p1').set(
+            {'title': 'a'}
+        )
+        self.client.collection('post').document('p2').set({'title': 'b'})
+
+        self.assertEqual(
+            self.ids(self.client.collection('user/u0/post')), ['p1']
+        )
+        self.users.document('u1').collection('post').document('p3').set(
+            {'title': 'c'}
+        )
+        self.assertEqual(
+            sorted(self.ids(self.client.collection_group('post'))),
+            ['p1', 'p2', 'p3']
+        )
+        # Scoped to the parent document of the collection
+        self.assertEqual(self.ids(memory.CollectionGroup(
+            self.client.collection('user/u0/post')
+        )), ['p1'])
+
+    def test_aggregations(self):
+        self.assertEqual(self.users.count().get()[0][0].value, 4)
+        self.assertEqual(self.users.sum('age').get()[0][0].value, 99)
+        self.assertEqual(self.users.avg('age').get()[0][0].value, 33)
+
+    def test_transaction_retries_on_conflict(self):
+        ref = self.users.document('u0')
+        attempts = []
+
+        @firestore.transactional
+        def birthday(transaction):
+            age = next(transaction.get(ref)).get('age')
+            if not attempts:
+                ref.update({'age': 50})
+            attempts.append(age)
+            transaction.update(ref, {'age': age + 1})
+
+        birthday(self.client.transaction())
+
+        self.assertEqual(attempts, [30, 50])
+        self.assertEqual(ref.get().get('age'), 51)
+
+    def test_on_snapshot(self):
+        calls = []
+        watch = self.users.where('age', '>', 35).on_snapshot(
+            lambda docs, changes, read_time: calls.append(
+                [(c.type, c.document.id) for c in changes]
+            )
+        )
+        self.users.document('u0').update({'age': 36})
+        self.users.document('u3').delete()
+        watch.unsubscribe()
+        self.users.document('u1').update({'age': 37})
+
+        self.assertEqual(calls, [
+            [(ChangeType.ADDED, 'u3')],
+            [(ChangeType.ADDED, 'u0')],
+            [(ChangeType.REMOVED, 'u3')],
+        ])
+
+    def test_initialization(self):
+        backend = MemoryBackend()
+        database = Database()
+        database.initialization(backend=backend)
+
+        self.assertIs(database.backend, backend)
+        self.assertIsInstance(database.conn, memory.Client)
+        self.assertIsInstance(database.async_conn, memory.AsyncClient)
+        database.conn.collection('user').document('u1').set({})
+        self.assertEqual(len(backend.client().collection('user').get()), 1)
+
+
+class TestMemoryBackend(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class Book(models.Model):
+            title = models.TextField()
+            author = models.ReferenceField(Author)
+
+        self.Author = Author
+        self.Book = Book
+        self.backend = MemoryBackend()
+        for name, client in [('conn', self.backend.client()),
+                             ('async_conn', self.backend.async_client())]:
+            patcher = mock.patch(
+                'matchbox.database.Database.%s' % name, new=client
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_models(self):
+        author = self.Author.objects.create(name='Neo')
+        self.Book.objects.create(title='Matrix', author=author)
+        self.Book.objects.create(title='Zion', author=author)
+
+        books = list(
+            self.Book.objects.filter(author=author).select_related('author')
+        )
+        self.assertEqual(sorted(b.title for b in books), ['Matrix', 'Zion'])
+        self.assertEqual(books[0].author.name, 'Neo')
+        self.assertEqual(self.Book.objects.all().count(), 2)
+
+        self.Book.objects.all().delete()
+        self.assertFalse(self.Book.objects.all().exists())
+
+    def test_fan_out(self):
+        authors = self.Author.objects.bulk_create([
+            self.Author(name='a%02d' % i) for i in range(40)
+        ])
+        ids = [r.id for r in authors]
+        query = self.Author.objects.filter(id__in=ids).order_by('-name')
+
+        names = list(query.values_list('name', flat=True))
+        self.assertEqual(names, ['a%02d' % i for i in reversed(range(40))])
+        self.assertEqual(query.to_columns('name'), {'name': names})
+        self.assertEqual(
+            len(list(self.Author.objects.filter(id__in=ids).values())), 40
+        )
+
+        paginator = Paginator(query, 15)
+        last = paginator.page(paginator.page().next_token)
+        previous = paginator.page(last.previous_token)
+        self.assertEqual([a.name for a in previous], names[:15])
+
+        with self.assertRaises(AttributeError):
+            list(self.Author.objects.filter(id__in=ids).parallel_scan())
+
+    def test_parallel_scan_of_subcollection(self):
+        class Order(models.Model):
+            total = models.IntegerField()
+
+        authors = [self.Author.objects.create(name=name)
+                   for name in ['Neo', 'Trinity']]
+        for i, author in enumerate(authors):
+            Order.set_base_path(author)
+            self.addCleanup(Order.reset_base_path)
+            Order.objects.bulk_create([Order(total=i) for _ in range(3)])
+
+        # Partitions only cover the current parent's collection
+        scanned = [
+            d.reference.path
+            for query in Order.objects.all().partition_queries(2)
+            for d in query.stream()
+        ]
+        self.assertEqual(len(scanned), 3)
+        self.assertTrue(all(
+            p.startswith(Order.full_collection_name()) for p in scanned
+        ))
+        self.assertEqual(
+            [o.total for o in Order.objects.all().parallel_scan()], [1] * 3
+        )
+
+    def test_paginate_with_only(self):
+        class City(models.Model):
+            name = models.TextField()
+            pop = models.IntegerField()
+            at = models.TimeStampField()
+
+        start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        City.objects.bulk_create([
+            City(name='c%s' % i, pop=i,
+                 at=start + datetime.timedelta(days=i))
+            for i in range(10)
+        ])
+
+        for order, names in [
+                ('pop', ['c%s' % i for i in range(10)]),
+                ('-at', ['c%s' % i for i in reversed(range(10))])]:
+            query = City.objects.all().only('name').order_by(order)
+            # A lost cursor would return the first page again and again
+            pages = list(itertools.islice(Paginator(query, 4), 5))
+            self.assertEqual([len(p) for p in pages], [4, 4, 2])
+            self.assertEqual([c.name for p in pages for c in p], names)
+            self.assertEqual(query.loaded_field_names(), ('name', 'id'))
+
+    async def test_async_models(self):
+        author = await self.Author.objects.acreate(name='Neo')
+
+        self.assertEqual(
+            (await self.Author.objects.aget(id=author.id)).name, 'Neo'
+        )
+        self.assertEqual(
+            [a.name async for a in self.Author.objects.filter(name='Neo')],
+            ['Neo']
+        )
@@ -0,0 +1,125 @@
+import unittest
+from unittest import mock
+
+from google.cloud.firestore_v1.watch import ChangeType
+
+from matchbox import models
+from matchbox.database import MemoryBackend
+from matchbox.queries import queries
+from matchbox.tests.fakes import Snapshot
+
+
+def change(type, path, data=None):
+    return mock.Mock(type=type, document=Snapshot(path, data or {}))
+
+
+class TestMirror(unittest.TestCase):
+    def setUp(self):
+        class Plan(models.Model):
+            name = models.TextField()
+            price = models.IntegerField()
+            tags = models.ListField()
+
+        self.Plan = Plan
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.mirror = Plan.objects.mirror()
+        self.addCleanup(self.mirror.stop)
+        self.conn.collection.reset_mock()
+        self.mirror.on_snapshot([], [
+            change(ChangeType.ADDED, 'plan/p2', {
+                'id': 'p2', 'name': 'pro', 'price': 20, 'tags': ['a', 'b']
+            }),
+            change(ChangeType.ADDED, 'plan/p1', {
+                'id': 'p1', 'name': 'free', 'price': 0, 'tags': ['a']
+            }),
+            change(ChangeType.ADDED, 'plan/p3', {
+                'id': 'p3', 'name': 'team', 'price': 50, 'tags': []
+            }),
+        ], None)
+
+    def test_start_and_stop(self):
+        self.assertIs(self.Plan.objects.mirror(), self.mirror)
+        self.assertIs(self.Plan._meta.mirror, self.mirror)
+
+        self.mirror.stop()
+        self.assertIsNone(self.Plan._meta.mirror)
+        self.conn.collection.return_value.on_snapshot.return_value \
+            .unsubscribe.assert_called_once_with()
+
+    def test_queries_served_from_mirror(self):
+        self.assertEqual(
+            [p.id for p in self.Plan.objects.all()], ['p1', 'p2', 'p3']
+        )
+        self.assertEqual(self.Plan.objects.get(name='pro').price, 20)
+        self.assertEqual(
+            [p.name for p in self.Plan.objects.filter(
+                price__gte=10).order_by('-price')],
+            ['team', 'pro']
+        )
+        self.assertEqual(
+            self.Plan.objects.filter(tags__contains='a').count(), 2
+        )
+        self.assertFalse(self.Plan.objects.filter(price__lt=0).exists())
+        self.conn.collection.assert_not_called()
+
+    def test_changes_are_applied(self):
+        self.mirror.on_snapshot([], [
+            change(ChangeType.MODIFIED, 'plan/p2', {
+                'id': 'p2', 'name': 'business', 'price': 25, 'tags': []
+            }),
+            change(ChangeType.REMOVED, 'plan/p1'),
+        ], None)
+
+        self.assertEqual(len(self.mirror), 2)
+        self.assertFalse(self.Plan.objects.filter(name='pro').exists())
+        self.assertEqual(self.Plan.objects.get(name='business').price, 25)
+        self.assertFalse(self.Plan.objects.filter(id='p1').exists())
+
+    def test_unsupported_query_falls_back(self):
+        query = self.Plan.objects.filter(name__ne='pro')
+        query.make_query = mock.Mock()
+        query.make_query.return_value.stream.return_value = []
+
+        self.assertEqual(list(query), [])
+        query.make_query.assert_called_once_with(None)
+
+
+class TestMirrorMatchesDatabase(unittest.TestCase):
+    def test_same_results_with_and_without_mirror(self):
+        class Plan(models.Model):
+            flag = models.BooleanField(blank=True)
+            price = models.IntegerField(blank=True)
+
+        patcher = mock.patch('matchbox.database.Database.conn',
+                             new=MemoryBackend().client())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        conn = patcher.new
+        for doc_id, data in [('p1', {'flag': True, 'price': 1}),
+                             ('p2', {'flag': False, 'price': None}),
+                             ('p3', {'flag': 1}),
+                             ('p4', {'price': 1.0})]:
+            conn.collection('plan').document(doc_id).set(data)
+
+        filters = [
+            {'flag': 1}, {'flag': True}, {'flag__in': [1, 0]},
+            {'price': None}, {'price': 1}, {'price__gte': 0},
+            {'price__lt': True},
+        ]
+        expected = [
+            [p.id for p in Plan.objects.filter(**q)] for q in filters
+        ]
+        mirror = Plan.objects.mirror()
+        self.addCleanup(mirror.stop)
+        self.assertTrue(mirror.wait(1))
+        with mock.patch.object(queries.FilterQuery, 'make_queries',
+                               side_effect=AssertionError):
+            self.assertEqual(
+                [[p.id for p in Plan.objects.filter(**q)] for q in filters],
+                expected
+            )
+        self.assertEqual(expected[:4], [['p3'], ['p1'], ['p3'], ['p2']])
@@ -1,6 +1,12 @@
+import copy
 import unittest
+from unittest import mock
+
+from firebase_admin import firestore
 
 from matchbox import models
+from matchbox.queries import queries_result
+from matchbox.tests.fakes import Snapshot, reference
 
 
 class TestModel(unittest.TestCase):
@@ -184,3 +190,228 @@ class TestModel(unittest.TestCase):
             "not been saved (don't have id)",
             str(context.exception)
         )
+
+    def test_column_index(self):
+        class TestModelClass(models.Model):
+            name = models.TextField(column_name='fullName')
+            parent = models.ReferenceField(models.Model)
+
+        meta = TestModelClass._meta
+        name_field = meta.fields['name']
+
+        self.assertIs(meta.get_field_by_column_name('fullName'), name_field)
+        self.assertIs(meta.get_field_by_column_name('name'), name_field)
+        self.assertIs(meta.fields_by_column['id'], meta.fields['id'])
+        self.assertEqual(
+            meta.hydration_plan['fullName'],
+            (name_field, name_field.python_value)
+        )
+        self.assertIsNone(meta.hydration_plan['parent'][1])
+
+        with self.assertRaises(TypeError):
+            meta.fields_by_column['other'] = name_field
+
+        with self.assertRaises(AttributeError) as context:
+            meta.get_field_by_column_name('other')
+
+        self.assertEqual('Field name other not found', str(context.exception))
+
+    def test_invalid_field_attribute_on_class_creation(self):
+        with self.assertRaises(AttributeError) as context:
+            class TestModelClass(models.Model):
+                age = models.IntegerField(max_length=10)
+
+        self.assertEqual(
+            'IntegerField not allow attribute max_length',
+            str(context.exception)
+        )
+
+    def test_to_db(self):
+        class TestModelClass(models.Model):
+            name = models.TextField(max_length=3, column_name='n')
+            age = models.IntegerField(default=lambda: 7)
+            tags = models.ListField(blank=True)
+
+        to_db = TestModelClass._meta.to_db
+
+        self.assertEqual(
+            to_db({'name': 'Alexander', 'id': 1}),
+            {'n': 'Ale', 'age': 7, 'tags': None, 'id': '1'}
+        )
+        self.assertEqual(to_db({'age': '3'}, partial=True), {'age': 3})
+
+        with self.assertRaises(AttributeError) as context:
+            to_db({'age': 3})
+        self.assertEqual(
+            'Field name required value', str(context.exception)
+        )
+
+        with self.assertRaises(AttributeError) as context:
+            to_db({'other': 3}, partial=True)
+        self.assertEqual(
+            'Field name other not found', str(context.exception)
+        )
+
+
+class TestDirtyTracking(unittest.TestCase):
+    def setUp(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class User(models.Model):
+            name = models.TextField()
+            age = models.IntegerField(column_name='userAge')
+            tags = models.ListField()
+            author = models.ReferenceField(Author)
+
+        self.User = User
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        row = Snapshot('user/u1', {
+            'id': 'u1', 'name': 'Neo', 'userAge': 30, 'tags': ['a'],
+            'author': reference('author/a1'),
+        })
+        self.user = queries_result.QueryResultWrapper.models_from_dicts(
+            User, [row]
+        )[0]
+        self.ref = self.conn.collection.return_value.document.return_value
+
+    def test_unchanged_save_skips_write(self):
+        self.assertEqual(self.user.changed_fields(), [])
+        self.user.save()
+        self.ref.update.assert_not_called()
+        self.ref.set.assert_not_called()
+        self.conn.document.assert_not_called()
+
+    def test_save_updates_changed_columns(self):
+        self.user.age = 31
+        self.user.tags.append('b')
+        self.assertEqual(self.user.changed_fields(), ['age', 'tags'])
+
+        self.user.save()
+        self.ref.update.assert_called_once_with(
+            {'userAge': 31, 'tags': ['a', 'b'], 'id': 'u1'}
+        )
+        self.assertEqual(self.user.changed_fields(), [])
+
+    def test_loaded_state_is_compact(self):
+        # Only the list is snapshotted, the other fields are kept on
+        # their first change
+        self.assertEqual(self.user._loaded, 'u1')
+        self.assertEqual(self.user._original, (('a', ), ))
+
+        self.user.age = 31
+        self.user.name = 'Neo'
+        self.assertEqual(self.user._original,
+                         {'tags': ('a', ), 'age': 30, 'name': 'Neo'})
+        self.assertEqual(self.user.changed_fields(), ['age'])
+        self.user.age = 30
+        self.assertEqual(self.user.changed_fields(), [])
+
+    def test_list_replaced_after_in_place_change(self):
+        self.user.tags.append('b')
+        self.user.tags = list(self.user.tags)
+        self.assertEqual(self.user.changed_fields(), ['tags'])
+
+    def test_refresh_of_new_instance(self):
+        user = self.User(name='Smith', age=40)
+        user.id = 'u1'
+        self.ref.get.return_value = Snapshot('user/u1', {'name': 'Neo'})
+
+        user.refresh_from_db(fields=['name'])
+
+        self.assertEqual(user.name, 'Neo')
+        self.assertEqual(user.changed_fields(), ['age'])
+
+    def test_geo_point_changed_in_place(self):
+        class Place(models.Model):
+            loc = models.GeoPointField()
+
+        place = queries_result.QueryResultWrapper.models_from_dicts(
+            Place, [Snapshot('place/p1', {'loc': firestore.GeoPoint(1, 2)})]
+        )[0]
+        place.loc.latitude = 50
+
+        self.assertEqual(place.changed_fields(), ['loc'])
+        place.save()
+        self.ref.update.assert_called_once_with(
+            {'loc': firestore.GeoPoint(50, 2), 'id': 'p1'}
+        )
+
+    def test_changed_id_saves_new_document(self):
+        self.user.id = 'u2'
+        with mock.patch.object(self.User, '_save') as save:
+            self.user.save()
+        save.assert_called_once_with()
+        self.ref.update.assert_not_called()
+
+
+class TestSlots(unittest.TestCase):
+    def setUp(self):
+        class Base(models.Model):
+            created = models.IntegerField()
+
+            class Meta:
+                abstract = True
+
+        class Row(Base):
+            name = models.TextField()
+            age = models.IntegerField(column_name='userAge')
+
+            class Meta:
+                slots = True
+
+        self.Row = Row
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_slotted_layout(self):
+        self.assertEqual(
+            set(self.Row.__slots__),
+            {'name', 'age', 'created', 'id', '_deferred', '_loaded',
+             '_original'}
+        )
+        row = self.Row(name='a')
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertEqual(row.name, 'a')
+        self.assertIsNone(row.age)
+
+        with self.assertRaises(AttributeError):
+            row.other = 1
+
+    def test_hydration_and_tracking(self):
+        rows = [Snapshot('row/r1', {
+            'id': 'r1', 'name': 'a', 'userAge': 3, 'created': 1
+        })]
+        row = queries_result.QueryResultWrapper.models_from_dicts(
+            self.Row, rows
+        )[0]
+        self.assertEqual(
+            row.get_fields(), {'created': 1, 'name': 'a', 'age': 3, 'id': 'r1'}
+        )
+
+        # Nothing but the loaded id is kept until a field changes
+        self.assertEqual(row._loaded, 'r1')
+        self.assertIsNone(row._original)
+
+        self.assertEqual(copy.deepcopy(row).changed_fields(), [])
+        row.age = 4
+        self.assertEqual(row.changed_fields(), ['age'])
+        self.assertEqual(copy.deepcopy(row).changed_fields(), ['age'])
+
+    def test_deferred_field(self):
+        rows = [Snapshot('row/r1', {'id': 'r1', 'name': 'a'})]
+        row = queries_result.QueryResultWrapper.models_from_dicts(
+            self.Row, rows, deferred=['age']
+        )[0]
+        ref = self.conn.collection.return_value.document.return_value
+        ref.get.return_value = Snapshot('row/r1', {'userAge': 7})
+
+        self.assertEqual(row.age, 7)
+        self.assertEqual(row.age, 7)
+        ref.get.assert_called_once_with(['userAge'])
@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+from matchbox import models
+from matchbox.queries import error
+from matchbox.queries import queries
+from matchbox.queries.paginator import Paginator
+from matchbox.tests.fakes import Snapshot, reference
+
+
+class TestPaginator(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+            age = models.IntegerField()
+
+        self.User = User
+        self.rows = [
+            Snapshot('user/u%s' % i, {'name': 'n%s' % i, 'age': i})
+            for i in range(1, 6)
+        ]
+        self.conn = mock.Mock()
+        self.conn.document.side_effect = reference
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(
+            queries.FilterQuery, 'raw_execute', autospec=True,
+            side_effect=self.forward
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def position(self, cursor):
+        paths = [r.reference.path for r in self.rows]
+        return paths.index(cursor.reference.path)
+
+    def forward(self, query):
+        start = 0
+        if query.n_start_after is not None:
+            start = self.position(query.n_start_after) + 1
+        return iter(self.rows[start:start + query.n_limit])
+
+    def test_pages_leave_query_alone(self):
+        query = self.User.objects.filter(age__gte=1)
+        pages = list(Paginator(query, 2))
+
+        self.assertEqual(
+            [[u.id for u in page] for page in pages],
+            [['u1', 'u2'], ['u3', 'u4'], ['u5']]
+        )
+        self.assertEqual(
+            [(p.has_previous, p.has_next) for p in pages],
+            [(False, True), (True, True), (True, False)]
+        )
+        self.assertIsNone(query.n_limit)
+        self.assertIsNone(query.n_start_after)
+        self.assertEqual(query.n_order_by, [])
+
+    def test_resume_from_token(self):
+        paginator = Paginator(self.User.objects.all().order_by('-age'), 2)
+        token = paginator.page().next_token
+
+        query = self.User.objects.all().order_by('-age')
+        page = Paginator(query, 2).page(token)
+        self.assertEqual([u.id for u in page], ['u3', 'u4'])
+
+        direction, cursor = paginator.decode(token)
+        self.assertEqual(direction, 'n')
+        self.assertEqual(cursor.to_dict(), {'age': 2})
+        self.assertEqual(cursor.reference.path, 'user/u2')
+
+    def test_previous_page(self):
+        paginator = Paginator(self.User.objects.all(), 2)
+        token = paginator.page(paginator.page().next_token).previous_token
+
+        def backward(query, conn=None, wheres=None):
+            end = self.position(query.n_end_before)
+            bsq = mock.Mock()
+            bsq.limit_to_last.side_effect = lambda n: mock.Mock(
+                get=lambda: self.rows[max(end - n, 0):end]
+            )
+            return bsq
+
+        with mock.patch.object(
+                queries.FilterQuery, 'make_query', autospec=True,
+                side_effect=backward):
+            page = paginator.page(token)
+
+        self.assertEqual([u.id for u in page], ['u1', 'u2'])
+        self.assertFalse(page.has_previous)
+        self.assertTrue(page.has_next)
+
+    def test_invalid_token(self):
+        paginator = Paginator(self.User.objects.all(), 2)
+        with self.assertRaises(error.InvalidPageToken):
+            paginator.page('not a token')
+
+        other = Paginator(self.User.objects.all(), 2).encode(
+            'n', Snapshot('team/t1', {})
+        )
+        with self.assertRaises(error.InvalidPageToken):
+            paginator.page(other)
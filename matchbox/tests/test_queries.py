@@ -0,0 +1,703 @@
+import datetime
+import unittest
+from unittest import mock
+
+from firebase_admin import firestore
+from google.api_core import exceptions as api_exceptions
+
+from matchbox import models
+from matchbox.models import error as models_error
+from matchbox.queries import error, queries
+from matchbox.tests.fakes import Snapshot, reference
+
+
+class TestFilterQuery(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+
+        self.User = User
+
+    def test_iteration_is_lazy(self):
+        consumed = []
+
+        def stream():
+            for i in range(3):
+                consumed.append(i)
+                yield Snapshot('user/u%s' % i, {
+                    'id': 'u%s' % i, 'name': 'n%s' % i
+                })
+
+        query = self.User.objects.all()
+        with mock.patch.object(query, 'raw_execute', return_value=stream()):
+            users = iter(query)
+            first = next(users)
+
+            self.assertEqual(first.name, 'n0')
+            self.assertEqual(consumed, [0])
+            self.assertEqual([u.id for u in users], ['u1', 'u2'])
+
+    def test_iterator_chunk_size(self):
+        rows = [
+            Snapshot('user/u%s' % i, {'id': 'u%s' % i, 'name': 'n'})
+            for i in range(5)
+        ]
+        query = self.User.objects.all().select_related(depth=1)
+        with mock.patch.object(query, 'raw_execute', return_value=iter(rows)):
+            with mock.patch(
+                    'matchbox.queries.queries_result.QueryResultWrapper'
+                    '.models_from_dicts', side_effect=lambda m, c, r, d: c
+            ) as models_from_dicts:
+                list(query.iterator(chunk_size=2))
+
+        self.assertEqual(
+            [len(c[0][1]) for c in models_from_dicts.call_args_list],
+            [2, 2, 1]
+        )
+
+
+class TestAggregation(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            age = models.IntegerField(column_name='userAge')
+            stats = models.MapField()
+
+        self.User = User
+
+    def aggregation_result(self, value):
+        result = mock.Mock(value=value)
+        return mock.Mock(**{'get.return_value': [[result]]})
+
+    def test_count(self):
+        query = self.User.objects.filter(age__gte=18)
+        with mock.patch.object(query, 'make_query') as make_query:
+            make_query.return_value.count.return_value = \
+                self.aggregation_result(3)
+            self.assertEqual(query.count(), 3)
+
+    def test_sum_and_avg_use_column_names(self):
+        query = self.User.objects.all()
+        with mock.patch.object(query, 'make_query') as make_query:
+            make_query.return_value.sum.return_value = \
+                self.aggregation_result(60)
+            make_query.return_value.avg.return_value = \
+                self.aggregation_result(20.0)
+
+            self.assertEqual(query.sum('age'), 60)
+            self.assertEqual(query.avg('stats__score'), 20.0)
+
+        make_query.return_value.sum.assert_called_once_with('userAge')
+        make_query.return_value.avg.assert_called_once_with('stats.score')
+
+    def test_exists(self):
+        query = self.User.objects.filter(age=18)
+        with mock.patch.object(query, 'make_query') as make_query:
+            limited = make_query.return_value.select.return_value.limit
+            limited.return_value.get.return_value = []
+            self.assertFalse(query.exists())
+
+            limited.return_value.get.return_value = [mock.Mock()]
+            self.assertTrue(query.exists())
+
+        make_query.return_value.select.assert_called_with(['__name__'])
+        limited.assert_called_with(1)
+
+
+class TestBulkQuery(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+            age = models.IntegerField(blank=True)
+
+        self.User = User
+        self.conn = mock.Mock()
+        self.conn.collection.return_value.document.side_effect = \
+            lambda id=None: mock.Mock(id=id or 'auto')
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bulk_create_batches(self):
+        users = [self.User(name='u%s' % i, id='u%s' % i) for i in range(5)]
+        results = self.User.objects.bulk_create(users, batch_size=2)
+
+        self.assertEqual(self.conn.batch.call_count, 3)
+        self.assertEqual(self.conn.batch.return_value.set.call_count, 5)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual([u.id for u in users], [r.id for r in results])
+
+    def test_bulk_create_reports_invalid_items(self):
+        users = [self.User(name='ok'), self.User()]
+        results = self.User.objects.bulk_create(users)
+
+        self.assertTrue(results[0].ok)
+        self.assertEqual(users[0].id, 'auto')
+        self.assertIsInstance(results[1].error, AttributeError)
+        self.assertIsNone(users[1].id)
+        self.assertEqual(self.conn.batch.return_value.set.call_count, 1)
+
+    def test_bulk_create_reports_bad_values(self):
+        class Tag(models.Model):
+            name = models.TextField(max_length=3)
+            weight = models.IntegerField(blank=True)
+
+        tags = [Tag(name='a', weight=1), Tag(name='b', weight={}),
+                Tag(name=12345), Tag(name='c', weight='x'), Tag(name='d')]
+        results = Tag.objects.bulk_create(tags)
+
+        self.assertEqual([r.ok for r in results],
+                         [True, False, False, False, True])
+        self.assertIsInstance(results[1].error, TypeError)
+        self.assertIsInstance(results[2].error, TypeError)
+        self.assertIsInstance(results[3].error, models_error.DBTypeError)
+        self.assertEqual(self.conn.batch.return_value.set.call_count, 2)
+
+    def test_bulk_commit_error(self):
+        self.conn.batch.return_value.commit.side_effect = \
+            api_exceptions.Aborted('conflict')
+        user = self.User(name='u')
+        results = self.User.objects.bulk_create([user])
+
+        self.assertIsInstance(results[0].error, api_exceptions.Aborted)
+        self.assertIsNone(user.id)
+
+    def test_bulk_update_only_given_fields(self):
+        user = self.User(name='u', age=10, id='u1')
+        results = self.User.objects.bulk_update([user, self.User()], ['age'])
+
+        self.conn.batch.return_value.update.assert_called_once()
+        data = self.conn.batch.return_value.update.call_args[0][1]
+        self.assertEqual(data, {'age': 10, 'id': 'u1'})
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[1].ok)
+
+    def test_bulk_delete(self):
+        results = self.User.objects.bulk_delete(['a', 'b'])
+
+        self.assertEqual(self.conn.batch.return_value.delete.call_count, 2)
+        self.assertEqual([r.id for r in results], ['a', 'b'])
+
+    def test_batch_size_limit(self):
+        with self.assertRaises(ValueError):
+            self.User.objects.bulk_create([], batch_size=501)
+
+
+class TestInsertQuery(unittest.TestCase):
+    def setUp(self):
+        self.conn = mock.Mock()
+        self.ref = self.conn.collection.return_value.document.return_value
+        self.ref.id = 'u1'
+        self.ref.path = 'user/u1'
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create_does_not_read_back(self):
+        class User(models.Model):
+            name = models.TextField()
+            tags = models.ListField(default=[])
+
+        user = User.objects.create(name='Neo')
+
+        self.ref.set.assert_called_once_with(
+            {'name': 'Neo', 'tags': [], 'id': 'u1'}
+        )
+        self.ref.get.assert_not_called()
+        self.assertEqual((user.id, user.name, user.tags), ('u1', 'Neo', []))
+
+    def test_create_reads_back_sentinel_fields(self):
+        class User(models.Model):
+            name = models.TextField()
+            created = models.TimeStampField(
+                column_name='createdAt', default=firestore.SERVER_TIMESTAMP
+            )
+
+        now = datetime.datetime(2019, 1, 1, tzinfo=datetime.timezone.utc)
+        self.ref.get.return_value.to_dict.return_value = {'createdAt': now}
+
+        user = User.objects.create(name='Neo')
+
+        self.ref.get.assert_called_once_with(['createdAt'])
+        self.assertEqual(user.created, now)
+
+
+class TestDeleteQuery(unittest.TestCase):
+    def setUp(self):
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def paged_query(self, total):
+        docs = [mock.Mock(reference='doc%s' % i) for i in range(total)]
+        query = mock.Mock()
+        projected = query.select.return_value
+
+        def page(size, offset=0):
+            result = mock.Mock()
+            result.stream.return_value = iter(docs[offset:offset + size])
+            result.start_after.side_effect = lambda doc: page(
+                size, docs.index(doc) + 1
+            )
+            return result
+
+        projected.limit.side_effect = page
+        return query
+
+    def test_deletes_in_batches_by_cursor(self):
+        query = self.paged_query(7)
+        progress = []
+
+        deleted = queries.DeleteQuery(
+            query, batch_size=3, workers=2, on_progress=progress.append
+        ).execute()
+
+        self.assertEqual(deleted, 7)
+        self.assertEqual(self.conn.batch.call_count, 3)
+        self.assertEqual(self.conn.batch.return_value.delete.call_count, 7)
+        self.assertEqual(sorted(progress)[-1], 7)
+        self.assertEqual(len(progress), 3)
+        query.select.assert_called_once_with(['__name__'])
+
+    def test_respects_limit(self):
+        query = self.paged_query(10)
+
+        deleted = queries.DeleteQuery(
+            query, batch_size=3, limit=4
+        ).execute()
+
+        self.assertEqual(deleted, 4)
+
+
+class TestProjection(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+            age = models.IntegerField(column_name='userAge')
+
+        self.User = User
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_and_defer_projection(self):
+        self.assertIsNone(self.User.objects.all().projection())
+        self.assertEqual(
+            self.User.objects.all().only('name').projection(), ['name', 'id']
+        )
+        self.assertEqual(
+            self.User.objects.all().defer('name').projection(),
+            ['userAge', 'id']
+        )
+
+        with self.assertRaises(AttributeError):
+            self.User.objects.all().only('other')
+
+    def test_deferred_field_loaded_on_access(self):
+        query = self.User.objects.all().only('name')
+        row = Snapshot('user/u1', {'name': 'Neo'})
+        ref = self.conn.collection.return_value.document.return_value
+        ref.get.return_value = Snapshot('user/u1', {'userAge': 30})
+
+        with mock.patch.object(query, 'raw_execute', return_value=[row]):
+            user = query.get()
+
+        self.assertEqual(user.name, 'Neo')
+        ref.get.assert_not_called()
+
+        self.assertEqual(user.age, 30)
+        self.assertEqual(user.age, 30)
+        ref.get.assert_called_once_with(['userAge'])
+
+    def test_values(self):
+        query = self.User.objects.all()
+        rows = [
+            Snapshot('user/u1', {'name': 'Neo', 'userAge': 30}),
+            Snapshot('user/u2', {'name': 'Trinity', 'userAge': 29}),
+        ]
+        with mock.patch.object(query, 'make_query') as make_query:
+            make_query.return_value.select.return_value.stream.side_effect = \
+                lambda: iter(rows)
+
+            self.assertEqual(list(query.values('id', 'age')), [
+                {'id': 'u1', 'age': 30}, {'id': 'u2', 'age': 29}
+            ])
+            self.assertEqual(
+                list(query.values_list('name', flat=True)),
+                ['Neo', 'Trinity']
+            )
+            self.assertEqual(
+                list(query.values_list('name', 'age')),
+                [('Neo', 30), ('Trinity', 29)]
+            )
+
+        make_query.return_value.select.assert_any_call(['userAge', 'id'])
+
+
+class TestGet(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+            age = models.IntegerField(column_name='userAge')
+
+        self.User = User
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_by_id_is_a_point_read(self):
+        self.conn.document.return_value.get.return_value = Snapshot(
+            'user/u1', {'name': 'Neo', 'userAge': 30}
+        )
+
+        user = self.User.objects.get(id='u1')
+
+        self.assertEqual((user.id, user.name, user.age), ('u1', 'Neo', 30))
+        self.conn.document.assert_called_once_with('user/u1')
+        self.conn.collection.return_value.where.assert_not_called()
+
+    def test_get_by_id_missing(self):
+        self.conn.document.return_value.get.return_value = Snapshot(
+            'user/u1', {}, exists=False
+        )
+
+        with self.assertRaises(error.DocumentDoesNotExists):
+            self.User.objects.get(id='u1')
+
+    def test_get_by_id_with_projection(self):
+        ref = self.conn.document.return_value
+        ref.get.return_value = Snapshot('user/u1', {'name': 'Neo'})
+
+        user = self.User.objects.all().only('name').get(id='u1')
+
+        self.assertEqual(user.name, 'Neo')
+        ref.get.assert_called_once_with(['name', 'id'])
+
+    def test_get_limits_to_two(self):
+        where = self.conn.collection.return_value.where.return_value
+        where.limit.return_value.stream.side_effect = lambda: iter([
+            Snapshot('user/u1', {'name': 'Neo'}),
+            Snapshot('user/u2', {'name': 'Neo'}),
+        ])
+
+        with self.assertRaises(error.MultipleObjectsReturned):
+            self.User.objects.get(name='Neo')
+
+        where.limit.assert_called_once_with(2)
+        self.conn.document.assert_not_called()
+
+    def test_get_keeps_smaller_limit(self):
+        query = self.User.objects.all().filter(name='Neo').limit(1)
+        self.assertEqual(query.limit_for_get().n_limit, 1)
+
+
+class TestFanOutQuery(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+            age = models.IntegerField(column_name='userAge')
+
+        self.User = User
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_small_in_is_single_query(self):
+        query = self.User.objects.filter(age__in=[1, 2])
+        self.assertEqual(query.parse_where(), [('userAge', 'in', [1, 2])])
+        self.assertEqual(len(query.make_queries()), 1)
+
+    def test_large_in_is_split(self):
+        query = self.User.objects.filter(age__in=range(65))
+        with mock.patch.object(query, 'make_query') as make_query:
+            self.assertEqual(len(query.make_queries()), 3)
+
+        wheres = [c[0][1] for c in make_query.call_args_list]
+        self.assertEqual([len(w[0][2]) for w in wheres], [30, 30, 5])
+
+    def test_split_filters_share_disjunction_limit(self):
+        query = self.User.objects.filter(
+            age__in=range(65), name__contains_any=['a'] * 31
+        )
+        with mock.patch.object(query, 'make_query') as make_query:
+            self.assertEqual(len(query.make_queries()), 13 * 6)
+
+        wheres = [c[0][1] for c in make_query.call_args_list]
+        self.assertEqual(
+            max(len(w[0][2]) * len(w[1][2]) for w in wheres), 30
+        )
+        self.assertEqual(
+            sorted({v for w in wheres for v in w[0][2]}), list(range(65))
+        )
+
+    def test_merge_dedupes_orders_and_limits(self):
+        query = self.User.objects.filter(
+            age__in=range(40)
+        ).order_by('-userAge').limit(3)
+        chunks = [
+            [Snapshot('user/u1', {'userAge': 1}),
+             Snapshot('user/u2', {'userAge': 5})],
+            [Snapshot('user/u2', {'userAge': 5}),
+             Snapshot('user/u3', {'userAge': 3}),
+             Snapshot('user/u4', {})],
+        ]
+        with mock.patch.object(query, 'make_query') as make_query:
+            make_query.return_value.stream.side_effect = \
+                lambda: iter(chunks.pop(0))
+            self.assertEqual(
+                [d.id for d in query.raw_execute()], ['u2', 'u3', 'u1']
+            )
+
+    def test_count_over_chunks_dedupes(self):
+        query = self.User.objects.filter(age__in=range(40))
+        chunks = [
+            [Snapshot('user/u1', {}), Snapshot('user/u2', {})],
+            [Snapshot('user/u2', {})],
+        ]
+        with mock.patch.object(query, 'make_query') as make_query:
+            make_query.return_value.select.return_value.stream.side_effect = \
+                lambda: iter(chunks.pop(0))
+            self.assertEqual(query.count(), 2)
+
+    def test_in_bulk(self):
+        self.conn.get_all.return_value = [
+            Snapshot('user/u1', {'name': 'Neo'}),
+            Snapshot('user/u2', {}, exists=False),
+        ]
+        users = self.User.objects.in_bulk(['u1', 'u2', 'u1'])
+
+        self.assertEqual(list(users), ['u1'])
+        self.assertEqual(users['u1'].name, 'Neo')
+        self.assertEqual(self.conn.get_all.call_count, 1)
+        self.assertEqual(len(self.conn.get_all.call_args[0][0]), 2)
+
+
+class TestColumns(unittest.TestCase):
+    def setUp(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class User(models.Model):
+            name = models.TextField()
+            age = models.IntegerField(column_name='userAge')
+            author = models.ReferenceField(Author)
+            active = models.BooleanField(blank=True)
+            joined = models.TimeStampField(blank=True)
+            tags = models.ListField(blank=True)
+
+        self.User = User
+        self.joined = datetime.datetime(
+            2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+        )
+        self.rows = [
+            Snapshot('user/u1', {
+                'name': 'Neo', 'userAge': 30, 'active': True,
+                'joined': self.joined,
+            }),
+            Snapshot('user/u2', {
+                'name': 'Trinity', 'userAge': 29, 'active': False,
+            }),
+        ]
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_to_columns(self):
+        query = self.User.objects.all()
+        rows = [
+            Snapshot('user/u1', {
+                'name': 'Neo', 'userAge': 30,
+                'author': reference('author/a1'),
+            }),
+            Snapshot('user/u2', {'name': 'Trinity'}),
+        ]
+        with mock.patch.object(query, 'make_query') as make_query:
+            make_query.return_value.select.return_value.stream.return_value \
+                = iter(rows)
+            columns = query.to_columns('id', 'age', 'name', 'author')
+
+        make_query.return_value.select.assert_called_once_with(
+            ['name', 'userAge', 'author', 'id']
+        )
+        self.assertEqual(columns, {
+            'id': ['u1', 'u2'],
+            'age': [30, None],
+            'name': ['Neo', 'Trinity'],
+            'author': ['a1', None],
+        })
+
+    def read(self, method, *fields, **options):
+        query = self.User.objects.all()
+        with mock.patch.object(query, 'make_query') as make_query:
+            make_query.return_value.select.return_value.stream.return_value \
+                = iter(self.rows)
+            return getattr(query, method)(*fields, **options)
+
+    @unittest.skipUnless(queries.queries_columns.numpy, 'requires numpy')
+    def test_arrays(self):
+        columns = self.read('to_columns', 'age', 'active', 'joined')
+        self.assertEqual(columns, {
+            'age': [30, 29], 'active': [True, False],
+            'joined': [self.joined, None],
+        })
+
+        arrays = self.read(
+            'to_columns', 'age', 'active', 'joined', 'name', arrays=True
+        )
+        self.assertEqual(
+            {name: str(a.dtype) for name, a in arrays.items()}, {
+                'age': 'int64', 'active': 'bool', 'joined': 'datetime64[us]',
+                'name': 'object',
+            }
+        )
+        self.assertEqual(arrays['joined'][0].item(),
+                         self.joined.replace(tzinfo=None))
+        self.assertTrue(queries.queries_columns.numpy.isnat(
+            arrays['joined'][1]
+        ))
+
+        self.rows[1] = Snapshot('user/u2', {'name': 'Trinity'})
+        arrays = self.read('to_columns', 'age', 'active', arrays=True)
+        self.assertEqual(str(arrays['age'].dtype), 'float64')
+        self.assertTrue(queries.queries_columns.numpy.isnan(arrays['age'][1]))
+        self.assertEqual(list(arrays['active']), [True, None])
+
+    @unittest.skipUnless(queries.queries_columns.pyarrow, 'requires pyarrow')
+    def test_to_arrow(self):
+        pa = queries.queries_columns.pyarrow
+        table = self.read('to_arrow', 'id', 'age', 'active', 'joined')
+        self.assertEqual(table.schema, pa.schema([
+            ('id', pa.string()), ('age', pa.int64()),
+            ('active', pa.bool_()),
+            ('joined', pa.timestamp('us', tz='UTC')),
+        ]))
+        self.assertEqual(table.to_pydict(), {
+            'id': ['u1', 'u2'], 'age': [30, 29], 'active': [True, False],
+            'joined': [self.joined, None],
+        })
+
+    def read_chunked(self, method, *fields, **options):
+        self.rows.append(Snapshot('user/u3', {'name': 'Morpheus'}))
+        self.rows[0]._data['tags'] = [1, 2]
+        query_class = type(self.User.objects.all())
+        with mock.patch.object(query_class, 'column_chunk_size', 2):
+            return self.read(method, *fields, **options)
+
+    @unittest.skipUnless(queries.queries_columns.numpy, 'requires numpy')
+    def test_arrays_in_chunks(self):
+        np = queries.queries_columns.numpy
+        arrays = self.read_chunked(
+            'to_columns', 'age', 'active', 'joined', arrays=True
+        )
+        self.assertEqual(str(arrays['age'].dtype), 'float64')
+        self.assertEqual(list(arrays['age'][:2]), [30, 29])
+        self.assertTrue(np.isnan(arrays['age'][2]))
+        self.assertEqual(list(arrays['active']), [True, False, None])
+        self.assertEqual(str(arrays['joined'].dtype), 'datetime64[us]')
+        self.assertEqual(len(arrays['joined']), 3)
+
+    @unittest.skipUnless(queries.queries_columns.pyarrow, 'requires pyarrow')
+    def test_to_arrow_in_chunks(self):
+        pa = queries.queries_columns.pyarrow
+        table = self.read_chunked('to_arrow', 'id', 'age', 'tags')
+        self.assertEqual(table.schema, pa.schema([
+            ('id', pa.string()), ('age', pa.int64()),
+            ('tags', pa.list_(pa.int64())),
+        ]))
+        self.assertEqual(table.column('age').num_chunks, 2)
+        self.assertEqual(table.to_pydict(), {
+            'id': ['u1', 'u2', 'u3'], 'age': [30, 29, None],
+            'tags': [[1, 2], None, None],
+        })
+
+    @unittest.skipUnless(queries.queries_columns.numpy, 'requires numpy')
+    @unittest.skipUnless(queries.queries_columns.pyarrow, 'requires pyarrow')
+    def test_empty_columns(self):
+        self.rows = []
+        arrays = self.read('to_columns', 'age', arrays=True)
+        self.assertEqual((str(arrays['age'].dtype), len(arrays['age'])),
+                         ('int64', 0))
+        table = self.read('to_arrow', 'age', 'name')
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.schema.field('age').type,
+                         queries.queries_columns.pyarrow.int64())
+
+    @unittest.skipUnless(queries.queries_columns.pandas, 'requires pandas')
+    def test_to_pandas(self):
+        frame = self.read('to_pandas', 'age', 'active', 'joined', 'name')
+        self.assertEqual(str(frame['age'].dtype), 'Int64')
+        self.assertEqual(str(frame['active'].dtype), 'boolean')
+        self.assertEqual(str(frame['joined'].dtype.tz), 'UTC')
+        self.assertEqual(frame['joined'][0], self.joined)
+        self.assertTrue(frame['joined'].isna()[1])
+        self.assertEqual(list(frame['name']), ['Neo', 'Trinity'])
+
+    def test_optional_dependency_missing(self):
+        with mock.patch.object(queries.queries_columns, 'pyarrow', None):
+            with self.assertRaises(ImportError) as context:
+                self.User.objects.all().to_arrow()
+        self.assertEqual(
+            'to_arrow() requires pyarrow to be installed',
+            str(context.exception)
+        )
+
+
+class TestParallelScan(unittest.TestCase):
+    def setUp(self):
+        class User(models.Model):
+            name = models.TextField()
+
+        self.User = User
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        partitions = []
+        for docs in (['u1', 'u2', 'u3'], ['u4'], ['u5', 'u6']):
+            partition = mock.Mock()
+            partition.query.return_value.where.return_value.stream \
+                .return_value = [
+                    Snapshot('user/' + i, {'name': i}) for i in docs
+                ] + [Snapshot('team/t1/user/x', {'name': 'x'})]
+            partitions.append(partition)
+        group = self.conn.collection_group_class.return_value
+        group.get_partitions.return_value = iter(partitions)
+
+    def test_ordered(self):
+        users = self.User.objects.filter(name__in=['a']).parallel_scan(
+            partitions=3, workers=2, chunk_size=2
+        )
+        self.assertEqual(
+            [u.id for u in users], ['u1', 'u2', 'u3', 'u4', 'u5', 'u6']
+        )
+        self.conn.collection.assert_called_once_with('user')
+        self.conn.collection_group_class.assert_called_once_with(
+            self.conn.collection.return_value
+        )
+        self.conn.collection_group_class.return_value.get_partitions \
+            .assert_called_once_with(3)
+
+    def test_unordered(self):
+        users = self.User.objects.filter(name__in=['a']).parallel_scan(
+            partitions=3, ordered=False
+        )
+        self.assertEqual(
+            sorted(u.id for u in users),
+            ['u1', 'u2', 'u3', 'u4', 'u5', 'u6']
+        )
+
+    def test_errors(self):
+        with self.assertRaises(AttributeError):
+            self.User.objects.all().order_by('name').parallel_scan()
+
+        group = self.conn.collection_group_class.return_value
+        partition = mock.Mock()
+        partition.query.return_value.stream.side_effect = ValueError()
+        group.get_partitions.return_value = iter([partition])
+        with self.assertRaises(ValueError):
+            list(self.User.objects.all().parallel_scan())
@@ -0,0 +1,208 @@
+import copy
+import pickle
+import unittest
+from unittest import mock
+from unittest.mock import Mock
+
+from firebase_admin import firestore
+
+from matchbox import models
+from matchbox.models import error
+from matchbox.queries import queries_result
+from matchbox.tests.fakes import Snapshot, reference
+
+
+# Module level, so instances can be pickled
+class PickledAuthor(models.Model):
+    name = models.TextField()
+
+
+class PickledBook(models.Model):
+    title = models.TextField()
+    author = models.ReferenceField(PickledAuthor)
+
+
+class TestQueryResultWrapper(unittest.TestCase):
+    def setUp(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class Book(models.Model):
+            title = models.TextField()
+            author = models.ReferenceField(Author)
+
+        class Review(models.Model):
+            book = models.ReferenceField(Book)
+
+        self.Author = Author
+        self.Book = Book
+        self.Review = Review
+
+    def test_references_are_lazy_by_default(self):
+        rows = [
+            Snapshot('book/b1', {
+                'id': 'b1', 'title': 't1', 'author': reference('author/a1')
+            }),
+        ]
+        conn = Mock()
+        doc_get = conn.document.return_value.get
+        doc_get.return_value = Snapshot(
+            'author/a1', {'id': 'a1', 'name': 'Neo'}
+        )
+
+        with mock.patch('matchbox.database.Database.conn', new=conn):
+            book = queries_result.QueryResultWrapper.models_from_dicts(
+                self.Book, rows
+            )[0]
+
+            conn.get_all.assert_not_called()
+            self.assertIsInstance(book.author, self.Author)
+            self.assertEqual(book.author.id, 'a1')
+            doc_get.assert_not_called()
+
+            self.assertEqual(book.author.name, 'Neo')
+            self.assertEqual(book.author.name, 'Neo')
+
+        conn.document.assert_called_once_with('author/a1')
+        doc_get.assert_called_once_with()
+
+    def test_copy_and_pickle_lazy_reference(self):
+        book = queries_result.QueryResultWrapper.models_from_dicts(
+            PickledBook, [Snapshot('pickled_book/b1', {
+                'title': 't1',
+                'author': firestore.DocumentReference('pickled_author', 'a1'),
+            })]
+        )[0]
+
+        for clone in [copy.deepcopy(book), pickle.loads(pickle.dumps(book))]:
+            self.assertEqual(clone.title, 't1')
+            self.assertIsInstance(clone.author, queries_result.ReferenceProxy)
+            self.assertEqual(
+                repr(clone.author), '<ReferenceProxy: pickled_author/a1>'
+            )
+            self.assertEqual(clone.author.id, 'a1')
+
+    def test_references_resolved_with_single_get_all(self):
+        a1, a2 = reference('author/a1'), reference('author/a2')
+        rows = [
+            Snapshot('book/b1', {'id': 'b1', 'title': 't1', 'author': a1}),
+            Snapshot('book/b2', {'id': 'b2', 'title': 't2', 'author': a2}),
+            Snapshot('book/b3', {'id': 'b3', 'title': 't3', 'author': a1}),
+        ]
+        conn = Mock()
+        conn.get_all.return_value = [
+            Snapshot('author/a1', {'id': 'a1', 'name': 'Neo'}),
+            Snapshot('author/a2', {'id': 'a2', 'name': 'Trinity'}),
+        ]
+
+        with mock.patch('matchbox.database.Database.conn', new=conn):
+            books = queries_result.QueryResultWrapper.models_from_dicts(
+                self.Book, rows, {'author': {}}
+            )
+
+        self.assertEqual(conn.get_all.call_count, 1)
+        self.assertEqual(len(conn.get_all.call_args[0][0]), 2)
+        self.assertEqual(
+            [b.author.name for b in books], ['Neo', 'Trinity', 'Neo']
+        )
+        a1.get.assert_not_called()
+
+    def test_references_read_without_copying_rows(self):
+        class Edition(models.Model):
+            author = models.ReferenceField(self.Author)
+            editor = models.ReferenceField(self.Author)
+
+        rows = [
+            firestore.DocumentSnapshot(
+                firestore.DocumentReference('edition', 'e%s' % i), {
+                    'author': firestore.DocumentReference('author', 'a1'),
+                }, True, None, None, None
+            ) for i in range(2)
+        ]
+        conn = Mock()
+        conn.get_all.return_value = [
+            Snapshot('author/a1', {'id': 'a1', 'name': 'Neo'}),
+        ]
+        to_dict = firestore.DocumentSnapshot.to_dict
+
+        with mock.patch('matchbox.database.Database.conn', new=conn), \
+                mock.patch.object(firestore.DocumentSnapshot, 'to_dict',
+                                  autospec=True,
+                                  side_effect=to_dict) as copied:
+            editions = queries_result.QueryResultWrapper.models_from_dicts(
+                Edition, rows, {'author': {}, 'editor': {}}
+            )
+
+        # Once per row, to fill the model
+        self.assertEqual(copied.call_count, 2)
+        self.assertEqual([e.author.name for e in editions], ['Neo', 'Neo'])
+        self.assertEqual([e.editor for e in editions], [None, None])
+
+    def test_missing_reference_raise(self):
+        rows = [
+            Snapshot('book/b1', {
+                'id': 'b1', 'title': 't1',
+                'author': reference('author/a1')
+            }),
+        ]
+        conn = Mock()
+        conn.get_all.return_value = [
+            Snapshot('author/a1', {}, exists=False),
+        ]
+
+        with mock.patch('matchbox.database.Database.conn', new=conn):
+            with self.assertRaises(
+                    error.ReferenceCollectionObjectDoesNotExist):
+                queries_result.QueryResultWrapper.models_from_dicts(
+                    self.Book, rows, 1
+                )
+
+    def test_nested_select_related(self):
+        rows = [
+            Snapshot('review/r1', {
+                'id': 'r1', 'book': reference('book/b1')
+            }),
+        ]
+        conn = Mock()
+        conn.get_all.side_effect = [
+            [Snapshot('book/b1', {
+                'id': 'b1', 'title': 't1', 'author': reference('author/a1')
+            })],
+            [Snapshot('author/a1', {'id': 'a1', 'name': 'Neo'})],
+        ]
+
+        with mock.patch('matchbox.database.Database.conn', new=conn):
+            review = queries_result.QueryResultWrapper.models_from_dicts(
+                self.Review, rows, {'book': {'author': {}}}
+            )[0]
+
+        self.assertEqual(conn.get_all.call_count, 2)
+        self.assertEqual(review.book.author.name, 'Neo')
+        self.assertEqual(type(review.book.author), self.Author)
+
+
+class TestSelectRelated(unittest.TestCase):
+    def test_lookups_build_tree(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class Book(models.Model):
+            author = models.ReferenceField(Author)
+            title = models.TextField()
+
+        class Review(models.Model):
+            book = models.ReferenceField(Book)
+
+        query = Review.objects.select_related('book', 'book__author')
+        self.assertEqual(query.n_related, {'book': {'author': {}}})
+
+        query = Review.objects.select_related(depth=2)
+        self.assertEqual(query.n_related, 2)
+
+        with self.assertRaises(AttributeError) as context:
+            Review.objects.select_related('book__title')
+
+        self.assertEqual(
+            'Field name title is not a ReferenceField',
+            str(context.exception)
+        )
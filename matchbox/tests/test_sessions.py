@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+
+import matchbox
+from matchbox import models
+from matchbox.queries import queries_result
+from matchbox.tests.fakes import Snapshot, reference
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        class Author(models.Model):
+            name = models.TextField()
+
+        class Book(models.Model):
+            title = models.TextField()
+            author = models.ReferenceField(Author)
+
+        self.Author = Author
+        self.Book = Book
+        self.conn = mock.Mock()
+        patcher = mock.patch('matchbox.database.Database.conn', new=self.conn)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_identity_map(self):
+        stream = self.conn.collection.return_value.where.return_value\
+            .limit.return_value.stream
+        stream.side_effect = lambda: iter([
+            Snapshot('author/a1', {'id': 'a1', 'name': 'Neo'})
+        ])
+        rows = [Snapshot('book/b1', {
+            'id': 'b1', 'title': 't', 'author': reference('author/a1')
+        })]
+
+        with matchbox.session():
+            author = self.Author.objects.get(name='Neo')
+            self.assertIs(self.Author.objects.get(id='a1'), author)
+            book = queries_result.QueryResultWrapper.models_from_dicts(
+                self.Book, rows, 1
+            )[0]
+            self.assertIs(book.author, author)
+
+        self.assertEqual(stream.call_count, 1)
+        self.conn.get_all.assert_not_called()
+        self.assertIsNot(self.Author.objects.get(name='Neo'), author)
+
+    def test_writes_flushed_in_one_batch(self):
+        self.conn.collection.return_value.document.return_value.id = 'new'
+        batch = self.conn.batch.return_value
+        author = self.Author(id='a1', name='Neo')
+
+        with matchbox.session():
+            author.save(update_fields=['name'])
+            author.name = 'Thomas'
+            author.save(update_fields=['name'])
+            book = self.Book(title='t')
+            book.save()
+            book.save()
+            self.assertEqual(book.id, 'new')
+            self.conn.batch.assert_not_called()
+
+        self.conn.batch.assert_called_once_with()
+        batch.commit.assert_called_once_with()
+        batch.update.assert_called_once_with(
+            self.conn.document.return_value, {'name': 'Thomas', 'id': 'a1'}
+        )
+        self.assertEqual(batch.set.call_count, 1)
+        self.conn.document.assert_any_call('author/a1')
+        self.conn.document.assert_any_call('book/new')
+
+    def test_exception_discards_writes(self):
+        with self.assertRaises(ValueError):
+            with matchbox.session():
+                self.Author(id='a1', name='Neo').save()
+                raise ValueError()
+        self.conn.batch.assert_not_called()
@@ -1,9 +1,12 @@
 import os
 
 from matchbox import models
-from matchbox.database import db_initialization
+from matchbox.database import MemoryBackend, db_initialization
 
-db_initialization(os.environ['FIRESTORE'])
+if 'FIRESTORE' in os.environ:
+    db_initialization(os.environ['FIRESTORE'])
+else:
+    db_initialization(backend=MemoryBackend())
 
 print("Test Model.")
 
@@ -24,9 +27,11 @@ c3 = Class.objects.create(active=False, name='CC22')
 c4 = Class.objects.create(active=False, name='CC11')
 
 
-assert len(list(Class.objects.all())) == 4
-assert len(list(Class.objects.filter(active=True))) == 2
-assert len(list(Class.objects.filter(active=False))) == 2
+assert Class.objects.all().count() == 4
+assert Class.objects.filter(active=True).count() == 2
+assert Class.objects.filter(active=False).count() == 2
+assert Class.objects.filter(name='DD21').exists()
+assert not Class.objects.filter(name='XX00').exists()
 
 
 assert len(list(Class.objects.filter(active=True).filter(name='DD21'))) == 1
@@ -203,9 +208,12 @@ print("Test Sub models")
 import os
 
 from matchbox import models
-from matchbox.database import db_initialization
+from matchbox.database import MemoryBackend, db_initialization
 
-db_initialization(os.environ['FIRESTORE'])
+if 'FIRESTORE' in os.environ:
+    db_initialization(os.environ['FIRESTORE'])
+else:
+    db_initialization(backend=MemoryBackend())
 
 class A(models.Model):
     name = models.TextField()
@@ -277,7 +285,10 @@ A.objects.delete()
 from matchbox import models, database
 import os
 
-database.db_initialization(os.environ['FIRESTORE'])
+if 'FIRESTORE' in os.environ:
+    database.db_initialization(os.environ['FIRESTORE'])
+else:
+    database.db_initialization(backend=database.MemoryBackend())
 
 
 class User(models.Model):
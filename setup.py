@@ -21,9 +21,23 @@ setup(
         'Intended Audience :: Developers',
         'Operating System :: OS Independent',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
-    install_requires=['firebase-admin>=2.16.0', 'iso8601>=0.1.12'],
+    python_requires='>=3.8',
+    install_requires=[
+        'firebase-admin>=6.0.0',
+        'iso8601>=0.1.12',
+        'google-cloud-firestore>=2.14.0',
+    ],
+    extras_require={
+        'numpy': ['numpy'],
+        'arrow': ['pyarrow>=14'],
+        'pandas': ['pandas'],
+        'prometheus': ['prometheus_client'],
+        'opentelemetry': ['opentelemetry-api'],
+    },
 )